@@ -0,0 +1,137 @@
+import os
+import pickle
+from typing import List
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+# ==============================
+# CONFIG
+# ==============================
+# flat      exact search, float32 in RAM (default)
+# ivf_flat  inverted lists over k-means cells, exact distances within cells
+# ivf_pq    inverted lists + product-quantized codes (~16x less memory)
+# hnsw      graph index, no training, fastest queries at high recall
+MODES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+INDEX_MODE = os.getenv("RAG_INDEX_MODE", "flat")
+NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+TRAIN_SAMPLE = int(os.getenv("RAG_TRAIN_SAMPLE", "100000"))
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+# IO_FLAG_MMAP only maps IVF inverted lists; the IFC flag (faiss >= 1.8)
+# maps flat and HNSW storage zero-copy too
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# Below these sizes k-means / PQ training is unreliable; use flat instead
+MIN_TRAIN_POINTS = {"ivf_flat": 1000, "ivf_pq": 10000}
+
+# ==============================
+# INDEX FACTORY
+# ==============================
+def nlist_for(n: int) -> int:
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def pq_m_for(dim: int) -> int:
+    for m in (64, 48, 32, 24, 16, 8, 4):
+        if dim % m == 0:
+            return m
+    return 1
+
+def factory_string(mode: str, dim: int, n: int) -> str:
+    if mode == "flat":
+        return "Flat"
+    if mode == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if mode == "ivf_flat":
+        return f"IVF{nlist_for(n)},Flat"
+    if mode == "ivf_pq":
+        return f"IVF{nlist_for(n)},PQ{pq_m_for(dim)}x8"
+    raise ValueError(f"Unknown index mode {mode!r}; expected one of {MODES}")
+
+def tune(index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except (RuntimeError, AttributeError):
+        pass
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+def build_index(mode: str, vectors: np.ndarray, seed: int = 0):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if n < MIN_TRAIN_POINTS.get(mode, 0):
+        print(f"Only {n} vectors, using a flat index instead of {mode}")
+        mode = "flat"
+
+    index = faiss.index_factory(dim, factory_string(mode, dim, n))
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if n > TRAIN_SAMPLE:
+            sample = vectors[rng.choice(n, TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+
+    index.add(vectors)
+    return tune(index)
+
+# ==============================
+# VECTOR STORE HELPERS
+# ==============================
+def all_vectors(vectorstore: FAISS) -> np.ndarray:
+    index = vectorstore.index
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except (RuntimeError, AttributeError):
+        pass
+    return index.reconstruct_n(0, index.ntotal)
+
+# Re-index a flat store into `mode`. Stores that fell back to flat while
+# small are retried here as they grow.
+def convert(vectorstore: FAISS, mode: str):
+    if mode == "flat" or not isinstance(vectorstore.index, faiss.IndexFlat):
+        return
+    if vectorstore.index.ntotal >= MIN_TRAIN_POINTS.get(mode, 1):
+        vectorstore.index = build_index(mode, all_vectors(vectorstore))
+
+def delete_ids(vectorstore: FAISS, ids: List[str]):
+    if not ids:
+        return
+    if isinstance(vectorstore.index, faiss.IndexFlat):
+        vectorstore.delete(ids)
+        return
+
+    # IVF keeps stored ids after remove_ids (LangChain assumes they shift)
+    # and HNSW can't remove at all, so re-add the surviving vectors to the
+    # already trained index
+    removed = set(ids)
+    mapping = vectorstore.index_to_docstore_id
+    keep = [pos for pos in sorted(mapping) if mapping[pos] not in removed]
+    vectors = all_vectors(vectorstore)[keep]
+
+    vectorstore.index.reset()
+    if len(keep):
+        vectorstore.index.add(vectors)
+    known = set(mapping.values())
+    vectorstore.docstore.delete([i for i in ids if i in known])
+    vectorstore.index_to_docstore_id = {i: mapping[pos] for i, pos in enumerate(keep)}
+
+def load_faiss(index_dir: str, embeddings, mmap: bool = False) -> FAISS:
+    path = os.path.join(index_dir, "index.faiss")
+    index = None
+    if mmap:
+        # Read-only mapping: vector data stays in the OS page cache
+        try:
+            index = faiss.read_index(path, MMAP_FLAGS)
+        except RuntimeError:
+            index = None
+    if index is None:
+        index = faiss.read_index(path)
+
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    return FAISS(embeddings, tune(index), docstore, index_to_docstore_id)
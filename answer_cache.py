@@ -0,0 +1,140 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.92"))
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+# ==============================
+# TWO-LAYER ANSWER CACHE
+# ==============================
+# Layer 1: exact match on the normalized question.
+# Layer 2: cosine similarity of the question embedding against the
+# embeddings of cached questions (a small in-memory matrix).
+# Entries expire after `ttl` seconds; the least recently used entry is
+# evicted once `max_entries` is reached.
+class AnswerCache:
+    def __init__(
+        self,
+        embeddings=None,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _embed(self, question: str, vector=None) -> Optional[np.ndarray]:
+        if vector is None:
+            if self.embeddings is None:
+                return None
+            vector = self.embeddings.embed_query(question)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry["created"] > self.ttl
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _nearest(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e["vector"] is not None]
+            if not self._matrix_keys:
+                return None, 0.0
+            self._matrix = np.stack([self._entries[k]["vector"] for k in self._matrix_keys])
+
+        if not self._matrix_keys:
+            return None, 0.0
+
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best], float(scores[best])
+
+    def lookup(self, question: str, vector=None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        key = normalize_question(question)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._expired(entry):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                metrics.incr("cache_requests_total", cache="answer", result="exact")
+                return entry["answer"], entry["vector"]
+            if entry:
+                self._drop(key)
+
+        vector = self._embed(question, vector)
+
+        with self._lock:
+            if vector is not None:
+                match, score = self._nearest(vector)
+                entry = self._entries.get(match) if match else None
+                if entry and score >= self.threshold:
+                    if not self._expired(entry):
+                        self._entries.move_to_end(match)
+                        self.semantic_hits += 1
+                        metrics.incr("cache_requests_total", cache="answer", result="semantic")
+                        return entry["answer"], vector
+                    self._drop(match)
+
+            self.misses += 1
+            metrics.incr("cache_requests_total", cache="answer", result="miss")
+            return None, vector
+
+    def put(self, question: str, answer: str, vector=None):
+        key = normalize_question(question)
+        vector = self._embed(question, vector)
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "answer": answer,
+                "vector": vector,
+                "created": time.time()
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "size": len(self._entries)
+            }
@@ -1,8 +1,13 @@
+import time
+import datetime
 import streamlit as st
 from backend import *
 
 st.set_page_config("Healthcare RAG Assistant", "🏥", layout="wide")
 
+# Build the knowledge base in the background while other tabs are used
+warm_rag()
+
 # ===== SCROLLING BANNER =====
 st.markdown("""
 <style>
@@ -91,11 +96,14 @@ with tabs[0]:
             doctor_options = [f"{row['Doctor_Name']} - {row['Specialization']}" for _, row in doctors_df.iterrows()]
             selected_option = st.selectbox("Select Doctor", doctor_options)
             doctor_name = selected_option.split(" - ")[0]
-            appointment_date = st.date_input("Appointment Date")
+            appointment_date = st.date_input("Appointment Date", min_value=datetime.date.today())
         
-        appointment_time = st.selectbox("Preferred Time", ["9:00 AM", "10:00 AM", "11:00 AM", "2:00 PM", "3:00 PM", "4:00 PM", "5:00 PM"])
+        open_times = free_slots(doctor_name, appointment_date, APPOINTMENT_TIMES) or []
+        appointment_time = st.selectbox("Preferred Time", open_times)
+        if not open_times:
+            st.warning(f"⚠️ {doctor_name} has no free slots on {appointment_date}. Try another date.")
         
-        doctor_row = doctors_df[doctors_df["Doctor_Name"] == doctor_name].iloc[0]
+        doctor_row = get_doctor(doctor_name)
         
         st.markdown(f"""
         <div class="info-card">
@@ -116,17 +124,25 @@ with tabs[0]:
                 st.error("❌ Enter valid 10-digit contact number")
             elif not disease or len(disease) < 3:
                 st.error("❌ Describe your condition")
+            elif not appointment_time:
+                st.error("❌ Select an available time")
             else:
-                success = save_appointment({
-                    "Patient_Name": patient_name,
-                    "Patient_Age": patient_age,
-                    "Patient_Sex": patient_sex,
-                    "Patient_Contact": patient_contact,
-                    "Disease": disease,
-                    "Doctor": doctor_name,
-                    "Date": str(appointment_date),
-                    "Time": appointment_time
-                })
+                try:
+                    success = book_appointment({
+                        "Patient_Name": patient_name,
+                        "Patient_Age": patient_age,
+                        "Patient_Sex": patient_sex,
+                        "Patient_Contact": patient_contact,
+                        "Disease": disease,
+                        "Doctor": doctor_name,
+                        "Date": str(appointment_date),
+                        "Time": appointment_time
+                    })
+                except (SlotTaken, SlotUnavailable) as e:
+                    st.error(f"❌ {e}. Please pick another time.")
+                    success = None
+                except Exception:
+                    success = False
                 if success:
                     st.markdown("""
                     <div class="success-card">
@@ -135,7 +151,7 @@ with tabs[0]:
                     </div>
                     """, unsafe_allow_html=True)
                     st.balloons()
-                else:
+                elif success is False:
                     st.error("❌ Error booking appointment. Check if Appointments.csv exists in data folder.")
         
         st.subheader("🥼 Our Medical Team")
@@ -163,68 +179,87 @@ with tabs[1]:
         with col2:
             st.write("")
         
-        med_row = filtered_meds[filtered_meds["Medicine_Name"] == selected_med].iloc[0]
+        med_row = get_medicine(selected_med)
+        if med_row is None:
+            st.warning("⚠️ This medicine is no longer in the catalog. Please pick another one.")
+        else:
+            stock = current_stock(selected_med)
+            if stock is None:
+                stock = int(med_row['Stock'])
         
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Category", med_row['Category'])
-        with col2:
-            st.metric("Dosage", med_row['Dosage'])
-        with col3:
-            st.metric("Stock", f"{int(med_row['Stock'])} units")
-        with col4:
-            st.metric("Price/Unit", f"₹{int(med_row['Price'])}")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Category", med_row['Category'])
+            with col2:
+                st.metric("Dosage", med_row['Dosage'])
+            with col3:
+                st.metric("Stock", f"{stock} units")
+            with col4:
+                st.metric("Price/Unit", f"₹{int(med_row['Price'])}")
         
-        st.divider()
+            st.divider()
         
-        col1, col2 = st.columns(2)
+            col1, col2 = st.columns(2)
         
-        with col1:
-            qty = st.number_input("Quantity", min_value=1, max_value=int(med_row["Stock"]), value=1)
-            phone = st.text_input("Phone Number (10 digits)", placeholder="9876543210")
-            address = st.text_area("Delivery Address", height=100)
+            with col1:
+                qty = st.number_input("Quantity", min_value=1, max_value=max(stock, 1), value=1)
+                phone = st.text_input("Phone Number (10 digits)", placeholder="9876543210")
+                address = st.text_area("Delivery Address", height=100)
         
-        with col2:
-            st.subheader("Order Summary")
-            total_price = int(med_row['Price']) * qty
-            delivery = 50
-            grand_total = total_price + delivery
+            with col2:
+                st.subheader("Order Summary")
+                total_price = int(med_row['Price']) * qty
+                delivery = 50
+                grand_total = total_price + delivery
             
-            st.markdown(f"""
-            <div class="card">
-            <b>Medicine:</b> {selected_med}<br>
-            <b>Quantity:</b> {qty} units<br>
-            <b>Unit Price:</b> ₹{int(med_row['Price'])}<br>
-            <b>Subtotal:</b> ₹{total_price}<br>
-            <hr>
-            <b>Delivery Charges:</b> ₹{delivery}<br>
-            <b style='font-size: 20px; color: #d63031;'>Total: ₹{grand_total}</b>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="card">
+                <b>Medicine:</b> {selected_med}<br>
+                <b>Quantity:</b> {qty} units<br>
+                <b>Unit Price:</b> ₹{int(med_row['Price'])}<br>
+                <b>Subtotal:</b> ₹{total_price}<br>
+                <hr>
+                <b>Delivery Charges:</b> ₹{delivery}<br>
+                <b style='font-size: 20px; color: #d63031;'>Total: ₹{grand_total}</b>
+                </div>
+                """, unsafe_allow_html=True)
             
-            st.subheader("Payment Method")
-            payment = st.radio("Select Option", ["Credit Card", "Debit Card", "UPI", "Net Banking", "Cash on Delivery"], horizontal=True)
+                st.subheader("Payment Method")
+                payment = st.radio("Select Option", ["Credit Card", "Debit Card", "UPI", "Net Banking", "Cash on Delivery"], horizontal=True)
         
-        st.divider()
+            st.divider()
         
-        if st.button("🛒 Place Order", use_container_width=True, type="primary"):
-            if not phone or len(phone) != 10 or not phone.isdigit():
-                st.error("❌ Enter valid 10-digit phone number")
-            elif not address or len(address.strip()) < 10:
-                st.error("❌ Enter complete delivery address")
-            else:
-                success = place_order(phone, address, selected_med, qty, payment)
-                if success:
-                    st.markdown("""
-                    <div class="success-card">
-                    ✅ <b>Order Placed Successfully!</b><br>
-                    Your medicine will be delivered within 24-48 hours.<br>
-                    Confirmation sent to your phone number.
-                    </div>
-                    """, unsafe_allow_html=True)
-                    st.balloons()
+            if st.button("🛒 Place Order", use_container_width=True, type="primary"):
+                if not phone or len(phone) != 10 or not phone.isdigit():
+                    st.error("❌ Enter valid 10-digit phone number")
+                elif not address or len(address.strip()) < 10:
+                    st.error("❌ Enter complete delivery address")
+                elif qty > stock:
+                    st.error("❌ Not enough stock for this quantity")
                 else:
-                    st.error("❌ Error placing order. Check if orders.csv exists in data folder.")
+                    # One id per submitted order so a retry can't charge twice
+                    if "order_id" not in st.session_state:
+                        st.session_state.order_id = new_order_id()
+                    try:
+                        success = place_order(phone, address, selected_med, qty, payment, order_id=st.session_state.order_id)
+                    except OutOfStock:
+                        left = current_stock(selected_med)
+                        st.error(f"❌ {selected_med} sold out while you were ordering"
+                                 + (f"; only {left} units are left." if left else ".")
+                                 + " Nothing was charged.")
+                        success = None
+                    if success:
+                        del st.session_state.order_id
+                        st.markdown("""
+                        <div class="success-card">
+                        ✅ <b>Order Placed Successfully!</b><br>
+                        Your medicine will be delivered within 24-48 hours.<br>
+                        Confirmation sent to your phone number.
+                        </div>
+                        """, unsafe_allow_html=True)
+                        st.balloons()
+                    elif success is False:
+                        st.error("❌ Error placing order. Please try again.")
         
         st.divider()
         
@@ -232,37 +267,65 @@ with tabs[1]:
         search_query = st.text_input("Enter medicine name or category", placeholder="e.g., Paracetamol, Antibiotic, Pain Relief")
         
         if search_query:
-            filtered_meds = meds[
-                (meds["Medicine_Name"].str.contains(search_query, case=False, na=False)) |
-                (meds["Category"].str.contains(search_query, case=False, na=False))
-            ]
-            if len(filtered_meds) > 0:
+            filtered_meds = search_medicines(search_query, limit=50)
+            if filtered_meds is not None and len(filtered_meds) > 0:
                 st.dataframe(filtered_meds[["Medicine_Name", "Category", "Dosage", "Price", "Stock"]], use_container_width=True, hide_index=True)
             else:
                 st.info("ℹ️ No medicines found matching your search.")
         else:
-            st.dataframe(meds[["Medicine_Name", "Category", "Dosage", "Price", "Stock"]], use_container_width=True, hide_index=True)
+            st.dataframe(meds[["Medicine_Name", "Category", "Dosage", "Price", "Stock"]].head(100), use_container_width=True, hide_index=True)
+            if len(meds) > 100:
+                st.caption(f"Showing 100 of {len(meds)} medicines. Search to find more.")
 
 
 # ===== TAB 3: ORDERS =====
 with tabs[2]:
     st.header("📦 Order History")
     
-    orders = list_orders()
+    fcol1, fcol2, fcol3 = st.columns(3)
+    with fcol1:
+        order_phone = st.text_input("Filter by Phone", placeholder="9876543210", key="orders_phone").strip()
+    with fcol2:
+        order_status = st.selectbox("Status", ["All"] + order_statuses(), key="orders_status")
+    with fcol3:
+        order_dates = st.date_input("Date Range", value=(), key="orders_dates")
+    
+    # Totals come from the running summary, the table from one indexed page
+    summary = order_summary(order_phone or None)
     
-    if orders is None or len(orders) == 0:
+    if summary is None or summary["rows"] == 0:
         st.info("ℹ️ No orders placed yet. Start ordering medicines!")
     else:
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Orders", len(orders))
+            st.metric("Total Orders", summary["rows"])
         with col2:
-            st.metric("Total Spent", f"₹{orders['Total_Amount'].sum():.2f}")
+            st.metric("Total Spent", f"₹{summary['total']:.2f}")
         with col3:
-            st.metric("Latest Status", orders.iloc[-1]['Status'])
+            st.metric("Latest Status", summary["latest"] or "-")
         
         st.divider()
-        st.dataframe(orders, use_container_width=True, hide_index=True)
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            page_size = st.selectbox("Rows per page", [25, 50, 100], key="orders_page_size")
+        with pcol2:
+            page_number = st.number_input("Page", min_value=1, value=1, key="orders_page")
+        
+        orders, matching = orders_page(
+            phone=order_phone or None,
+            status=None if order_status == "All" else order_status,
+            date_from=order_dates[0] if len(order_dates) > 0 else None,
+            date_to=order_dates[-1] if len(order_dates) > 0 else None,
+            columns=["Date", "Order_ID", "Phone", "Medicine", "Quantity", "Total_Amount", "Payment", "Status"],
+            offset=(page_number - 1) * page_size,
+            limit=page_size
+        )
+        if orders is None or len(orders) == 0:
+            st.info("ℹ️ No orders match these filters on this page.")
+        else:
+            st.dataframe(orders, use_container_width=True, hide_index=True)
+            first = (page_number - 1) * page_size + 1
+            st.caption(f"Showing {first}-{first + len(orders) - 1} of {matching} matching orders (newest first).")
 
 
 # ===== TAB 4: DIAGNOSIS =====
@@ -293,8 +356,11 @@ with tabs[3]:
     
     with col2:
         patient_sex = st.selectbox("Patient Sex (Diagnosis)", ["Male", "Female", "Other"], key="diag_sex")
-        diagnosis_date = st.date_input("Preferred Test Date")
-        test_time = st.selectbox("Preferred Time", ["9:00 AM", "10:00 AM", "11:00 AM", "2:00 PM", "3:00 PM", "4:00 PM"])
+        diagnosis_date = st.date_input("Preferred Test Date", min_value=datetime.date.today())
+        test_times = (free_slots(selected_doctor, diagnosis_date, DIAGNOSIS_TIMES) or []) if selected_doctor else []
+        test_time = st.selectbox("Preferred Time", test_times)
+        if selected_doctor and not test_times:
+            st.warning(f"⚠️ {selected_doctor} has no free slots on {diagnosis_date}.")
     
     notes = st.text_area("Medical Notes/Symptoms", placeholder="Describe your symptoms or medical history", height=80)
     
@@ -309,18 +375,26 @@ with tabs[3]:
             st.error("❌ Provide medical notes/symptoms")
         elif selected_doctor is None:
             st.error("❌ No doctor selected")
+        elif not test_time:
+            st.error("❌ Select an available time")
         else:
-            success = save_diagnosis({
-                "Patient_Name": patient_name,
-                "Patient_Age": patient_age,
-                "Patient_Sex": patient_sex,
-                "Patient_Contact": patient_contact,
-                "Diagnosis_Type": diagnosis_type,
-                "Doctor": selected_doctor,
-                "Date": str(diagnosis_date),
-                "Time": test_time,
-                "Notes": notes
-            })
+            try:
+                success = book_diagnosis({
+                    "Patient_Name": patient_name,
+                    "Patient_Age": patient_age,
+                    "Patient_Sex": patient_sex,
+                    "Patient_Contact": patient_contact,
+                    "Diagnosis_Type": diagnosis_type,
+                    "Doctor": selected_doctor,
+                    "Date": str(diagnosis_date),
+                    "Time": test_time,
+                    "Notes": notes
+                })
+            except (SlotTaken, SlotUnavailable) as e:
+                st.error(f"❌ {e}. Please pick another time.")
+                success = None
+            except Exception:
+                success = False
             if success:
                 st.markdown("""
                 <div class="success-card">
@@ -330,13 +404,26 @@ with tabs[3]:
                 </div>
                 """, unsafe_allow_html=True)
                 st.balloons()
-            else:
+            elif success is False:
                 st.error("❌ Error booking test. Check if Diagnosis.csv exists in data folder.")
     
     st.subheader("📊 Recent Diagnosis Bookings")
-    diagnosis_list = list_diagnosis()
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        diag_filter = st.text_input("Filter by Contact Number", placeholder="9876543210", key="diag_filter").strip()
+    with dcol2:
+        diag_page = st.number_input("Page", min_value=1, value=1, key="diag_page")
+    
+    diagnosis_list, matching = diagnosis_page(
+        contact=diag_filter or None,
+        columns=["Date", "Time", "Patient_Name", "Patient_Contact", "Diagnosis_Type", "Doctor"],
+        offset=(diag_page - 1) * 50,
+        limit=50
+    )
     if diagnosis_list is not None and len(diagnosis_list) > 0:
         st.dataframe(diagnosis_list, use_container_width=True, hide_index=True)
+        first = (diag_page - 1) * 50 + 1
+        st.caption(f"Showing {first}-{first + len(diagnosis_list) - 1} of {matching} bookings (newest first).")
     else:
         st.info("ℹ️ No diagnosis bookings yet.")
 
@@ -346,28 +433,55 @@ with tabs[4]:
     st.header("❓ Healthcare Assistant - Ask Questions")
     
     st.info("💡 Ask general healthcare questions. For emergencies, call 911.")
+
+    status = rag_status()
+    if status["state"] == "loading":
+        st.caption("⏳ Knowledge base is loading. Your first answer may take a little longer.")
+    elif status["state"] == "failed":
+        st.warning(f"⚠️ Knowledge base failed to load: {status['error']}")
+    
+    index = index_status()
+    if index and index["refreshing"]:
+        st.caption("🔄 Updating the knowledge base with new documents. Answers use the current version meanwhile.")
+    elif index and index["last_refresh"]:
+        st.caption(f"📚 Knowledge base updated {time.strftime('%H:%M:%S', time.localtime(index['last_refresh']))}.")
     
     question = st.text_area(
         "Your Question",
         placeholder="E.g., What are terms and conditions for insurance?",
         height=100
     )
-    answer = None
+    # =================================================
+    # ✅ SAFE RENDERING OF answer
+    # =================================================
+    def render_bullets(text):
+        return "\n".join(
+            f"- {line.replace('•','').strip()}"
+            for line in text.split("\n")
+            if line.strip()
+        )
+
     if st.button("🤖 Get Answer", use_container_width=True, type="primary"):
         if not question or len(question) < 5:
             st.error("❌ Please ask a detailed question")
         else:
+            st.subheader("✅ Answer")
+            placeholder = st.empty()
+            answer = ""
+            # Filled in by this session's own call, never shared between users
+            st.session_state.query_timing = {}
             with st.spinner("🔍 Getting response from healthcare database..."):
-                answer = rag_query_pipeline(question)
+                for token in rag_query_stream(question, st.session_state.query_timing):
+                    answer += token
+                    placeholder.markdown(render_bullets(answer))
 
-    # =================================================
-    # ✅ SAFE RENDERING OF answer
-    # =================================================
-    if answer:
-        st.subheader("✅ Answer")
-        for line in answer.split("\n"):
-            if line.strip():
-                st.markdown(f"- {line.replace('•','').strip()}")
+            timing = st.session_state.query_timing
+            if timing.get("ttft") is not None:
+                st.caption(f"⏱️ First token in {timing['ttft']:.2f}s · total {timing['total']:.2f}s")
+            context = timing.get("context")
+            if context:
+                st.caption(f"📄 Context {context['context_tokens']} tokens "
+                           f"(saved {context['saved_tokens']} of {context['original_tokens']})")
 
     st.subheader("❓ FAQ")
     faqs = {
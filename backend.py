@@ -1,8 +1,9 @@
 import os
-import pandas as pd
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
-from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional
 
 # =========================
 # ENV & DATA DIR
@@ -10,223 +11,299 @@ from typing import List
 load_dotenv()
 DATA_DIR = "data"
 
-# =========================
-# LANGCHAIN (LATEST)
-# =========================
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_groq import ChatGroq
-from langchain_community.document_loaders import CSVLoader, PyPDFLoader, TextLoader
+# The LangChain / FAISS / sentence-transformers stack lives in rag.py and
+# is only imported on first assistant use, so the appointment, medicine
+# and order tabs never wait for (or break on) the RAG stack.
+from storage import TransactionStore
+from reference_data import ReferenceTable
+from medicine_search import MedicineSearchIndex
+from inventory import Inventory, OutOfStock, new_order_id
+from history import History
+from scheduling import (APPOINTMENT_TIMES, DIAGNOSIS_TIMES, Schedule,
+                        SlotTaken, SlotUnavailable)
+from query_router import ROUTER_ENABLED, QueryRouter
+from metrics import traced
+import metrics
 
 # ==============================
-# LOAD DOCUMENTS
+# LAZY RAG BACKEND
 # ==============================
-def load_documents() -> List[Document]:
-    documents = []
-
-    if not os.path.exists(DATA_DIR):
-        return documents
-
-    for file in os.listdir(DATA_DIR):
-        path = os.path.join(DATA_DIR, file)
-
-        try:
-            if file.endswith(".csv"):
-                loader = CSVLoader(path)
-                documents.extend(loader.load())
-
-            elif file.endswith(".pdf"):
-                loader = PyPDFLoader(path)
-                documents.extend(loader.load())
-
-            elif file.endswith(".txt"):
-                loader = TextLoader(path)
-                documents.extend(loader.load())
-        except Exception as e:
-            print(f"Skipping {file}: {e}")
-
-    return documents
+_rag = None
+_rag_lock = threading.Lock()
+_status_lock = threading.Lock()
+RAG_STATUS = {"state": "idle", "error": None, "seconds": None}
+
+def load_rag():
+    global _rag
+
+    if _rag is not None:
+        return _rag
+
+    with _rag_lock:
+        if _rag is None:
+            RAG_STATUS.update(state="loading", error=None)
+            start = time.perf_counter()
+            try:
+                import rag
+                rag.init_rag(DATA_DIR)
+            except Exception as e:
+                RAG_STATUS.update(state="failed", error=str(e))
+                raise
+            RAG_STATUS.update(state="ready", seconds=time.perf_counter() - start)
+            _rag = rag
+    return _rag
+
+def _warm():
+    try:
+        load_rag()
+    except Exception as e:
+        print(f"RAG warm-up failed: {e}")
 
-# ==============================
-# TEXT SPLITTING
-# ==============================
-def split_documents(docs: List[Document]) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100
-    )
-    return splitter.split_documents(docs)
+# Starts building the index in the background; safe to call on every rerun
+def warm_rag():
+    with _status_lock:
+        if RAG_STATUS["state"] not in ("idle", "failed"):
+            return
+        RAG_STATUS.update(state="loading", error=None)
+    threading.Thread(target=_warm, daemon=True).start()
 
-# ==============================
-# EMBEDDINGS
-# ==============================
-def get_embeddings():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def rag_status():
+    return dict(RAG_STATUS)
 
 # ==============================
-# VECTOR STORE
+# STRUCTURED QUERY ROUTING
 # ==============================
-def build_vectorstore():
-    docs = load_documents()
-    if not docs:
+# Price, stock and doctor schedule questions are answered from the
+# reference tables before the RAG stack is touched (it need not even be
+# loaded). The caller's `timing` dict, if given, receives the routed
+# answer's latency and intent, in the same shape as rag_query_stream's.
+def route_question(question: str, timing: Optional[dict] = None):
+    if ROUTER is None:
+        return None
+    start = time.perf_counter()
+    try:
+        route = ROUTER.route(question)
+    except Exception as e:
+        metrics.error("backend.route_question", e)
         return None
 
-    chunks = split_documents(docs)
-    embeddings = get_embeddings()
-    return FAISS.from_documents(chunks, embeddings)
+    if route is None:
+        return None
+    seconds = time.perf_counter() - start
+    if timing is not None:
+        timing.update(ttft=seconds, total=seconds, cached=False, interrupted=False,
+                      context=None, intent=route["intent"])
+    return route["answer"]
 
-VECTORSTORE = build_vectorstore()
+@traced("backend.rag_query_pipeline")
+def rag_query_pipeline(question: str) -> str:
+    answer = route_question(question)
+    if answer is not None:
+        return answer
+    try:
+        rag = load_rag()
+    except Exception as e:
+        return f"⚠️ Assistant unavailable: {e}"
+    return rag.rag_query_pipeline(question)
+
+@traced("backend.arag_query_pipeline")
+async def arag_query_pipeline(question: str) -> str:
+    answer = route_question(question)
+    if answer is not None:
+        return answer
+    try:
+        rag = await asyncio.to_thread(load_rag)
+    except Exception as e:
+        return f"⚠️ Assistant unavailable: {e}"
+    return await rag.arag_query_pipeline(question)
+
+def rag_query_stream(question: str, timing: Optional[dict] = None) -> Iterator[str]:
+    answer = route_question(question, timing)
+    if answer is not None:
+        yield answer
+        return
+    try:
+        rag = load_rag()
+    except Exception as e:
+        yield f"⚠️ Assistant unavailable: {e}"
+        return
+    yield from rag.rag_query_stream(question, timing)
+
+@traced("backend.rag_query_many")
+def rag_query_many(questions: List[str], **kwargs) -> List[str]:
+    answers = [route_question(q) for q in questions]
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    if pending:
+        results = load_rag().rag_query_many([questions[i] for i in pending], **kwargs)
+        for i, answer in zip(pending, results):
+            answers[i] = answer
+    return answers
+
+# Background re-index state of data/ (None until the RAG stack is loaded)
+def index_status():
+    return _rag.index_status() if _rag else None
 
 # ==============================
-# GROQ LLM
+# TRANSACTION STORE
 # ==============================
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.2,
-    api_key=os.getenv("GROQ_API_KEY")
+# Bookings and orders are appended to SQLite (WAL, group commit) instead
+# of rewriting the whole CSV per row. Existing CSVs are imported once.
+STORE = TransactionStore(
+    os.path.join(DATA_DIR, "transactions.db"),
+    legacy_csv={
+        "Appointments": f"{DATA_DIR}/Appointments.csv",
+        "orders": f"{DATA_DIR}/orders.csv",
+        "Diagnosis": f"{DATA_DIR}/Diagnosis.csv"
+    }
 )
 
-# ==============================
-# BULLET-STYLE PROMPT
-# ==============================
-prompt = PromptTemplate(
-    input_variables=["context", "question"],
-    template="""
-You are a professional healthcare assistant.
-
-Answer the question ONLY using the context below.
-Format the answer as clear step-by-step bullet points.
-Each point must be short and user friendly.
-Do NOT include model info, metadata, or explanations.
-
-Context:
-{context}
-
-Question:
-{question}
-
-Answer (bullet points only):
-"""
-)
+# Order and diagnosis history are read a page at a time; totals per phone
+# number are kept up to date as rows are written
+ORDERS = History(STORE, "orders", key="Phone", amount="Total_Amount",
+                 latest="Status", indexed=("Status",))
+DIAGNOSIS = History(STORE, "Diagnosis", key="Patient_Contact", latest="Diagnosis_Type")
 
 # ==============================
-# RAG PIPELINE
+# REFERENCE DATA
 # ==============================
-def format_docs(docs: List[Document]) -> str:
-    return "\n\n".join(doc.page_content for doc in docs)
-
-if VECTORSTORE:
-    retriever = VECTORSTORE.as_retriever(search_kwargs={"k": 4})
-
-    rag_chain = (
-        {
-            "context": retriever | format_docs,
-            "question": RunnablePassthrough()
-        }
-        | prompt
-        | llm
-    )
-else:
-    rag_chain = None
-
-def rag_query_pipeline(question: str) -> str:
-    if not rag_chain:
-        return "⚠️ Knowledge base is empty."
-
-    response = rag_chain.invoke(question)
-
-    # Extract clean text only
-    if hasattr(response, "content"):
-        return response.content.strip()
-
-    return str(response).strip()
+DOCTORS = ReferenceTable(f"{DATA_DIR}/Doctors.csv", "Doctor_Name", ("Specialization",))
+MEDICINES = ReferenceTable(f"{DATA_DIR}/Medicine.csv", "Medicine_Name", ("Category",))
+INVENTORY = Inventory(STORE, MEDICINES)
+SCHEDULE = Schedule(STORE, DOCTORS)
+ROUTER = QueryRouter(DOCTORS, MEDICINES, stock=INVENTORY.stock) if ROUTER_ENABLED else None
 
 # ==============================
 # APPOINTMENT FUNCTIONS
 # ==============================
+# Entry points are timed as spans; failures are counted, printed and
+# turned into the None/False results the UI already handles.
+@traced("backend.list_doctors", fallback=None)
 def list_doctors():
-    try:
-        return pd.read_csv(f"{DATA_DIR}/Doctors.csv")
-    except:
-        return None
+    return DOCTORS.frame()
+
+@traced("backend.get_doctor", fallback=None)
+def get_doctor(name):
+    return DOCTORS.row(name)
+
+@traced("backend.doctors_by_specialization", fallback=None)
+def doctors_by_specialization(specialization):
+    return DOCTORS.rows("Specialization", specialization)
+
+# Times still bookable for a doctor on a date (their Availability minus
+# existing appointments and diagnosis tests)
+@traced("backend.free_slots", fallback=None)
+def free_slots(doctor, date, times=APPOINTMENT_TIMES):
+    return SCHEDULE.free_slots(doctor, date, times)
 
+@traced("backend.save_appointment", fallback=False)
 def save_appointment(data):
-    try:
-        file = f"{DATA_DIR}/Appointments.csv"
-        df = pd.read_csv(file) if os.path.exists(file) else pd.DataFrame()
-        df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-        df.to_csv(file, index=False)
-        return True
-    except:
-        return False
+    SCHEDULE.reserve("Appointments", data)
+    return True
+
+# Raises SlotTaken if the slot was booked meanwhile, SlotUnavailable if
+# it's outside the doctor's hours
+@traced("backend.book_appointment")
+def book_appointment(data):
+    return SCHEDULE.reserve("Appointments", data)
 
 # ==============================
 # MEDICINES FUNCTIONS
 # ==============================
+@traced("backend.list_medicines", fallback=None)
 def list_medicines():
-    try:
-        return pd.read_csv(f"{DATA_DIR}/Medicine.csv")
-    except:
-        return None
+    return MEDICINES.frame()
+
+@traced("backend.get_medicine", fallback=None)
+def get_medicine(name):
+    return MEDICINES.row(name)
 
-def place_order(phone, address, medicine, qty, payment):
+@traced("backend.medicines_by_category", fallback=None)
+def medicines_by_category(category):
+    return MEDICINES.rows("Category", category)
+
+@traced("backend.search_medicines", fallback=None)
+def search_medicines(query, limit=50):
+    snapshot = MEDICINES.snapshot()
+    if snapshot is None:
+        return None
+    index = snapshot.derive("search", MedicineSearchIndex)
+    return index.search(query, limit)
+
+@traced("backend.current_stock", fallback=None)
+def current_stock(medicine):
+    return INVENTORY.stock(medicine)
+
+# True once placed, False if the order could not be written; raises
+# OutOfStock if another order took the stock meanwhile (nothing is
+# reserved then)
+@traced("backend.place_order")
+def place_order(phone, address, medicine, qty, payment, order_id=None):
     try:
-        meds = pd.read_csv(f"{DATA_DIR}/Medicine.csv")
-        orders_file = f"{DATA_DIR}/orders.csv"
-
-        med_row = meds[meds["Medicine_Name"] == medicine].iloc[0]
-        total = int(med_row["Price"]) * qty + 50
-
-        order = {
-            "Phone": phone,
-            "Address": address,
-            "Medicine": medicine,
-            "Quantity": qty,
-            "Payment": payment,
-            "Total_Amount": total,
-            "Status": "Confirmed",
-            "Date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-        if os.path.exists(orders_file):
-            df = pd.read_csv(orders_file)
-            df = pd.concat([df, pd.DataFrame([order])], ignore_index=True)
-        else:
-            df = pd.DataFrame([order])
-
-        df.to_csv(orders_file, index=False)
-        return True
+        INVENTORY.place(
+            [(medicine, qty)],
+            {"Phone": phone, "Address": address, "Payment": payment},
+            order_id
+        )
+    except OutOfStock:
+        raise
     except Exception as e:
-        print(e)
+        metrics.error("backend.place_order", e)
         return False
+    return True
+
+# Several medicines in one atomic order; raises OutOfStock if any line
+# cannot be filled, in which case nothing is reserved.
+@traced("backend.place_multi_order")
+def place_multi_order(phone, address, items, payment, order_id=None):
+    return INVENTORY.place(
+        items,
+        {"Phone": phone, "Address": address, "Payment": payment},
+        order_id
+    )
 
+@traced("backend.list_orders", fallback=None)
 def list_orders():
-    try:
-        return pd.read_csv(f"{DATA_DIR}/orders.csv")
-    except:
-        return None
+    return STORE.read("orders")
+
+# Newest first; returns (rows, number of matching orders)
+@traced("backend.orders_page", fallback=(None, 0))
+def orders_page(phone=None, status=None, date_from=None, date_to=None,
+                columns=None, offset=0, limit=50):
+    return ORDERS.page({"Phone": phone, "Status": status}, date_from, date_to,
+                       columns, offset, limit)
+
+# Statuses that actually occur, for the order history filter
+@traced("backend.order_statuses", fallback=[])
+def order_statuses():
+    return ORDERS.distinct("Status")
+
+# {"rows", "total", "latest", "latest_date"} for one phone or all orders
+@traced("backend.order_summary", fallback=None)
+def order_summary(phone=None):
+    return ORDERS.summary(phone)
 
 # ==============================
 # DIAGNOSIS FUNCTIONS
 # ==============================
+@traced("backend.save_diagnosis", fallback=False)
 def save_diagnosis(data):
-    try:
-        file = f"{DATA_DIR}/Diagnosis.csv"
-        df = pd.read_csv(file) if os.path.exists(file) else pd.DataFrame()
-        df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-        df.to_csv(file, index=False)
-        return True
-    except:
-        return False
+    SCHEDULE.reserve("Diagnosis", data)
+    return True
 
+@traced("backend.book_diagnosis")
+def book_diagnosis(data):
+    return SCHEDULE.reserve("Diagnosis", data)
+
+@traced("backend.list_diagnosis", fallback=None)
 def list_diagnosis():
-    try:
-        return pd.read_csv(f"{DATA_DIR}/Diagnosis.csv")
-    except:
-        return None
\ No newline at end of file
+    return STORE.read("Diagnosis")
+
+@traced("backend.diagnosis_page", fallback=(None, 0))
+def diagnosis_page(contact=None, date_from=None, date_to=None,
+                   columns=None, offset=0, limit=50):
+    return DIAGNOSIS.page({"Patient_Contact": contact}, date_from, date_to,
+                          columns, offset, limit)
+
+@traced("backend.diagnosis_summary", fallback=None)
+def diagnosis_summary(contact=None):
+    return DIAGNOSIS.summary(contact)
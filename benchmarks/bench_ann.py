@@ -0,0 +1,107 @@
+"""
+Recall vs latency benchmark for the ANN index modes in ann_index.py.
+
+Builds a synthetic clustered corpus (roughly what sentence embeddings of
+similar clinical documents look like), computes exact neighbours with a
+flat index, then for every mode and search setting reports build time,
+index size, recall@k and per-query p50/p95 latency.
+
+    python benchmarks/bench_ann.py --n 200000 --dim 384 --queries 1000 --output ann.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import build_index, tune
+
+SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128)]
+}
+
+def synthetic_corpus(n, dim, queries, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n + queries)
+    data = centers[labels] + 0.3 * rng.standard_normal((n + queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:n], data[n:]
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+def latencies(index, queries, k):
+    times = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        times.append(time.perf_counter() - start)
+        found.append(ids[0])
+    return np.array(times) * 1000, np.array(found)
+
+def index_bytes(index):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", default="flat,ivf_flat,ivf_pq,hnsw")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="FAISS OpenMP threads (single-query latency is measured)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    corpus, queries = synthetic_corpus(args.n, args.dim, args.queries, args.clusters, args.seed)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(corpus)
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for mode in args.modes.split(","):
+        start = time.perf_counter()
+        index = build_index(mode, corpus, seed=args.seed)
+        build_seconds = time.perf_counter() - start
+        size = index_bytes(index)
+
+        for params in SWEEPS[mode]:
+            tune(index, **params)
+            times, found = latencies(index, queries, args.k)
+            row = {
+                "mode": mode,
+                **params,
+                "build_seconds": round(build_seconds, 3),
+                "index_mb": round(size / 2 ** 20, 2),
+                f"recall@{args.k}": round(recall_at_k(found, truth, args.k), 4),
+                "p50_ms": round(float(np.percentile(times, 50)), 4),
+                "p95_ms": round(float(np.percentile(times, 95)), 4)
+            }
+            results.append(row)
+            print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"n": args.n, "dim": args.dim, "k": args.k, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
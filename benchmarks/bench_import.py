@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark for the non-RAG paths of backend.py.
+
+Each run starts a fresh interpreter in an empty working directory, imports
+backend and calls the pandas-only readers used by the Appointment,
+Medicines and Orders tabs. Reports min/median/max seconds and fails if
+the import pulled in LangChain, FAISS or sentence-transformers.
+
+    python benchmarks/bench_import.py --runs 10 --output import.json
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import backend
+imported = time.perf_counter() - start
+backend.list_doctors()
+backend.list_medicines()
+backend.list_orders()
+ready = time.perf_counter() - start
+heavy = sorted(m for m in ("langchain_core", "langchain_community", "faiss",
+                           "sentence_transformers", "torch") if m in sys.modules)
+print(json.dumps({"import": imported, "ready": ready, "heavy": heavy}))
+"""
+
+def run_once(workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def summarize(values):
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values)
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [run_once(workdir) for _ in range(args.runs)]
+
+    result = {
+        "runs": args.runs,
+        "import_seconds": summarize([r["import"] for r in runs]),
+        "ready_seconds": summarize([r["ready"] for r in runs]),
+        "heavy_modules": runs[-1]["heavy"]
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if result["heavy_modules"]:
+        print("FAIL: importing backend loaded", ", ".join(result["heavy_modules"]))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
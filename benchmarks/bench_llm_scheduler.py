@@ -0,0 +1,195 @@
+"""
+ChatGroq against a rate-limited local stub server, with and without the
+LLM scheduler.
+
+Starts a StubLLMServer (latency, requests/tokens per window, 429 with
+retry-after when over) and fires one burst at it: --sessions interactive
+callers asking a handful of popular questions (most ask the same few)
+while a --batch job of distinct questions runs in the background. Runs
+the burst twice, once calling ChatGroq directly (SDK retries only) and
+once through ScheduledChatModel, then an overload run in which the
+interactive deadline is shorter than the queue. Reports upstream calls,
+429s, failures and p50/p95 latency per caller class as JSON.
+
+Exits 1 unless the scheduled run got no 429s and no failures, made at
+most one upstream call per distinct question, served interactive callers
+ahead of batch, and (overload run) failed expired calls at their
+deadline without sending them upstream.
+
+    python benchmarks/bench_llm_scheduler.py
+    python benchmarks/bench_llm_scheduler.py --sessions 100 --latency 0.5 --window 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+from bench_rag import WORDS
+
+# ==============================
+# WORKLOAD
+# ==============================
+def make_prompt(rng, i, words):
+    context = " ".join(rng.choice(WORDS) for _ in range(words))
+    return f"Context:\n{context}\n\nQuestion {i}: what does the policy cover?"
+
+def workload(args):
+    rng = random.Random(args.seed)
+    popular = [make_prompt(rng, i, args.prompt_words) for i in range(args.distinct)]
+    # Zipf-like: the first questions are asked far more often
+    weights = [1 / (i + 1) for i in range(args.distinct)]
+    interactive = rng.choices(popular, weights, k=args.sessions)
+    batch = [make_prompt(rng, 1000 + i, args.prompt_words) for i in range(args.batch)]
+    return interactive, batch
+
+def summarize(seconds):
+    if not seconds:
+        return None
+    ms = np.array(seconds) * 1000
+    return {
+        "count": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "max_ms": round(float(ms.max()), 1)
+    }
+
+# ==============================
+# RUNS
+# ==============================
+def make_client(server, retries):
+    from langchain_groq import ChatGroq
+    return ChatGroq(model="llama-3.1-8b-instant", base_url=server.url, api_key="stub",
+                    max_retries=retries)
+
+def run(args, scheduled, deadline=None):
+    from stub_llm import StubLLMServer
+    from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, ScheduledChatModel, llm_priority
+
+    server = StubLLMServer(latency=args.latency, requests=args.rpm, tokens=args.tpm,
+                           window=args.window).start()
+    scheduler = None
+    if scheduled:
+        scheduler = LLMScheduler(requests=args.rpm, tokens=args.tpm, window=args.window,
+                                 concurrency=args.concurrency)
+        client = ScheduledChatModel(client=make_client(server, 0), scheduler=scheduler)
+    else:
+        client = make_client(server, 2)
+
+    interactive, batch = workload(args)
+    results = {"interactive": [], "batch": []}
+    failures = {"interactive": [], "batch": []}
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def call(kind, prompt, delay):
+        start.wait()
+        time.sleep(delay)
+        level = BATCH if kind == "batch" else INTERACTIVE
+        timeout = deadline if kind == "interactive" else None
+        t = time.perf_counter()
+        try:
+            with llm_priority(level, timeout):
+                client.invoke(prompt)
+            outcome = results
+        except Exception as e:
+            outcome = failures
+            if args.verbose:
+                print(f"{kind} failed: {type(e).__name__}: {e}")
+        with lock:
+            outcome[kind].append(time.perf_counter() - t)
+
+    # Batch starts first; the interactive burst lands while it is queued
+    threads = [threading.Thread(target=call, args=("batch", p, 0.0)) for p in batch]
+    threads += [threading.Thread(target=call, args=("interactive", p, args.stagger * i / len(interactive)))
+                for i, p in enumerate(interactive)]
+    for thread in threads:
+        thread.start()
+    wall = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall
+    server.stop()
+
+    return {
+        "wall_seconds": round(wall, 2),
+        "server": server.stats(),
+        "scheduler": scheduler.stats() if scheduler else None,
+        "interactive": summarize(results["interactive"]),
+        "batch": summarize(results["batch"]),
+        "failed": {kind: len(values) for kind, values in failures.items()},
+        "failed_interactive": summarize(failures["interactive"])
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=60, help="interactive callers")
+    parser.add_argument("--distinct", type=int, default=6, help="distinct interactive questions")
+    parser.add_argument("--batch", type=int, default=30, help="batch questions")
+    parser.add_argument("--prompt-words", type=int, default=150)
+    parser.add_argument("--stagger", type=float, default=0.5,
+                        help="interactive arrivals spread over this many seconds")
+    parser.add_argument("--latency", type=float, default=0.3, help="server latency per call")
+    parser.add_argument("--rpm", type=int, default=20, help="server requests per window")
+    parser.add_argument("--tpm", type=int, default=4000, help="server tokens per window")
+    parser.add_argument("--window", type=float, default=2.0, help="rate limit window, seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--deadline", type=float, default=1.0,
+                        help="interactive deadline in the overload run, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    result = {
+        "config": vars(args),
+        "direct": run(args, scheduled=False),
+        "scheduled": run(args, scheduled=True)
+    }
+    # Overload: twice the batch, interactive callers give up after --deadline
+    overload = argparse.Namespace(**{**vars(args), "batch": args.batch * 2})
+    result["overload"] = run(overload, scheduled=True, deadline=args.deadline)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    scheduled = result["scheduled"]
+    if scheduled["server"]["rate_limited"]:
+        failures.append(f"scheduled run got {scheduled['server']['rate_limited']} 429s")
+    if any(scheduled["failed"].values()):
+        failures.append(f"scheduled run had failed calls: {scheduled['failed']}")
+    if scheduled["server"]["served"] > args.distinct + args.batch:
+        failures.append(f"{scheduled['server']['served']} upstream calls for "
+                        f"{args.distinct + args.batch} distinct questions")
+    if scheduled["interactive"]["p95_ms"] >= scheduled["batch"]["p95_ms"]:
+        failures.append("interactive p95 not below batch p95")
+
+    overload = result["overload"]
+    expired = overload["failed_interactive"]
+    if expired and expired["max_ms"] > (args.deadline + 0.5) * 1000:
+        failures.append(f"expired interactive calls took up to {expired['max_ms']} ms "
+                        f"(deadline {args.deadline}s)")
+    if overload["server"]["rate_limited"]:
+        failures.append(f"overload run got {overload['server']['rate_limited']} 429s")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    if failures:
+        sys.exit(1)
+    print("OK: no 429s, identical prompts coalesced, interactive ahead of batch, "
+          "deadlines enforced")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+End-to-end latency benchmark for the RAG pipeline in rag.py.
+
+Generates a synthetic corpus of policy-like text files, runs ingestion
+(load_documents / split_documents / build_vectorstore) and then a query
+workload against the deterministic stub LLM. The chain is timed stage by
+stage (query embedding, hybrid retrieval, prompt assembly, LLM call,
+answer extraction) and end to end, plus a batched rag_query_many run.
+Reports throughput, p50/p95/p99 per stage and peak RSS as JSON.
+
+    python benchmarks/bench_rag.py --docs 500 --queries 200 --output rag.json
+    python benchmarks/bench_rag.py --embeddings hf --llm-latency 0.3
+
+--embeddings hash (default) uses a deterministic hashing embedding so the
+numbers isolate pipeline overhead; --embeddings hf loads the real
+sentence-transformers model used in production.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = (
+    "patient policy claim coverage hospital network provider premium insured "
+    "deductible copay treatment surgery emergency outpatient inpatient pharmacy "
+    "dosage tablet prescription renewal waiting period exclusion benefit limit "
+    "room rent ambulance maternity diagnostic consultation reimbursement cashless "
+    "document approval discharge summary invoice specialist referral"
+).split()
+
+try:
+    import resource
+
+    def peak_rss_mb():
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes elsewhere
+        return round(usage / 2 ** 20 if sys.platform == "darwin" else usage / 1024, 1)
+except ImportError:
+    def peak_rss_mb():
+        return None
+
+# ==============================
+# SYNTHETIC CORPUS
+# ==============================
+def sentence(rng, i, j):
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+    return f"Clause {i}.{j}: {words}."
+
+def write_corpus(data_dir, docs, sentences, seed):
+    rng = random.Random(seed)
+    all_sentences = []
+    for i in range(docs):
+        lines = [sentence(rng, i, j) for j in range(sentences)]
+        all_sentences.extend(lines)
+        with open(os.path.join(data_dir, f"policy_{i:05d}.txt"), "w") as f:
+            f.write("\n".join(lines))
+    return all_sentences
+
+def make_queries(rng, sentences, n):
+    queries = []
+    for text in rng.sample(sentences, min(n, len(sentences))):
+        words = text.rstrip(".").split()
+        queries.append("What does " + " ".join(words[:rng.randint(4, len(words))]) + " say?")
+    return queries
+
+# ==============================
+# STATISTICS
+# ==============================
+def summarize(seconds):
+    ms = np.array(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4)
+    }
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ==============================
+# WORKLOADS
+# ==============================
+def setup(rag, args, data_dir):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from embedding_cache import CachedEmbeddings
+    from answer_cache import AnswerCache
+    from stub_llm import StubChatModel
+    from context_builder import CONTEXT_COMPRESSION, ContextCompressor
+
+    rag.DATA_DIR = data_dir
+    if args.embeddings == "hf":
+        rag.EMBEDDINGS = rag.get_embeddings()
+    else:
+        rag.EMBEDDINGS = CachedEmbeddings(DeterministicFakeEmbedding(size=args.dim), "bench-hash")
+    rag.ANSWER_CACHE = AnswerCache(rag.EMBEDDINGS)
+    rag.COMPRESSOR = ContextCompressor(rag.EMBEDDINGS.queries) if CONTEXT_COMPRESSION else None
+    rag.llm = StubChatModel(latency=args.llm_latency)
+
+def run_ingest(rag):
+    docs, load_s = timed(rag.load_documents)
+    chunks, split_s = timed(rag.split_documents, docs)
+    (vectorstore, sparse), index_s = timed(rag.build_vectorstore)
+    rag.swap_index(vectorstore, sparse)
+
+    total = load_s + split_s + index_s
+    return {
+        "documents": len(docs),
+        "chunks": len(chunks),
+        "load_seconds": round(load_s, 3),
+        "split_seconds": round(split_s, 3),
+        "build_vectorstore_seconds": round(index_s, 3),
+        "chunks_per_second": round(len(chunks) / index_s, 1) if index_s else None,
+        "total_seconds": round(total, 3)
+    }
+
+def run_stages(rag, queries):
+    stages = {name: [] for name in ("embed", "retrieve", "prompt", "llm", "extract", "total")}
+    retrieved = []
+    saved = []
+    for q in queries:
+        vector, embed_s = timed(rag.EMBEDDINGS.embed_query, q)
+        docs, retrieve_s = timed(rag.retriever.search_many, [q], [vector])
+        context = {}
+        text, prompt_s = timed(
+            lambda: rag.prompt.format(context=rag.build_context(q, docs[0], vector, context),
+                                      question=q)
+        )
+        response, llm_s = timed(rag.llm.invoke, text)
+        _, extract_s = timed(rag.extract_text, response)
+
+        for name, value in (("embed", embed_s), ("retrieve", retrieve_s), ("prompt", prompt_s),
+                            ("llm", llm_s), ("extract", extract_s)):
+            stages[name].append(value)
+        stages["total"].append(embed_s + retrieve_s + prompt_s + llm_s + extract_s)
+        retrieved.append(len(docs[0]))
+        saved.append(context.get("saved_tokens", 0))
+
+    result = {name: summarize(values) for name, values in stages.items()}
+    result["mean_chunks_retrieved"] = round(float(np.mean(retrieved)), 2)
+    result["mean_context_tokens_saved"] = round(float(np.mean(saved)), 1)
+    return result
+
+def run_chain(rag, queries):
+    # The real LCEL chain, answer cache bypassed
+    seconds = [timed(rag.rag_chain.invoke, q)[1] for q in queries]
+    wall = sum(seconds)
+    return {**summarize(seconds), "queries_per_second": round(len(queries) / wall, 2)}
+
+def run_batch(rag, queries, concurrency):
+    rag.ANSWER_CACHE.clear()
+    _, wall = timed(rag.rag_query_many, queries, concurrency)
+    return {
+        "queries": len(queries),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "queries_per_second": round(len(queries) / wall, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--sentences", type=int, default=40, help="sentences per document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--embeddings", choices=("hash", "hf"), default="hash")
+    parser.add_argument("--dim", type=int, default=384, help="hash embedding size")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="simulated LLM round trip in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_dir = os.path.join(workdir, "data")
+        os.makedirs(data_dir)
+        # Fresh index and embedding cache so every run measures a cold ingest
+        os.environ["RAG_CACHE_DIR"] = os.path.join(workdir, ".cache")
+        os.environ["RAG_LLM"] = "stub"
+
+        sentences = write_corpus(data_dir, args.docs, args.sentences, args.seed)
+        queries = make_queries(random.Random(args.seed), sentences, args.queries)
+
+        import rag
+        setup(rag, args, data_dir)
+        rss_start = peak_rss_mb()
+
+        ingest = run_ingest(rag)
+        rss_ingest = peak_rss_mb()
+
+        stages = run_stages(rag, queries)
+        chain = run_chain(rag, queries)
+        batch = run_batch(rag, queries, args.concurrency)
+
+    result = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "ingest": ingest,
+        "query_stages": stages,
+        "chain": chain,
+        "batch": batch,
+        "peak_rss_mb": {
+            "after_setup": rss_start,
+            "after_ingest": rss_ingest,
+            "end": peak_rss_mb()
+        }
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Query latency while the data/ watcher re-indexes in the background.
+
+Builds a synthetic corpus (see bench_rag.py), starts the DataWatcher and
+runs chain queries in a loop. After --warmup seconds, --new-docs files are
+written to data/; queries keep running through the debounce, the rebuild
+and the hot-swap, then for --warmup seconds more. Reports p50/p95/p99 per
+phase (before / reindexing / after), the refresh lag, and checks that
+every query succeeded and that the new documents are retrievable after
+the swap. Exits 1 if a check fails.
+
+    python benchmarks/bench_reindex.py --docs 300 --new-docs 100
+    python benchmarks/bench_reindex.py --embeddings hf --llm-latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_rag import make_queries, run_ingest, setup, summarize, write_corpus
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--new-docs", type=int, default=50)
+    parser.add_argument("--sentences", type=int, default=40, help="sentences per document")
+    parser.add_argument("--embeddings", choices=("hash", "hf"), default="hash")
+    parser.add_argument("--dim", type=int, default=384, help="hash embedding size")
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds before and after")
+    parser.add_argument("--debounce", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_dir = os.path.join(workdir, "data")
+        os.makedirs(data_dir)
+        os.environ["RAG_CACHE_DIR"] = os.path.join(workdir, ".cache")
+        os.environ["RAG_LLM"] = "stub"
+
+        rng = random.Random(args.seed)
+        sentences = write_corpus(data_dir, args.docs, args.sentences, args.seed)
+        queries = make_queries(rng, sentences, 200)
+
+        import rag
+        from watcher import DataWatcher
+
+        setup(rag, args, data_dir)
+        ingest = run_ingest(rag)
+        before_chunks = rag.VECTORSTORE.index.ntotal
+        rag.WATCHER = DataWatcher(data_dir, rag.refresh_index,
+                                  interval=args.debounce / 2, debounce=args.debounce).start()
+
+        phases = {"before": [], "reindexing": [], "after": []}
+        errors = 0
+        phase = "before"
+        added_at = None
+        swapped_at = None
+        start = time.perf_counter()
+        i = 0
+        while True:
+            now = time.perf_counter()
+            if phase == "before" and now - start >= args.warmup:
+                # New files go to a subfolder written in one go, like a copy
+                new_dir = os.path.join(data_dir, "incoming")
+                os.makedirs(new_dir)
+                new_sentences = write_corpus(new_dir, args.new_docs, args.sentences, args.seed + 1)
+                added_at = time.perf_counter()
+                phase = "reindexing"
+            elif phase == "reindexing" and rag.WATCHER.status()["last_refresh"]:
+                swapped_at = time.perf_counter()
+                phase = "after"
+            elif phase == "after" and now - swapped_at >= args.warmup:
+                break
+
+            q = queries[i % len(queries)]
+            i += 1
+            t = time.perf_counter()
+            try:
+                rag.rag_chain.invoke(q)
+            except Exception as e:
+                errors += 1
+                print(f"query failed: {e}")
+            phases[phase].append(time.perf_counter() - t)
+
+        rag.WATCHER.stop()
+        probe = make_queries(random.Random(args.seed), new_sentences, 20)
+        found = 0
+        for q in probe:
+            docs = rag.retriever.invoke(q)
+            found += any("incoming" in d.metadata.get("source", "") for d in docs)
+        status = rag.WATCHER.status()
+
+        result = {
+            "ingest": ingest,
+            "chunks_before": before_chunks,
+            "chunks_after": rag.VECTORSTORE.index.ntotal,
+            "phases": {name: summarize(values) for name, values in phases.items() if values},
+            "refresh_lag_seconds": round(status["last_lag"], 3),
+            "added_to_live_seconds": round(swapped_at - added_at, 3),
+            "query_errors": errors,
+            "new_docs_found": f"{found}/{len(probe)}"
+        }
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if errors:
+        failures.append(f"{errors} queries failed during the re-index")
+    if result["chunks_after"] <= result["chunks_before"]:
+        failures.append("new documents were not indexed")
+    if found < len(probe) // 2:
+        failures.append(f"only {found}/{len(probe)} probes retrieved a new document")
+    for failure in failures:
+        print("FAIL:", failure)
+    if failures:
+        sys.exit(1)
+    print("OK: index swapped without failed queries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Latency benchmark for the cross-encoder reranker in reranker.py.
+
+Scores --candidates synthetic chunks per query with each backend and
+reports p50/p95/p99 per rerank call, cold (model scoring every pair) and
+warm (all pairs served from the score cache).
+
+    python benchmarks/bench_rerank.py --backends onnx,torch --queries 50
+    python benchmarks/bench_rerank.py --model ./models/ms-marco-MiniLM-L6-v2 --backends onnx
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from reranker import RERANK_MODEL, Reranker, load_cross_encoder
+
+WORDS = (
+    "patient policy claim coverage hospital network provider premium insured "
+    "deductible copay treatment surgery emergency outpatient inpatient pharmacy "
+    "dosage tablet prescription renewal waiting period exclusion benefit limit"
+).split()
+
+def text(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=RERANK_MODEL)
+    parser.add_argument("--backends", default="onnx")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [text(rng, 4, 12) for _ in range(args.queries)]
+    chunks = [[Document(page_content=text(rng, 60, 140)) for _ in range(args.candidates)]
+              for _ in queries]
+
+    results = []
+    for backend in args.backends.split(","):
+        reranker = Reranker(load_cross_encoder(args.model, backend), batch_size=args.batch_size)
+        reranker.rerank(queries[0], chunks[0][:2])
+
+        timings = {"cold": [], "warm": []}
+        for phase in ("cold", "warm"):
+            for q, docs in zip(queries, chunks):
+                start = time.perf_counter()
+                reranker.rerank(q, docs)
+                timings[phase].append(time.perf_counter() - start)
+
+        row = {"backend": backend, "candidates": args.candidates,
+               "cold": percentiles(timings["cold"]), "warm": percentiles(timings["warm"])}
+        results.append(row)
+        print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
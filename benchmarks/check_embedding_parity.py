@@ -0,0 +1,123 @@
+"""
+Parity check for the ONNX embedding backend in onnx_embeddings.py.
+
+Embeds a sample corpus with the reference model (the fp32 PyTorch
+all-MiniLM-L6-v2 through HuggingFaceEmbeddings, or an fp32 ONNX file via
+--reference) and with the candidate ONNX export, then reports per-text
+cosine similarity, top-k neighbour overlap and throughput. Exits 1 if the
+minimum or mean cosine falls below the thresholds.
+
+The sample is every chunk under --data (split like rag.split_documents)
+or, when the folder is empty, a built-in set of healthcare sentences.
+
+    python benchmarks/check_embedding_parity.py --data data --limit 500
+    python benchmarks/check_embedding_parity.py --model ./minilm-onnx \\
+        --reference onnx/model.onnx --candidate onnx/model_quint8_avx2.onnx
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from onnx_embeddings import EMBED_ONNX_FILE, EMBED_ONNX_MODEL, OnnxEmbeddings
+
+SAMPLE = [
+    "Paracetamol 500mg tablets are used to relieve mild to moderate pain and fever.",
+    "Cashless claims are available only at network hospitals listed in the policy schedule.",
+    "Clause 4.2.1: pre-existing diseases are covered after a waiting period of 36 months.",
+    "Room rent is capped at one percent of the sum insured per day.",
+    "Consult a doctor if symptoms persist for more than three days.",
+    "Ambulance charges are reimbursed up to Rs. 2000 per hospitalisation.",
+    "Maternity benefits require the policy to be active for at least nine months.",
+    "Keep insulin refrigerated between 2 and 8 degrees Celsius.",
+    "The deductible applies per claim and is not refundable.",
+    "Dr. Rao (Cardiology) is available on weekdays from 9:00 AM to 1:00 PM.",
+    "Outpatient consultations are covered up to the limit shown in the benefit table.",
+    "Amoxicillin should be taken for the full course even if symptoms improve."
+]
+
+def load_sample(data_dir, limit):
+    if data_dir and os.path.isdir(data_dir):
+        import rag
+        from ingest import find_data_files, iter_parsed
+
+        docs = []
+        for _, parsed in iter_parsed(find_data_files(data_dir)):
+            docs.extend(parsed)
+        texts = [d.page_content for d in rag.split_documents(docs)]
+        if texts:
+            return texts[:limit]
+    return SAMPLE
+
+def reference_model(args):
+    if args.reference == "hf":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=args.reference_model)
+    return OnnxEmbeddings(args.model, args.reference)
+
+def embed(model, texts):
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    seconds = time.perf_counter() - start
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), seconds
+
+def neighbour_overlap(a, b, k):
+    k = min(k, len(a) - 1)
+    if k < 1:
+        return None
+    top_a = np.argsort(-(a @ a.T), axis=1)[:, 1:k + 1]
+    top_b = np.argsort(-(b @ b.T), axis=1)[:, 1:k + 1]
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(top_a, top_b)]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--model", default=EMBED_ONNX_MODEL, help="ONNX export (repo id or dir)")
+    parser.add_argument("--candidate", default=EMBED_ONNX_FILE)
+    parser.add_argument("--reference", default="hf",
+                        help="'hf' for the PyTorch model, or an fp32 ONNX file in --model")
+    parser.add_argument("--reference-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.95)
+    parser.add_argument("--mean-cosine", type=float, default=0.99)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    texts = load_sample(args.data, args.limit)
+    reference, ref_seconds = embed(reference_model(args), texts)
+    candidate_model = OnnxEmbeddings(args.model, args.candidate)
+    candidate, cand_seconds = embed(candidate_model, texts)
+
+    cosine = np.sum(reference * candidate, axis=1)
+    result = {
+        "texts": len(texts),
+        "reference": args.reference,
+        "candidate": args.candidate,
+        "cosine_min": round(float(cosine.min()), 5),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_p01": round(float(np.percentile(cosine, 1)), 5),
+        f"top{args.k}_overlap": neighbour_overlap(reference, candidate, args.k),
+        "reference_texts_per_second": round(len(texts) / ref_seconds, 1),
+        "candidate_texts_per_second": round(len(texts) / cand_seconds, 1),
+        "candidate_padding_ratio": round(
+            candidate_model.padded_tokens / max(candidate_model.real_tokens, 1), 3
+        )
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if result["cosine_min"] < args.min_cosine or result["cosine_mean"] < args.mean_cosine:
+        print(f"FAIL: cosine below threshold (min {args.min_cosine}, mean {args.mean_cosine})")
+        sys.exit(1)
+    print("OK: ONNX embeddings match the reference")
+
+if __name__ == "__main__":
+    main()
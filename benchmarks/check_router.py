@@ -0,0 +1,91 @@
+"""
+Routing regression check for query_router.QueryRouter.
+
+Writes a small Medicine.csv / Doctors.csv, then runs two lists of
+questions through the router: catalog questions that must be answered
+from the tables with the expected intent, and dosage / clinical
+questions that name a medicine, a specialty or a doctor but must fall
+through to RAG (a canned price or stock answer to "how much can I take",
+or a doctor list for "which cardiology tests detect a heart attack", is
+a safety bug). Exits 1 on any mismatch.
+
+    python benchmarks/check_router.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from reference_data import ReferenceTable
+from query_router import QueryRouter
+
+MEDICINES = pd.DataFrame({
+    "Medicine_Name": ["Paracetamol", "Ibuprofen", "Amoxicillin", "Crocin"],
+    "Category": ["Analgesic", "Analgesic", "Antibiotic", "Analgesic"],
+    "Dosage": ["500mg", "400mg", "250mg", "650mg"],
+    "Price": [20, 35, 60, 25],
+    "Stock": [100, 0, 40, 10]
+})
+DOCTORS = pd.DataFrame({
+    "Doctor_Name": ["Dr. Rao", "Dr. Mehta"],
+    "Specialization": ["Cardiologist", "Dermatologist"],
+    "Availability": ["Mon-Fri 10am-4pm", "Sat 9am-1pm"],
+    "Phone": ["9000000001", "9000000002"]
+})
+
+# question -> expected intent (None: must go to RAG)
+CASES = {
+    "What is the price of paracetamol?": "price",
+    "Cost of amoxicillin": "price",
+    "How much does crocin cost?": "price",
+    "Is ibuprofen in stock?": "stock",
+    "How many crocin strips are left?": "stock",
+    "When is Dr. Rao available?": "doctor_schedule",
+    "Phone number of Dr. Mehta": "doctor_contact",
+    "Which cardiologist is available on Monday?": "doctor_by_specialization",
+    "List of dermatologists": "doctor_by_specialization",
+    "Who is the cardiologist here?": "doctor_by_specialization",
+    "Do you have a dermatologist?": "doctor_by_specialization",
+    # Clinical questions that mention a medicine
+    "How much paracetamol can I take per day?": None,
+    "Can I take ibuprofen if I have asthma?": None,
+    "Is it safe to buy amoxicillin without prescription?": None,
+    "What are the side effects of paracetamol when I have liver disease": None,
+    "Is 500mg of paracetamol the right dose for a child?": None,
+    "Can I take crocin while pregnant?": None,
+    "Do you have amoxicillin? I am allergic to penicillin": None,
+    # Clinical questions that mention a specialty or a doctor
+    "Which cardiology tests detect a heart attack?": None,
+    "When should I consult a dermatologist for acne?": None,
+    "What are the symptoms a cardiologist looks for?": None,
+    "Should I see Dr. Rao for chest pain?": None
+}
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        medicines_csv = os.path.join(workdir, "Medicine.csv")
+        doctors_csv = os.path.join(workdir, "Doctors.csv")
+        MEDICINES.to_csv(medicines_csv, index=False)
+        DOCTORS.to_csv(doctors_csv, index=False)
+
+        router = QueryRouter(ReferenceTable(doctors_csv, "Doctor_Name", ("Specialization",)),
+                             ReferenceTable(medicines_csv, "Medicine_Name", ("Category",)),
+                             log_path=None)
+        failures = 0
+        for question, expected in CASES.items():
+            route = router.route(question)
+            intent = route["intent"] if route else None
+            ok = intent == expected
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {str(intent):<24} {question}")
+
+    if failures:
+        print(f"FAIL: {failures}/{len(CASES)} questions routed wrongly")
+        sys.exit(1)
+    print(f"OK: {len(CASES)} questions routed as expected")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Per-worker memory with a private index copy vs the shared mmap index.
+
+For each corpus size, builds a synthetic vector store (random unit
+vectors, policy-like chunk texts) and BM25 index, saves it in the
+per-worker format (index.faiss + index.pkl + bm25.pkl, loaded into each
+process) and publishes it as a shared_index version. Then starts
+--workers processes per mode at the same time; each loads the index,
+runs --queries hybrid searches and reports how much its memory grew:
+
+    anon_mb  private (anonymous) memory, what each extra worker costs
+    pss_mb   proportional set size, shared pages split between workers
+
+Exits 1 if shared workers' private memory grows with the corpus by more
+than --max-growth of what copy workers' grows, or if the shared index
+returns different results than the in-memory one. Linux only (reads
+/proc/self/smaps_rollup).
+
+    python benchmarks/check_shared_rss.py
+    python benchmarks/check_shared_rss.py --sizes 20000,100000,200000 --workers 8
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODEL = "bench-random"
+
+# ==============================
+# MEMORY
+# ==============================
+def memory_mb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"anon_mb": fields.get("Anonymous", 0.0), "pss_mb": fields.get("Pss", 0.0),
+            "rss_mb": fields.get("Rss", 0.0)}
+
+# ==============================
+# SYNTHETIC INDEX
+# ==============================
+def build(size, dim, seed):
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    import faiss
+    from bench_rag import sentence
+    from bm25 import BM25Index
+
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"chunk-{i:07d}" for i in range(size)]
+    texts = [" ".join(sentence(rng, i, j) for j in range(3)) for i in range(size)]
+
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata={"source": f"policy_{i // 20:05d}.txt"}, id=doc_id)
+        for i, (doc_id, text) in enumerate(zip(ids, texts))
+    })
+    vectorstore = FAISS(DeterministicFakeEmbedding(size=dim), index, docstore, dict(enumerate(ids)))
+
+    sparse = BM25Index()
+    sparse.add(ids, texts)
+    return vectorstore, sparse, texts
+
+def publish(workdir, size, dim, seed):
+    from index_store import save_faiss
+    from shared_index import SharedIndex
+
+    vectorstore, sparse, texts = build(size, dim, seed)
+    copy_dir = os.path.join(workdir, f"copy-{size}")
+    os.makedirs(copy_dir)
+    save_faiss(vectorstore, copy_dir)
+    sparse.save(copy_dir)
+
+    shared_dir = os.path.join(workdir, f"shared-{size}")
+    SharedIndex(shared_dir).publish(vectorstore, sparse, str(size), MODEL)
+    return copy_dir, shared_dir, texts
+
+# ==============================
+# WORKER
+# ==============================
+def queries(texts, n, dim, seed):
+    rng = random.Random(seed)
+    questions = [" ".join(rng.choice(texts).split()[2:8]) for _ in range(n)]
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    return questions, vectors
+
+def load(mode, path, dim):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    embeddings = DeterministicFakeEmbedding(size=dim)
+
+    if mode == "copy":
+        from ann_index import load_faiss
+        from bm25 import BM25Index
+        return load_faiss(path, embeddings), BM25Index.load(path)
+
+    from shared_index import SharedIndex
+    shared = SharedIndex(path)
+    return shared.open(shared.current(), embeddings, MODEL)
+
+def search(vectorstore, sparse, dim, questions, vectors):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from retrievers import HybridRetriever
+
+    retriever = HybridRetriever(vectorstore=vectorstore, sparse=sparse,
+                                embeddings=DeterministicFakeEmbedding(size=dim))
+    results = retriever.search_many(questions, vectors)
+    return [[d.id for d in docs] for docs in results]
+
+def worker(args):
+    # Everything imported before the baseline so only the index counts
+    import faiss  # noqa: F401
+    import retrievers  # noqa: F401
+    import shared_index  # noqa: F401
+    import bm25  # noqa: F401
+
+    with open(os.path.join(args.path, "questions.json")) as f:
+        questions = json.load(f)
+    vectors = np.load(os.path.join(args.path, "vectors.npy"))
+
+    before = memory_mb()
+    vectorstore, sparse = load(args.worker, args.path, args.dim)
+    results = search(vectorstore, sparse, args.dim, questions, vectors)
+    after = memory_mb()
+
+    print(json.dumps({
+        **{key: round(after[key] - before[key], 1) for key in after},
+        "results": results
+    }), flush=True)
+    # Stay alive until every worker has reported, so shared pages are
+    # really shared when PSS is measured
+    sys.stdin.read()
+
+def run_workers(mode, path, n, dim):
+    procs = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", mode,
+                          "--path", path, "--dim", str(dim)],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(n)
+    ]
+    reports = []
+    for proc in procs:
+        line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{mode} worker exited with {proc.wait()}")
+        reports.append(json.loads(line))
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+
+    results = reports[0]["results"]
+    summary = {key: round(float(np.mean([r[key] for r in reports])), 1)
+               for key in ("anon_mb", "pss_mb", "rss_mb")}
+    return summary, results
+
+# ==============================
+# MAIN
+# ==============================
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,40000,100000", help="chunks per corpus")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--max-growth", type=float, default=0.1,
+                        help="allowed shared/copy ratio of private memory growth")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--worker", choices=("copy", "shared"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("check_shared_rss.py needs Linux (/proc/self/smaps_rollup)")
+
+    rows = []
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            copy_dir, shared_dir, texts = publish(workdir, size, args.dim, args.seed)
+            questions, vectors = queries(texts, args.queries, args.dim, args.seed)
+            for path in (copy_dir, shared_dir):
+                with open(os.path.join(path, "questions.json"), "w") as f:
+                    json.dump(questions, f)
+                np.save(os.path.join(path, "vectors.npy"), vectors)
+
+            copy, copy_results = run_workers("copy", copy_dir, args.workers, args.dim)
+            shared, shared_results = run_workers("shared", shared_dir, args.workers, args.dim)
+            mismatches += sum(a != b for a, b in zip(copy_results, shared_results))
+            rows.append({"chunks": size, "copy": copy, "shared": shared})
+            print(f"{size:>8} chunks  copy anon {copy['anon_mb']:>7.1f} MB pss {copy['pss_mb']:>7.1f} MB"
+                  f"  |  shared anon {shared['anon_mb']:>6.1f} MB pss {shared['pss_mb']:>7.1f} MB",
+                  flush=True)
+
+    copy_growth = rows[-1]["copy"]["anon_mb"] - rows[0]["copy"]["anon_mb"]
+    shared_growth = rows[-1]["shared"]["anon_mb"] - rows[0]["shared"]["anon_mb"]
+    result = {
+        "workers": args.workers,
+        "dim": args.dim,
+        "sizes": rows,
+        "copy_anon_growth_mb": round(copy_growth, 1),
+        "shared_anon_growth_mb": round(shared_growth, 1),
+        "result_mismatches": mismatches
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if mismatches:
+        failures.append(f"{mismatches}/{args.queries * len(rows)} queries returned different chunks")
+    if len(rows) > 1 and shared_growth > max(args.max_growth * copy_growth, 8.0):
+        failures.append(f"shared workers grew {shared_growth:.1f} MB private memory "
+                        f"(copy workers {copy_growth:.1f} MB)")
+    for failure in failures:
+        print("FAIL:", failure)
+    if failures:
+        sys.exit(1)
+    print("OK: per-worker private memory stays flat with the shared index")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Concurrency stress check for inventory.Inventory.
+
+Several processes, each with many threads, order the same medicine until
+it sells out. The run fails (exit code 1) if stock goes negative, if the
+units sold don't match the stock decrement, if the orders table disagrees
+with the number of accepted orders, or if a replayed order_id is charged
+twice.
+
+    python benchmarks/stress_inventory.py --processes 4 --threads 16 --stock 5000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import TransactionStore
+from reference_data import ReferenceTable
+from inventory import Inventory, OutOfStock, new_order_id
+
+SKU = "Paracetamol"
+
+def open_inventory(workdir):
+    store = TransactionStore(os.path.join(workdir, "transactions.db"))
+    catalog = ReferenceTable(os.path.join(workdir, "Medicine.csv"), "Medicine_Name")
+    return store, Inventory(store, catalog)
+
+def worker(workdir, threads, seed, results):
+    _, inventory = open_inventory(workdir)
+    sold = [0] * threads
+    accepted = [0] * threads
+    duplicates = [0] * threads
+
+    def run(slot):
+        rng = random.Random(seed * 1000 + slot)
+        while True:
+            qty = rng.randint(1, 3)
+            order_id = new_order_id()
+            try:
+                inventory.place([(SKU, qty)], {"Phone": str(slot)}, order_id)
+            except OutOfStock:
+                if inventory.stock(SKU) < 1:
+                    return
+                continue
+            sold[slot] += qty
+            accepted[slot] += 1
+
+            # Replaying the same order_id must be a no-op
+            if rng.random() < 0.05:
+                replay = inventory.place([(SKU, qty)], {"Phone": str(slot)}, order_id)
+                duplicates[slot] += int(not replay["duplicate"])
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put((sum(sold), sum(accepted), sum(duplicates)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "Medicine.csv"), "w") as f:
+            f.write("Medicine_Name,Category,Dosage,Price,Stock\n")
+            f.write(f"{SKU},Pain Relief,500mg,20,{args.stock}\n")
+
+        store, inventory = open_inventory(workdir)
+        inventory.stock(SKU)
+
+        results = multiprocessing.Queue()
+        start = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=worker, args=(workdir, args.threads, i, results))
+            for i in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        totals = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        sold = sum(t[0] for t in totals)
+        accepted = sum(t[1] for t in totals)
+        double_charged = sum(t[2] for t in totals)
+        remaining = inventory.stock(SKU)
+        order_rows = store.query("SELECT COUNT(*) FROM orders")[0][0]
+
+        print(f"{accepted} orders, {sold} units in {elapsed:.2f}s "
+              f"({accepted / elapsed:.0f} orders/s), remaining stock {remaining}")
+
+        errors = []
+        if remaining < 0:
+            errors.append(f"stock went negative: {remaining}")
+        if sold != args.stock - remaining:
+            errors.append(f"sold {sold} but stock dropped by {args.stock - remaining}")
+        if order_rows != accepted:
+            errors.append(f"{order_rows} order rows for {accepted} accepted orders")
+        if double_charged:
+            errors.append(f"{double_charged} replayed order ids were charged again")
+
+        for error in errors:
+            print("FAIL:", error)
+        if errors:
+            sys.exit(1)
+        print("OK: no oversell, no double charge")
+
+if __name__ == "__main__":
+    main()
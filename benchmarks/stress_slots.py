@@ -0,0 +1,142 @@
+"""
+Concurrency load test for scheduling.Schedule.
+
+Several processes, each with many threads, book appointments for a pool
+of doctors over the next --days days until every slot is taken. Threads
+mostly pick from free_slots() like the UI does and sometimes try a random
+slot blindly to force collisions. The run fails (exit code 1) if any
+(doctor, date, time) is booked twice, if the Appointments table and the
+slot table disagree, if accepted bookings don't match the rows written,
+or if a slot is left free at the end.
+
+    python benchmarks/stress_slots.py --processes 4 --threads 16 --doctors 20 --days 30
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import TransactionStore
+from reference_data import ReferenceTable
+from scheduling import APPOINTMENT_TIMES, Schedule, SlotTaken
+
+def open_schedule(workdir):
+    store = TransactionStore(os.path.join(workdir, "transactions.db"))
+    doctors = ReferenceTable(os.path.join(workdir, "Doctors.csv"), "Doctor_Name")
+    return store, Schedule(store, doctors)
+
+def slots(args):
+    # From tomorrow: today's earlier slots can no longer be booked
+    start = datetime.date.today() + datetime.timedelta(days=1)
+    dates = [str(start + datetime.timedelta(days=i)) for i in range(args.days)]
+    doctors = [f"Dr. Test {i}" for i in range(args.doctors)]
+    return doctors, dates
+
+def worker(workdir, args, seed, results):
+    _, schedule = open_schedule(workdir)
+    doctors, dates = slots(args)
+    accepted = [0] * args.threads
+    conflicts = [0] * args.threads
+
+    def run(slot):
+        rng = random.Random(seed * 1000 + slot)
+        pending = [(d, day) for d in doctors for day in dates]
+        rng.shuffle(pending)
+        while pending:
+            doctor, day = pending[-1]
+            free = schedule.free_slots(doctor, day)
+            if not free:
+                pending.pop()
+                continue
+            if rng.random() < 0.2:
+                free = APPOINTMENT_TIMES
+            try_book(rng, doctor, day, rng.choice(free), slot)
+
+    def try_book(rng, doctor, day, time_slot, slot):
+        try:
+            schedule.reserve("Appointments", {
+                "Patient_Name": f"p{seed}-{slot}", "Patient_Contact": str(rng.randint(10**9, 10**10 - 1)),
+                "Doctor": doctor, "Date": day, "Time": time_slot
+            })
+        except SlotTaken:
+            conflicts[slot] += 1
+            return False
+        accepted[slot] += 1
+        return True
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(args.threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put((sum(accepted), sum(conflicts)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        doctors, dates = slots(args)
+        with open(os.path.join(workdir, "Doctors.csv"), "w") as f:
+            f.write("Doctor_Name,Specialization,Experience,Availability,Phone\n")
+            for name in doctors:
+                f.write(f"{name},General Physician,10,Daily,9000000000\n")
+
+        store, _ = open_schedule(workdir)
+        capacity = len(doctors) * len(dates) * len(APPOINTMENT_TIMES)
+
+        results = multiprocessing.Queue()
+        start = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=worker, args=(workdir, args, i, results))
+            for i in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        totals = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        accepted = sum(t[0] for t in totals)
+        conflicts = sum(t[1] for t in totals)
+        rows = store.query("SELECT COUNT(*) FROM Appointments")[0][0]
+        distinct = store.query(
+            "SELECT COUNT(*) FROM (SELECT DISTINCT Doctor, Date, Time FROM Appointments)"
+        )[0][0]
+        claimed = store.query("SELECT COUNT(*) FROM slot_bookings")[0][0]
+        _, schedule = open_schedule(workdir)
+        left = sum(len(schedule.free_slots(d, day)) for d in doctors for day in dates)
+
+        print(f"{accepted} bookings of {capacity} slots in {elapsed:.2f}s "
+              f"({accepted / elapsed:.0f} bookings/s), {conflicts} rejected as taken")
+
+        errors = []
+        if distinct != rows:
+            errors.append(f"{rows - distinct} slots were double-booked")
+        if rows != accepted:
+            errors.append(f"{rows} appointment rows for {accepted} accepted bookings")
+        if claimed != rows:
+            errors.append(f"{claimed} claimed slots for {rows} appointment rows")
+        if accepted != capacity or left:
+            errors.append(f"{capacity - accepted} slots never booked ({left} still shown free)")
+
+        for error in errors:
+            print("FAIL:", error)
+        if errors:
+            sys.exit(1)
+        print("OK: every slot booked exactly once")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import re
+import pickle
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# ==============================
+# TOKENIZER
+# ==============================
+# Keeps dotted numbers together so policy clauses like "4.2.1" and
+# dosages like "2.5" stay searchable as exact terms.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+# Scores every document in `postings` (one (doc numbers, term
+# frequencies) pair per query term, live documents only) and returns the
+# best k doc numbers with their scores, highest first
+def bm25_top(postings: Sequence[Tuple[np.ndarray, np.ndarray]], lengths: np.ndarray,
+             live: int, avg_length: float, k1: float, b: float,
+             k: int) -> Tuple[np.ndarray, np.ndarray]:
+    all_docs, all_scores = [], []
+    for docs, tfs in postings:
+        if not len(docs):
+            continue
+        idf = np.log(1 + (live - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+        all_docs.append(docs)
+        all_scores.append(idf * tfs * (k1 + 1) / (tfs + norm))
+
+    if not all_docs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    # Sum per-term contributions for every document that matched any term
+    docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+    values = np.bincount(inverse, weights=np.concatenate(all_scores))
+    if len(docs) > k:
+        top = np.argpartition(-values, k)[:k]
+        docs, values = docs[top], values[top]
+    order = np.argsort(-values)
+    return docs[order], values[order]
+
+# ==============================
+# BM25 INVERTED INDEX
+# ==============================
+# Documents get a dense internal number; each term keeps parallel
+# (doc number, term frequency) posting lists. Removals only flip an
+# `alive` flag and the dead entries are compacted away once they make up
+# a large share of the index, so incremental syncs stay cheap.
+class BM25Index:
+    FILE = "bm25.pkl"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.number = {}
+        self.lengths = array("i")
+        self.alive = bytearray()
+        self.postings = {}
+        self.total_length = 0
+        self.live = 0
+        self._arrays = {}
+        self._lengths = None
+        self._alive = None
+
+    def __len__(self) -> int:
+        return self.live
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self.number:
+                self.remove([doc_id])
+
+            n = len(self.ids)
+            tokens = tokenize(text)
+            self.ids.append(doc_id)
+            self.number[doc_id] = n
+            self.lengths.append(len(tokens))
+            self.alive.append(1)
+            self.total_length += len(tokens)
+            self.live += 1
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                docs, tfs = self.postings.setdefault(token, (array("i"), array("i")))
+                docs.append(n)
+                tfs.append(tf)
+                self._arrays.pop(token, None)
+
+        self._lengths = None
+        self._alive = None
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            n = self.number.pop(doc_id, None)
+            if n is None or not self.alive[n]:
+                continue
+            self.alive[n] = 0
+            self.total_length -= self.lengths[n]
+            self.live -= 1
+
+        self._alive = None
+        if len(self.ids) > 1000 and self.live < len(self.ids) * 0.7:
+            self.compact()
+
+    def compact(self):
+        alive = np.frombuffer(bytes(self.alive), dtype=np.uint8).astype(bool)
+        remap = np.cumsum(alive) - 1
+
+        postings = {}
+        for token, (docs, tfs) in self.postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.int32)
+            keep = alive[docs]
+            if keep.any():
+                postings[token] = (array("i", remap[docs[keep]].astype(np.int32).tobytes()),
+                                   array("i", tfs[keep].tobytes()))
+
+        ids = [doc_id for n, doc_id in enumerate(self.ids) if alive[n]]
+        self.ids = ids
+        self.lengths = array("i", np.array(self.lengths, dtype=np.int32)[alive].tobytes())
+        self.alive = bytearray(b"\x01" * len(ids))
+        self.number = {doc_id: n for n, doc_id in enumerate(ids)}
+        self.postings = postings
+        self._arrays = {}
+        self._lengths = None
+        self._alive = None
+
+    def _posting(self, token: str):
+        arrays = self._arrays.get(token)
+        if arrays is None:
+            entry = self.postings.get(token)
+            if entry is None:
+                return None
+            arrays = (np.array(entry[0], dtype=np.int32),
+                      np.array(entry[1], dtype=np.float32))
+            self._arrays[token] = arrays
+        return arrays
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        if not self.live:
+            return []
+        if self._lengths is None:
+            self._lengths = np.array(self.lengths, dtype=np.float32)
+        if self._alive is None:
+            self._alive = np.frombuffer(bytes(self.alive), dtype=np.uint8).astype(bool)
+
+        postings = []
+        for token in set(tokenize(query)):
+            posting = self._posting(token)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            live = self._alive[docs]
+            postings.append((docs[live], tfs[live]))
+
+        docs, values = bm25_top(postings, self._lengths, self.live,
+                                self.total_length / self.live or 1.0, self.k1, self.b, k)
+        return [(self.ids[d], float(v)) for d, v in zip(docs, values)]
+
+    # ---------- persistence ----------
+    def save(self, index_dir: str):
+        if self.live < len(self.ids):
+            self.compact()
+        state = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "lengths": self.lengths,
+            "postings": self.postings
+        }
+        path = os.path.join(index_dir, self.FILE)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        with open(os.path.join(index_dir, cls.FILE), "rb") as f:
+            state = pickle.load(f)
+
+        index = cls(state["k1"], state["b"])
+        index.ids = list(state["ids"])
+        index.number = {doc_id: n for n, doc_id in enumerate(index.ids)}
+        index.lengths = state["lengths"]
+        index.alive = bytearray(b"\x01" * len(index.ids))
+        index.total_length = int(sum(index.lengths))
+        index.live = len(index.ids)
+        index.postings = state["postings"]
+        return index
+
+# ==============================
+# RECIPROCAL RANK FUSION
+# ==============================
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    weights: Sequence[float] = None,
+    k: int = 60
+) -> List[Tuple[str, float]]:
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
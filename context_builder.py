@@ -0,0 +1,154 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from bm25 import tokenize
+
+# ==============================
+# CONFIG
+# ==============================
+CONTEXT_COMPRESSION = os.getenv("RAG_CONTEXT_COMPRESSION", "1") == "1"
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "400"))
+DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.95"))
+LEXICAL_WEIGHT = 0.3
+
+SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+PIECE_RE = re.compile(r"\w+|[^\w\s]")
+FIELD_RE = re.compile(r"^[^:\n]{1,60}:")
+
+# Word and punctuation pieces; close enough to BPE counts for budgeting
+def estimate_tokens(text: str) -> int:
+    return len(PIECE_RE.findall(text))
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_RE.split(text) if len(s.strip()) > 2]
+
+def _normal(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s.]", " ", text.lower()).split())
+
+# A CSV row (CSVLoader sets metadata["row"]) or any chunk made only of
+# "Field: value" lines. Its lines only mean something together, so it
+# is kept or dropped as one unit.
+def is_record(doc: Document) -> bool:
+    if "row" in doc.metadata:
+        return True
+    lines = [line for line in doc.page_content.splitlines() if line.strip()]
+    return len(lines) > 1 and all(FIELD_RE.match(line) for line in lines)
+
+# ==============================
+# CONTEXT COMPRESSOR
+# ==============================
+# Sentences from the retrieved chunks are scored against the question
+# (embedding cosine plus a small bonus for shared terms, so clause numbers
+# and drug names count even when the embedding misses them), then packed
+# greedily into the token budget. Records (see is_record) are scored and
+# packed whole. Exact repeats are dropped anywhere; a fragment is only
+# dropped in favour of a longer sentence from another chunk of the same
+# source (the splitter's overlap window), and embedding near-duplicates
+# are only skipped between prose sentences, never records. Kept sentences
+# stay grouped by chunk in their original order, chunks ordered by their
+# best sentence.
+class ContextCompressor:
+    def __init__(self, embeddings, budget: int = CONTEXT_TOKENS,
+                 dedup_threshold: float = DEDUP_THRESHOLD):
+        self.embeddings = embeddings
+        self.budget = budget
+        self.dedup_threshold = dedup_threshold
+
+    # (chunk number, position, text, is record) per unit, and how many
+    # duplicates were dropped
+    def _candidates(self, docs: List[Document]) -> Tuple[List[Tuple[int, int, str, bool]], int]:
+        kept = {}
+        sources = {}
+        duplicates = 0
+        for d, doc in enumerate(docs):
+            record = is_record(doc)
+            source = doc.metadata.get("source")
+            units = [doc.page_content.strip()] if record else split_sentences(doc.page_content)
+            for s, sentence in enumerate(units):
+                key = _normal(sentence)
+                if key in kept:
+                    duplicates += 1
+                    continue
+                if not record:
+                    overlap = [k for k, (c, _, _, rec) in kept.items()
+                               if not rec and c != d and sources[k] == source]
+                    # Fragment cut from a sentence another chunk has whole
+                    if any(key in other for other in overlap):
+                        duplicates += 1
+                        continue
+                    # A fragment seen earlier gives way to the full sentence
+                    for other in [k for k in overlap if k in key]:
+                        del kept[other]
+                        duplicates += 1
+                kept[key] = (d, s, sentence, record)
+                sources[key] = source
+        return list(kept.values()), duplicates
+
+    def _scores(self, question: str, sentences: List[str], vector=None) -> Tuple[np.ndarray, np.ndarray]:
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        q = np.asarray(vector, dtype=np.float32)
+        m = np.asarray(self.embeddings.embed_documents(sentences), dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        m /= np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+        terms = set(tokenize(question))
+        lexical = np.array([
+            len(terms.intersection(tokenize(s))) / len(terms) if terms else 0.0
+            for s in sentences
+        ], dtype=np.float32)
+        return m @ q + LEXICAL_WEIGHT * lexical, m
+
+    def compress(self, question: str, docs: List[Document], vector=None) -> Tuple[str, Dict]:
+        original = "\n\n".join(doc.page_content for doc in docs)
+        stats = {
+            "original_tokens": estimate_tokens(original),
+            "context_tokens": 0,
+            "saved_tokens": 0,
+            "sentences": 0,
+            "kept": 0,
+            "duplicates": 0
+        }
+
+        candidates, stats["duplicates"] = self._candidates(docs)
+        stats["sentences"] = len(candidates) + stats["duplicates"]
+        if not candidates:
+            return "", stats
+
+        sentences = [c[2] for c in candidates]
+        prose = np.array([not c[3] for c in candidates])
+        scores, matrix = self._scores(question, sentences, vector)
+
+        chosen = []
+        used = 0
+        for i in np.argsort(-scores):
+            cost = estimate_tokens(sentences[i])
+            # The best sentence is always kept, even if it alone busts the budget
+            if chosen and used + cost > self.budget:
+                continue
+            similar = [c for c in chosen if prose[c]] if prose[i] else []
+            if similar and float(np.max(matrix[similar] @ matrix[i])) >= self.dedup_threshold:
+                stats["duplicates"] += 1
+                continue
+            chosen.append(int(i))
+            used += cost
+
+        best = {}
+        for i in chosen:
+            d = candidates[i][0]
+            best[d] = max(best.get(d, -np.inf), float(scores[i]))
+
+        passages = []
+        for d in sorted(best, key=lambda d: -best[d]):
+            kept = sorted((candidates[i][1], candidates[i][2]) for i in chosen if candidates[i][0] == d)
+            passages.append(" ".join(sentence for _, sentence in kept))
+
+        text = "\n\n".join(passages)
+        stats["context_tokens"] = estimate_tokens(text)
+        stats["saved_tokens"] = stats["original_tokens"] - stats["context_tokens"]
+        stats["kept"] = len(chosen)
+        return text, stats
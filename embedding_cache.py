@@ -0,0 +1,306 @@
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from index_store import CACHE_DIR
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+EMBED_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "100000"))
+# Questions and compressor sentences get their own, smaller ring so they
+# never evict the chunk vectors that index rebuilds depend on
+QUERY_CACHE_DIR = os.path.join(CACHE_DIR, "query_embeddings")
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "20000"))
+KEY_BYTES = 16
+
+# ==============================
+# CROSS-PROCESS LOCK
+# ==============================
+try:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _try_lock(f) -> bool:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _try_lock(f) -> bool:
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+@contextmanager
+def file_lock(path: str):
+    with open(path, "a+b") as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+# Non-blocking: returns the open lock file (the lock lasts until it is
+# closed or the process exits), or None if another process holds it
+def try_lock(path: str):
+    f = open(path, "a+b")
+    if _try_lock(f):
+        return f
+    f.close()
+    return None
+
+# ==============================
+# MEMORY-MAPPED VECTOR STORE
+# ==============================
+# Layout per model directory:
+#   meta.json    dim + capacity
+#   vectors.f32  capacity x dim float32 rows
+#   keys.bin     capacity x 16-byte text digests (all zero = empty slot)
+#   state.u64    total number of inserts; slot = total % capacity
+# Writers take the lock file and overwrite the oldest slot (ring buffer
+# eviction). A slot's key is zeroed before its vector is rewritten, so
+# lock-free readers re-check the key after copying a vector.
+class EmbeddingStore:
+    def __init__(self, model_name: str, capacity: int = EMBED_CACHE_SIZE,
+                 root: str = EMBED_CACHE_DIR):
+        slug = hashlib.sha1(model_name.encode()).hexdigest()[:12]
+        self.dir = os.path.join(root, slug)
+        self.lock_path = os.path.join(self.dir, "lock")
+        self.capacity = capacity
+        self.dim = None
+
+        self._vectors = None
+        self._keys = None
+        self._state = None
+        self._slots = {}
+        self._owners = []
+        self._seen = 0
+        self._mutex = threading.Lock()
+
+    @staticmethod
+    def key(text: str, kind: str = "doc") -> bytes:
+        return hashlib.blake2b(
+            f"{kind}\0{text}".encode("utf-8"),
+            digest_size=KEY_BYTES
+        ).digest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def _open(self) -> bool:
+        try:
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32,
+                                  mode="r+", shape=(self.capacity, self.dim))
+        self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8,
+                               mode="r+", shape=(self.capacity, KEY_BYTES))
+        self._state = np.memmap(self._path("state.u64"), dtype=np.uint64,
+                                mode="r+", shape=(1,))
+        self._owners = [None] * self.capacity
+        return True
+
+    def _create(self, dim: int):
+        os.makedirs(self.dir, exist_ok=True)
+        with file_lock(self.lock_path):
+            if self._open():
+                return
+
+            np.memmap(self._path("vectors.f32"), dtype=np.float32,
+                      mode="w+", shape=(self.capacity, dim)).flush()
+            np.memmap(self._path("keys.bin"), dtype=np.uint8,
+                      mode="w+", shape=(self.capacity, KEY_BYTES)).flush()
+            np.memmap(self._path("state.u64"), dtype=np.uint64,
+                      mode="w+", shape=(1,)).flush()
+
+            # meta.json is written last so readers never see a partial store
+            tmp = self._path("meta.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"dim": dim, "capacity": self.capacity}, f)
+            os.replace(tmp, self._path("meta.json"))
+            self._open()
+
+    def _refresh(self):
+        total = int(self._state[0])
+        if total == self._seen:
+            return
+
+        if total - self._seen >= self.capacity:
+            self._slots = {}
+            self._owners = [None] * self.capacity
+            slots = range(self.capacity)
+        else:
+            slots = (i % self.capacity for i in range(self._seen, total))
+
+        empty = bytes(KEY_BYTES)
+        for slot in slots:
+            digest = self._keys[slot].tobytes()
+            self._assign(slot, None if digest == empty else digest)
+        self._seen = total
+
+    # Points the slot at its new digest and forgets the one it replaced,
+    # so _slots never holds more than `capacity` entries
+    def _assign(self, slot: int, digest: Optional[bytes]):
+        old = self._owners[slot]
+        if old is not None and self._slots.get(old) == slot:
+            del self._slots[old]
+        self._owners[slot] = digest
+        if digest is not None:
+            self._slots[digest] = slot
+
+    def get_many(self, digests: List[bytes]) -> List[Optional[np.ndarray]]:
+        with self._mutex:
+            if self._vectors is None and not self._open():
+                return [None] * len(digests)
+
+            self._refresh()
+            found = []
+            for digest in digests:
+                slot = self._slots.get(digest)
+                if slot is None:
+                    found.append(None)
+                    continue
+
+                vector = np.array(self._vectors[slot])
+                if self._keys[slot].tobytes() != digest:
+                    # Slot was recycled by another writer
+                    self._slots.pop(digest, None)
+                    found.append(None)
+                    continue
+                found.append(vector)
+            return found
+
+    def put_many(self, digests: List[bytes], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(digests):
+            return
+
+        with self._mutex:
+            if self._vectors is None and not self._open():
+                self._create(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                return
+
+            with file_lock(self.lock_path):
+                self._refresh()
+                total = int(self._state[0])
+                for digest, vector in zip(digests, vectors):
+                    slot = total % self.capacity
+                    self._keys[slot] = 0
+                    self._vectors[slot] = vector
+                    self._keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+                    self._assign(slot, digest)
+                    total += 1
+                self._state[0] = total
+                self._seen = total
+
+# ==============================
+# CACHE-BACKED EMBEDDINGS
+# ==============================
+# Chunk texts go through embed_documents and the large store. Everything
+# asked per question (the question itself, compressor sentences) goes
+# through embed_query or the `queries` view and the small query store.
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 capacity: int = EMBED_CACHE_SIZE,
+                 query_capacity: int = QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = EmbeddingStore(model_name, capacity)
+        self.query_store = EmbeddingStore(model_name, query_capacity, root=QUERY_CACHE_DIR)
+        self.queries = QueryEmbeddings(self)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, store: EmbeddingStore, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        try:
+            return store.get_many(keys)
+        except Exception as e:
+            print(f"Embedding cache read failed: {e}")
+            return [None] * len(keys)
+
+    def _store(self, store: EmbeddingStore, keys: List[bytes], vectors):
+        try:
+            store.put_many(keys, vectors)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def embed_many(self, texts: List[str], kind: str = "doc") -> List[List[float]]:
+        store = self.store if kind == "doc" else self.query_store
+        cache = "embedding" if kind == "doc" else "query_embedding"
+        keys = [store.key(text, kind) for text in texts]
+        vectors = self._lookup(store, keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            with metrics.span("embed.documents" if kind == "doc" else "embed.query"):
+                if kind == "query" and len(missing) == 1:
+                    fresh = [self.embeddings.embed_query(next(iter(missing.values())))]
+                else:
+                    fresh = self.embeddings.embed_documents(list(missing.values()))
+            self._store(store, list(missing), fresh)
+            by_key = dict(zip(missing, fresh))
+            vectors = [by_key[k] if v is None else v for k, v in zip(keys, vectors)]
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        metrics.incr("cache_requests_total", len(missing), cache=cache, result="miss")
+        metrics.incr("cache_requests_total", len(texts) - len(missing), cache=cache, result="hit")
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_many(texts, "doc")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_many([text], "query")[0]
+
+# Same model, query store only: for question batches and compressor
+# sentences, which are embedded with embed_documents but are not chunks
+class QueryEmbeddings(Embeddings):
+    def __init__(self, cached: CachedEmbeddings):
+        self.cached = cached
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cached.embed_many(texts, "sentence")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cached.embed_query(text)
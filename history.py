@@ -0,0 +1,138 @@
+import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from storage import TransactionStore, quote
+
+ALL = ""
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _key(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+# date / datetime / "YYYY-MM-DD" -> [start, end + 1 day) on the string
+# Date column ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" sort the same way)
+def date_range(date_from=None, date_to=None) -> Tuple[Optional[str], Optional[str]]:
+    low = str(date_from)[:10] if date_from else None
+    high = None
+    if date_to:
+        day = datetime.date.fromisoformat(str(date_to)[:10])
+        high = str(day + datetime.timedelta(days=1))
+    return low, high
+
+# ==============================
+# HISTORY TABLES
+# ==============================
+# Read side of an append-only table in the transaction store: indexed
+# filters and offset/limit pages instead of loading the whole table, plus
+# per-key running aggregates (row count, amount total, latest value)
+# kept in <table>_summary. The summary is updated by an insert hook in the
+# same transaction as the row, so the UI reads it without a scan. The
+# ALL key holds the totals over every row.
+class History:
+    def __init__(self, store: TransactionStore, table: str, key: str, date: str = "Date",
+                 amount: Optional[str] = None, latest: Optional[str] = None,
+                 indexed: Sequence[str] = ()):
+        self.store = store
+        self.table = table
+        self.key = key
+        self.date = date
+        self.amount = amount
+        self.latest = latest
+        self.summary_table = f"{table}_summary"
+
+        for column in (key, date, *indexed):
+            store.index(table, column)
+        # Registered on the writer thread so no row can slip in between
+        # the consistency check and the hook
+        store.execute(self._setup)
+
+    def _setup(self, conn):
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote(self.summary_table)} "
+            "(key TEXT PRIMARY KEY, rows INTEGER NOT NULL, total REAL NOT NULL, "
+            "latest TEXT, latest_date TEXT)"
+        )
+        self._rebuild_if_stale(conn)
+        self.store.on_insert(self.table, self._on_insert)
+
+    # Rows imported from CSV (or written by a process without the hook)
+    # are not in the summary yet; recompute it once from the table
+    def _rebuild_if_stale(self, conn):
+        columns = self.store.table_columns(conn, self.table)
+        rows = conn.execute(
+            f"SELECT COUNT(*) FROM {quote(self.table)}"
+        ).fetchone()[0] if columns else 0
+        counted = conn.execute(
+            f"SELECT rows FROM {quote(self.summary_table)} WHERE key = ?", (ALL,)
+        ).fetchone()
+        if (counted[0] if counted else 0) == rows:
+            return
+
+        def column(name):
+            return quote(name) if name in columns else "NULL"
+
+        # SQLite takes bare columns from the MAX(rowid) row of each group
+        select = (
+            f"SELECT {{group}}, COUNT(*), TOTAL({column(self.amount)}), "
+            f"{column(self.latest)}, {column(self.date)}, MAX(rowid) FROM {quote(self.table)}"
+        )
+        conn.execute(f"DELETE FROM {quote(self.summary_table)}")
+        for row in conn.execute(select.format(group="?"), (ALL,)).fetchall() + conn.execute(
+            select.format(group=f"CAST({column(self.key)} AS TEXT)")
+            + f" WHERE {column(self.key)} IS NOT NULL GROUP BY 1"
+        ).fetchall():
+            conn.execute(
+                f"INSERT INTO {quote(self.summary_table)} VALUES (?, ?, ?, ?, ?)", row[:5]
+            )
+
+    def _on_insert(self, conn, row: Dict):
+        values = (
+            _number(row.get(self.amount)) if self.amount else 0.0,
+            _key(row.get(self.latest)) if self.latest else None,
+            _key(row.get(self.date))
+        )
+        keys = [ALL]
+        if row.get(self.key) is not None:
+            keys.append(_key(row[self.key]))
+        for key in keys:
+            conn.execute(
+                f"INSERT INTO {quote(self.summary_table)} VALUES (?, 1, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET rows = rows + 1, total = total + excluded.total, "
+                "latest = excluded.latest, latest_date = excluded.latest_date",
+                (key, *values)
+            )
+
+    # ---------- readers ----------
+    def summary(self, key=None) -> Optional[Dict[str, Any]]:
+        rows = self.store.query(
+            f"SELECT rows, total, latest, latest_date FROM {quote(self.summary_table)} "
+            "WHERE key = ?", (ALL if key is None else _key(key),)
+        )
+        if not rows:
+            return None
+        count, total, latest, latest_date = rows[0]
+        return {"rows": count, "total": total, "latest": latest, "latest_date": latest_date}
+
+    # Values present in an (indexed) column, e.g. for a filter's options
+    def distinct(self, column: str) -> List[str]:
+        rows = self.store.query(
+            f"SELECT DISTINCT {quote(column)} FROM {quote(self.table)} "
+            f"WHERE {quote(column)} IS NOT NULL ORDER BY 1"
+        )
+        return [str(value) for value, in rows]
+
+    def page(self, equals: Optional[Dict[str, Any]] = None, date_from=None, date_to=None,
+             columns: Optional[List[str]] = None, offset: int = 0, limit: int = 50
+             ) -> Tuple[Optional[pd.DataFrame], int]:
+        return self.store.page(
+            self.table, columns, equals,
+            {self.date: date_range(date_from, date_to)},
+            offset=offset, limit=limit
+        )
@@ -0,0 +1,261 @@
+import os
+import json
+import shutil
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from ingest import IngestStats, stream_chunks
+from bm25 import BM25Index
+from ann_index import INDEX_MODE, INDEX_MMAP, convert, delete_ids, load_faiss
+
+# ==============================
+# CACHE LOCATION
+# ==============================
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".cache")
+INDEX_DIR = os.path.join(CACHE_DIR, "faiss_index")
+MANIFEST_FILE = "manifest.json"
+
+# ==============================
+# FILE FINGERPRINTS
+# ==============================
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(path: str, digest: str, i: int) -> str:
+    return f"{path}::{digest[:16]}::{i}"
+
+# ==============================
+# MANIFEST
+# ==============================
+def load_manifest(index_dir: str = INDEX_DIR) -> Dict:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest: Dict, index_dir: str = INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+# ==============================
+# INDEX PERSISTENCE
+# ==============================
+def load_index(embeddings, index_dir: str = INDEX_DIR, mmap: bool = False) -> Optional[FAISS]:
+    try:
+        return load_faiss(index_dir, embeddings, mmap)
+    except Exception as e:
+        print(f"Rebuilding index ({index_dir} unreadable: {e})")
+        return None
+
+# The BM25 index is saved next to the FAISS files and always mirrors the
+# same chunk ids; it is rebuilt from the docstore if missing or unreadable.
+def load_sparse(vectorstore: FAISS, index_dir: str = INDEX_DIR) -> BM25Index:
+    try:
+        sparse = BM25Index.load(index_dir)
+        if set(sparse.ids) == set(vectorstore.index_to_docstore_id.values()):
+            return sparse
+    except Exception:
+        pass
+
+    sparse = BM25Index()
+    ids = list(vectorstore.index_to_docstore_id.values())
+    sparse.add(ids, [vectorstore.docstore.search(i).page_content for i in ids])
+    return sparse
+
+# Written next to the old files and renamed over them: a process that
+# has the old index.faiss memory-mapped keeps reading the old inode
+# instead of a file truncated under it
+def save_faiss(vectorstore: FAISS, index_dir: str = INDEX_DIR):
+    save_index(vectorstore, None, None, index_dir)
+
+# FAISS files, BM25 index and manifest are all written to a temp dir
+# first and then renamed in, manifest last. The renames are not one
+# atomic step, so sync_index() never trusts the manifest alone: see
+# reconcile().
+def save_index(vectorstore: FAISS, sparse: Optional[BM25Index], manifest: Optional[Dict],
+               index_dir: str = INDEX_DIR):
+    tmp = index_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    vectorstore.save_local(tmp)
+    if sparse is not None:
+        sparse.save(tmp)
+    if manifest is not None:
+        save_manifest(manifest, tmp)
+
+    os.makedirs(index_dir, exist_ok=True)
+    names = sorted(os.listdir(tmp), key=lambda name: name == MANIFEST_FILE)
+    for name in names:
+        os.replace(os.path.join(tmp, name), os.path.join(index_dir, name))
+    os.rmdir(tmp)
+
+def clear_index(index_dir: str = INDEX_DIR):
+    shutil.rmtree(index_dir, ignore_errors=True)
+
+# ==============================
+# INCREMENTAL SYNC
+# ==============================
+# Compares the data files against the manifest and returns the entries
+# that are still valid, the files that need (re)indexing and the chunk
+# ids that must be dropped.
+def plan_changes(files: List[str], old_entries: Dict) -> Tuple[Dict, Dict, List[str]]:
+    entries = {}
+    changed = {}
+    stale_ids = []
+
+    for path in files:
+        try:
+            st = os.stat(path)
+            old = old_entries.get(path)
+
+            if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+                entries[path] = old
+                continue
+
+            digest = file_hash(path)
+        except OSError as e:
+            print(f"Skipping {os.path.basename(path)}: {e}")
+            continue
+
+        if old and old["hash"] == digest:
+            entries[path] = {**old, "size": st.st_size, "mtime": st.st_mtime}
+            continue
+
+        if old:
+            stale_ids.extend(old["chunk_ids"])
+        changed[path] = {
+            "path": path,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "hash": digest,
+            "chunk_ids": []
+        }
+
+    for path, old in old_entries.items():
+        if path not in entries and path not in changed:
+            stale_ids.extend(old["chunk_ids"])
+
+    return entries, changed, stale_ids
+
+# Makes the plan match what the saved index really holds (it can differ
+# after a crash between writing the index and the manifest). Files whose
+# chunks are missing are re-indexed; chunks no kept file owns (stale or
+# half-written ones) are returned for deletion.
+def reconcile(vectorstore: FAISS, entries: Dict, changed: Dict) -> List[str]:
+    known = set(vectorstore.index_to_docstore_id.values())
+    for path, entry in list(entries.items()):
+        if not known.issuperset(entry["chunk_ids"]):
+            del entries[path]
+            changed[path] = {**entry, "chunk_ids": []}
+
+    keep = {i for entry in entries.values() for i in entry["chunk_ids"]}
+    return [i for i in vectorstore.index_to_docstore_id.values() if i not in keep]
+
+def sync_index(
+    files: List[str],
+    embeddings,
+    split: Callable[[List[Document]], List[Document]],
+    model_name: str,
+    index_dir: str = INDEX_DIR,
+    index_mode: str = INDEX_MODE
+) -> Tuple[Optional[FAISS], Optional[BM25Index]]:
+    manifest = load_manifest(index_dir)
+
+    # A manifest written for another embedding model or index type is useless
+    usable = (manifest.get("model") == model_name
+              and manifest.get("index_mode", "flat") == index_mode)
+    old_entries = manifest.get("files", {}) if usable else {}
+    entries, changed, stale_ids = plan_changes(files, old_entries)
+
+    vectorstore = None
+    if old_entries:
+        # Nothing to write: map the saved index read-only instead of copying it
+        unchanged = not changed and not stale_ids
+        vectorstore = load_index(embeddings, index_dir, mmap=INDEX_MMAP and unchanged)
+        if vectorstore is None:
+            entries, changed, stale_ids = plan_changes(files, {})
+        else:
+            stale_ids = reconcile(vectorstore, entries, changed)
+            if unchanged and not changed and not stale_ids:
+                # A file touched without changing its content only needs
+                # its new size/mtime recorded, or every sync re-hashes it
+                if entries != old_entries:
+                    save_manifest({"model": model_name, "index_mode": index_mode,
+                                   "files": entries}, index_dir)
+                return vectorstore, load_sparse(vectorstore, index_dir)
+            if unchanged:
+                # Mapped read-only, but the saved index needs repairing
+                vectorstore = load_index(embeddings, index_dir)
+                if vectorstore is None:
+                    entries, changed, stale_ids = plan_changes(files, {})
+
+    sparse = load_sparse(vectorstore, index_dir) if vectorstore else BM25Index()
+
+    if vectorstore and stale_ids:
+        delete_ids(vectorstore, stale_ids)
+        sparse.remove(stale_ids)
+
+    # Changed files stream through parse -> split -> embed -> index in
+    # fixed-size batches instead of being materialized all at once
+    stats = IngestStats()
+    added = 0
+    for batch in stream_chunks(list(changed), split, stats):
+        texts = [doc.page_content for _, _, doc in batch]
+        metadatas = [doc.metadata for _, _, doc in batch]
+        ids = []
+        for path, i, _ in batch:
+            entry = changed[path]
+            ids.append(chunk_id(path, entry["hash"], i))
+            entry["chunk_ids"].append(ids[-1])
+
+        with stats.timed("embed", len(batch)):
+            vectors = embeddings.embed_documents(texts)
+
+        with stats.timed("index", len(batch)):
+            pairs = list(zip(texts, vectors))
+            if vectorstore:
+                vectorstore.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+            else:
+                vectorstore = FAISS.from_embeddings(
+                    pairs, embeddings, metadatas=metadatas, ids=ids
+                )
+            sparse.add(ids, texts)
+        added += len(batch)
+
+    for path, entry in changed.items():
+        if path not in stats.failed:
+            entries[path] = entry
+
+    if not any(e["chunk_ids"] for e in entries.values()):
+        clear_index(index_dir)
+        return None, None
+
+    # New chunks land in a flat index; train the configured ANN index on
+    # them once the corpus is large enough
+    if index_mode != "flat":
+        with stats.timed("train", vectorstore.index.ntotal):
+            convert(vectorstore, index_mode)
+
+    save_index(vectorstore, sparse,
+               {"model": model_name, "index_mode": index_mode, "files": entries}, index_dir)
+
+    print(stats.summary())
+    print(
+        f"Index synced: {added} chunks embedded, "
+        f"{len(stale_ids)} removed, {len(entries)} files tracked"
+    )
+
+    if INDEX_MMAP:
+        vectorstore = load_index(embeddings, index_dir, mmap=True) or vectorstore
+    return vectorstore, sparse
@@ -0,0 +1,216 @@
+import os
+import time
+import queue
+import multiprocessing
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import CSVLoader, PyPDFLoader, TextLoader
+
+# ==============================
+# CONFIG
+# ==============================
+SUPPORTED_EXTENSIONS = (".csv", ".pdf", ".txt")
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+PARSE_QUEUE_SIZE = 8
+
+# ==============================
+# FILE DISCOVERY & PARSING
+# ==============================
+def find_data_files(data_dir: str) -> List[str]:
+    files = []
+    for root, _, names in os.walk(data_dir):
+        for name in names:
+            if name.endswith(SUPPORTED_EXTENSIONS):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+def load_file(path: str) -> List[Document]:
+    if path.endswith(".csv"):
+        return CSVLoader(path).load()
+
+    elif path.endswith(".pdf"):
+        return PyPDFLoader(path).load()
+
+    elif path.endswith(".txt"):
+        return TextLoader(path).load()
+
+    return []
+
+# Runs inside the worker processes, so it must stay a top-level function
+def _parse(path: str):
+    start = time.perf_counter()
+    try:
+        return path, load_file(path), time.perf_counter() - start, None
+    except Exception as e:
+        return path, [], time.perf_counter() - start, str(e)
+
+# ==============================
+# STAGE TIMING
+# ==============================
+class IngestStats:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.failed = []
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        self.seconds[stage] += seconds
+        self.counts[stage] += count
+
+    @contextmanager
+    def timed(self, stage: str, count: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count)
+
+    def summary(self) -> str:
+        stages = ", ".join(
+            f"{stage} {self.counts[stage]} in {self.seconds[stage]:.2f}s"
+            for stage in self.seconds
+        )
+        wall = time.perf_counter() - self.started
+        return f"Ingest {wall:.2f}s wall ({stages})"
+
+# ==============================
+# PIPELINE STAGES
+# ==============================
+def iter_parsed(
+    paths: List[str],
+    stats: IngestStats = None,
+    workers: int = INGEST_WORKERS
+) -> Iterator[Tuple[str, List[Document]]]:
+    stats = stats or IngestStats()
+
+    def record(result):
+        path, docs, seconds, error = result
+        stats.add("parse", seconds)
+        if error:
+            stats.failed.append(path)
+            print(f"Skipping {os.path.basename(path)}: {error}")
+        return path, docs
+
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield record(_parse(path))
+        return
+
+    # Keep a bounded number of files in flight so parsed pages never
+    # pile up faster than the splitter consumes them
+    # Spawned, not forked: the parent may already hold threads and locks
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = set()
+        for path in paths:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield record(future.result())
+            pending.add(pool.submit(_parse, path))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield record(future.result())
+
+def iter_chunks(
+    parsed: Iterable[Tuple[str, List[Document]]],
+    split: Callable[[List[Document]], List[Document]],
+    stats: IngestStats
+) -> Iterator[Tuple[str, int, Document]]:
+    for path, docs in parsed:
+        if not docs:
+            continue
+
+        with stats.timed("split"):
+            chunks = split(docs)
+
+        for i, chunk in enumerate(chunks):
+            yield path, i, chunk
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ==============================
+# BOUNDED QUEUES BETWEEN STAGES
+# ==============================
+_DONE = object()
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+# Waits on the queue the same way, so a consumer whose producer gave up
+# on `stop` (without posting _DONE) doesn't block forever
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE, None
+
+def _pipe(items: Iterator, maxsize: int, stop: threading.Event) -> Iterator:
+    q = queue.Queue(maxsize)
+
+    def run():
+        try:
+            for item in items:
+                if not _put(q, (item, None), stop):
+                    return
+            _put(q, (_DONE, None), stop)
+        except BaseException as e:
+            _put(q, (_DONE, e), stop)
+        finally:
+            close = getattr(items, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item, error = _get(q, stop)
+        if item is _DONE:
+            if error:
+                raise error
+            return
+        yield item
+
+# ==============================
+# STREAMING ENTRY POINT
+# ==============================
+# parse (process pool) -> split (thread) -> fixed-size batches (caller),
+# each hop through a bounded queue so peak memory stays at a few files
+# plus a couple of batches regardless of corpus size.
+def stream_chunks(
+    paths: List[str],
+    split: Callable[[List[Document]], List[Document]],
+    stats: IngestStats,
+    batch_size: int = EMBED_BATCH_SIZE,
+    workers: int = INGEST_WORKERS
+) -> Iterator[List[Tuple[str, int, Document]]]:
+    stop = threading.Event()
+    parsed = _pipe(iter_parsed(paths, stats, workers), PARSE_QUEUE_SIZE, stop)
+    chunks = _pipe(iter_chunks(parsed, split, stats), batch_size * 2, stop)
+    try:
+        yield from batched(chunks, batch_size)
+    finally:
+        stop.set()
@@ -0,0 +1,123 @@
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from storage import TransactionStore
+from reference_data import ReferenceTable
+
+DELIVERY_CHARGE = 50
+
+class OutOfStock(Exception):
+    pass
+
+def new_order_id() -> str:
+    return uuid.uuid4().hex
+
+# ==============================
+# INVENTORY
+# ==============================
+# Stock levels live in the transaction store, seeded from the Stock column
+# of Medicine.csv the first time a SKU is seen. An order is one operation
+# on the store's writer thread: the idempotency check, a conditional
+# decrement per line (`stock >= qty`) and the order rows commit or roll
+# back together, so concurrent sessions and processes can never oversell
+# and a retried order_id is never charged twice.
+class Inventory:
+    def __init__(self, store: TransactionStore, catalog: ReferenceTable):
+        self.store = store
+        self.catalog = catalog
+        self._seeded = None
+        self.store.execute(self._create_tables)
+
+    @staticmethod
+    def _create_tables(conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS inventory "
+            "(medicine TEXT PRIMARY KEY, stock INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS order_requests "
+            "(order_id TEXT PRIMARY KEY, total INTEGER NOT NULL, created TEXT NOT NULL)"
+        )
+
+    def _sync_catalog(self):
+        snapshot = self.catalog.snapshot()
+        if snapshot is None or snapshot.version == self._seeded:
+            return snapshot
+
+        rows = []
+        df = snapshot.df
+        for name, stock in zip(df["Medicine_Name"].tolist(), df["Stock"].tolist()):
+            try:
+                rows.append((name, int(stock)))
+            except (TypeError, ValueError):
+                rows.append((name, 0))
+
+        # Existing SKUs keep their live stock; only new ones are seeded
+        self.store.execute(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO inventory VALUES (?, ?)", rows
+        ))
+        self._seeded = snapshot.version
+        return snapshot
+
+    def stock(self, medicine: str) -> Optional[int]:
+        self._sync_catalog()
+        rows = self.store.query(
+            "SELECT stock FROM inventory WHERE medicine = ?", (medicine,)
+        )
+        return rows[0][0] if rows else None
+
+    def place(self, items: List[Tuple[str, int]], details: Dict,
+              order_id: Optional[str] = None) -> Dict:
+        snapshot = self._sync_catalog()
+        if snapshot is None:
+            raise RuntimeError("Medicine catalog is not available")
+
+        lines = []
+        for medicine, qty in items:
+            row = snapshot.row(medicine)
+            if row is None:
+                raise KeyError(f"Unknown medicine: {medicine}")
+            if int(qty) < 1:
+                raise ValueError(f"Invalid quantity for {medicine}: {qty}")
+            lines.append((medicine, int(qty), int(row["Price"])))
+
+        order_id = order_id or new_order_id()
+        total = sum(price * qty for _, qty, price in lines) + DELIVERY_CHARGE
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        def reserve(conn):
+            previous = conn.execute(
+                "SELECT total FROM order_requests WHERE order_id = ?", (order_id,)
+            ).fetchone()
+            if previous:
+                return {"order_id": order_id, "total": previous[0], "duplicate": True}
+
+            for medicine, qty, _ in lines:
+                cursor = conn.execute(
+                    "UPDATE inventory SET stock = stock - ? "
+                    "WHERE medicine = ? AND stock >= ?",
+                    (qty, medicine, qty)
+                )
+                if cursor.rowcount != 1:
+                    raise OutOfStock(medicine)
+
+            conn.execute(
+                "INSERT INTO order_requests VALUES (?, ?, ?)", (order_id, total, date)
+            )
+            for i, (medicine, qty, price) in enumerate(lines):
+                # Delivery is charged once per order, on its first line
+                self.store.insert(conn, "orders", {
+                    "Phone": details.get("Phone"),
+                    "Address": details.get("Address"),
+                    "Medicine": medicine,
+                    "Quantity": qty,
+                    "Payment": details.get("Payment"),
+                    "Total_Amount": price * qty + (DELIVERY_CHARGE if i == 0 else 0),
+                    "Status": "Confirmed",
+                    "Date": date,
+                    "Order_ID": order_id
+                })
+            return {"order_id": order_id, "total": total, "duplicate": False}
+
+        return self.store.execute(reserve)
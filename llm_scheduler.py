@@ -0,0 +1,449 @@
+import os
+import json
+import time
+import heapq
+import random
+import hashlib
+import itertools
+import threading
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import metrics
+
+try:
+    from groq import APIConnectionError
+    RETRYABLE = (ConnectionError, APIConnectionError)
+except ImportError:
+    RETRYABLE = (ConnectionError,)
+
+# ==============================
+# CONFIG
+# ==============================
+# Upstream quota per RAG_LLM_RATE_WINDOW seconds; defaults are Groq's
+# free tier for llama-3.1-8b-instant. 0 disables a limit.
+LLM_RPM = int(os.getenv("RAG_LLM_RPM", "30"))
+LLM_TPM = int(os.getenv("RAG_LLM_TPM", "6000"))
+LLM_RATE_WINDOW = float(os.getenv("RAG_LLM_RATE_WINDOW", "60"))
+# Share of the quota that may go out as an instant burst
+LLM_BURST = float(os.getenv("RAG_LLM_BURST", "0.2"))
+LLM_CONCURRENCY = int(os.getenv("RAG_LLM_CONCURRENCY", "8"))
+# Reserved per call for the answer; corrected from reported usage after
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("RAG_LLM_MAX_OUTPUT_TOKENS", "256"))
+LLM_MAX_ATTEMPTS = int(os.getenv("RAG_LLM_MAX_ATTEMPTS", "4"))
+LLM_RETRY_BACKOFF = 0.5
+
+# Interactive callers (chat box) go ahead of batch ones and give up sooner
+INTERACTIVE = 0
+BATCH = 1
+DEADLINES = {
+    INTERACTIVE: float(os.getenv("RAG_LLM_DEADLINE", "30")),
+    BATCH: float(os.getenv("RAG_LLM_BATCH_DEADLINE", "300"))
+}
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority = ContextVar("llm_priority", default=INTERACTIVE)
+_deadline = ContextVar("llm_deadline", default=None)
+
+# Calls made inside the block (and tasks / executor threads started from
+# it) are scheduled at `level` and, with `timeout`, must finish within
+# that many seconds of entering it instead of the level's default
+@contextmanager
+def llm_priority(level: int, timeout: Optional[float] = None):
+    tokens = [(_priority, _priority.set(level))]
+    if timeout is not None:
+        tokens.append((_deadline, _deadline.set(time.monotonic() + timeout)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class LLMBusy(RuntimeError):
+    pass
+
+class DeadlineExceeded(LLMBusy):
+    pass
+
+# The scheduler gave up on a call: attempts used up, or an error retrying
+# won't fix. Already retried here, so callers must not retry it again.
+class LLMFailed(RuntimeError):
+    pass
+
+# The leader of a coalesced call stopped before finishing (e.g. a closed
+# stream); its followers start over
+class _Abandoned(LLMBusy):
+    pass
+
+# ~4 characters per token for English text
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+# (seconds to wait, rate limited?) for a failed call, (None, False) when
+# retrying won't help
+def retry_delay(error: Exception, attempt: int) -> Tuple[Optional[float], bool]:
+    backoff = LLM_RETRY_BACKOFF * 2 ** (attempt - 1) * (0.5 + random.random() / 2)
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            return float(headers.get("retry-after")), True
+        except (TypeError, ValueError):
+            return backoff, True
+    if (isinstance(status, int) and status >= 500) or isinstance(error, RETRYABLE):
+        return backoff, False
+    return None, False
+
+# ==============================
+# TOKEN BUCKET
+# ==============================
+# Holds at most `limit * burst` and refills at the rest of the quota per
+# window, so no `window`-second span sees more than `limit` even against
+# a sliding-window counter upstream. Not thread-safe; LLMScheduler calls
+# it under its own lock.
+class TokenBucket:
+    def __init__(self, limit: float, window: float, burst: float = LLM_BURST):
+        self.limit = limit
+        self.capacity = max(1.0, limit * burst)
+        self.rate = (limit - self.capacity if limit > self.capacity else limit) / window
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until `n` can be taken (a request larger than the bucket
+    # only waits for a full one)
+    def wait(self, n: float, now: float) -> float:
+        if self.limit <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(n, self.capacity) - self.level
+        return max(0.0, missing / self.rate) if missing > 0 else 0.0
+
+    def take(self, n: float, now: float):
+        if self.limit > 0:
+            self._refill(now)
+            self.level -= min(n, self.capacity)
+
+    # Return over-reserved tokens (or charge more, going into debt)
+    def give(self, n: float):
+        if self.limit > 0:
+            self.level = min(self.capacity, self.level + n)
+
+# ==============================
+# SCHEDULER
+# ==============================
+class _Ticket:
+    __slots__ = ("priority", "seq", "deadline", "queued")
+
+    def __init__(self, priority: int, seq: int, deadline: float):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.queued = time.monotonic()
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class _Flight:
+    def __init__(self, ticket: _Ticket):
+        self.ticket = ticket
+        self.future = Future()
+
+# Every upstream LLM call goes through here:
+#   - identical in-flight calls (same key) share one upstream request;
+#     a higher-priority follower lifts the leader's place in the queue
+#   - calls start in (priority, arrival) order once a concurrency slot,
+#     a request and the estimated tokens are available
+#   - a call that can't start (or finish retrying) before its deadline
+#     raises DeadlineExceeded instead of waiting on
+#   - 429s pause all dispatch for the server's retry-after; 5xx and
+#     connection errors are retried with backoff
+class LLMScheduler:
+    def __init__(self, requests: float = LLM_RPM, tokens: float = LLM_TPM,
+                 window: float = LLM_RATE_WINDOW, concurrency: int = LLM_CONCURRENCY,
+                 max_attempts: int = LLM_MAX_ATTEMPTS):
+        self.requests = TokenBucket(requests, window)
+        self.tokens = TokenBucket(tokens, window)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        # Re-entrant, so counters can be bumped while holding it
+        self._cond = threading.Condition(threading.RLock())
+        self._queue: List[_Ticket] = []
+        self._running = 0
+        self._paused_until = 0.0
+        self._flights = {}
+        self._seq = itertools.count()
+        self.counts = {"upstream": 0, "coalesced": 0, "rate_limited": 0,
+                       "retried": 0, "deadline_exceeded": 0}
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.counts, "queued": len(self._queue), "running": self._running}
+
+    def _count(self, name: str, **labels):
+        with self._cond:
+            self.counts[name] += 1
+        metrics.incr(f"llm_{name}_total", **labels)
+
+    def _deadline(self, priority: Optional[int], deadline: Optional[float]) -> Tuple[int, float]:
+        priority = _priority.get() if priority is None else priority
+        if deadline is None:
+            deadline = _deadline.get()
+        if deadline is None:
+            deadline = time.monotonic() + DEADLINES.get(priority, DEADLINES[BATCH])
+        return priority, deadline
+
+    def _expired(self, ticket_priority: int, what: str):
+        self._count("deadline_exceeded", priority=PRIORITY_NAMES.get(ticket_priority))
+        raise DeadlineExceeded(f"LLM request deadline passed while {what}")
+
+    # ---------- single flight ----------
+    def _join(self, key: str, priority: int, deadline: float) -> Tuple[_Flight, bool]:
+        with self._cond:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(_Ticket(priority, next(self._seq), deadline))
+                self._flights[key] = flight
+                return flight, True
+            if priority < flight.ticket.priority:
+                flight.ticket.priority = priority
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+        self._count("coalesced", priority=PRIORITY_NAMES.get(priority))
+        return flight, False
+
+    # The leader's result, or None when it gave up early and this caller
+    # still has time to make the call itself
+    def _follow(self, flight: _Flight, priority: int, deadline: float):
+        try:
+            return flight.future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self._expired(priority, "waiting for an identical request")
+        except (DeadlineExceeded, _Abandoned):
+            if time.monotonic() >= deadline:
+                raise
+            return None
+
+    def _land(self, key: str, flight: _Flight, result=None, error: BaseException = None):
+        with self._cond:
+            self._flights.pop(key, None)
+        if error is not None:
+            flight.future.set_exception(error if isinstance(error, Exception) else _Abandoned())
+        else:
+            flight.future.set_result(result)
+
+    # ---------- admission ----------
+    def _acquire(self, ticket: _Ticket, cost: float):
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            metrics.gauge("llm_queue_depth", len(self._queue))
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= ticket.deadline:
+                        self._expired(ticket.priority, "queued")
+                    wait = ticket.deadline - now
+                    if self._queue[0] is ticket and self._running < self.concurrency:
+                        ready = max(self._paused_until - now, self.requests.wait(1, now),
+                                    self.tokens.wait(cost, now))
+                        if ready <= 0:
+                            heapq.heappop(self._queue)
+                            self.requests.take(1, now)
+                            self.tokens.take(cost, now)
+                            self._running += 1
+                            self._cond.notify_all()
+                            metrics.observe("llm_queue_seconds", now - ticket.queued,
+                                            priority=PRIORITY_NAMES.get(ticket.priority))
+                            return
+                        wait = min(wait, ready)
+                    self._cond.wait(wait)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def _release(self, cost: float, used: Optional[float]):
+        with self._cond:
+            self._running -= 1
+            if used is not None:
+                self.tokens.give(min(cost, self.tokens.capacity) - used)
+            self._cond.notify_all()
+
+    # Returns the delay before the next attempt, or raises LLMFailed
+    def _backoff(self, ticket: _Ticket, error: Exception, attempt: int) -> float:
+        delay, limited = retry_delay(error, attempt)
+        if delay is None or attempt >= self.max_attempts:
+            raise LLMFailed(f"LLM call failed after {attempt} attempt(s): "
+                            f"{type(error).__name__}: {error}") from error
+        if limited:
+            self._count("rate_limited")
+        if time.monotonic() + delay >= ticket.deadline:
+            self._expired(ticket.priority, "retrying")
+        self._count("retried")
+        if limited:
+            # Everyone waits out the server's retry-after, not just this call
+            with self._cond:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return 0.0
+        return delay
+
+    # ---------- calls ----------
+    # fn(timeout) makes the upstream call and returns the message
+    def call(self, key: str, fn: Callable[[float], Any], cost: float,
+             priority: int = None, deadline: float = None):
+        priority, deadline = self._deadline(priority, deadline)
+        while True:
+            flight, leader = self._join(key, priority, deadline)
+            if not leader:
+                result = self._follow(flight, priority, deadline)
+                if result is not None:
+                    return result
+                continue
+
+            try:
+                result = self._run(flight.ticket, fn, cost)
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, result)
+            return result
+
+    def _run(self, ticket: _Ticket, fn: Callable[[float], Any], cost: float):
+        attempt = 0
+        while True:
+            self._acquire(ticket, cost)
+            used = None
+            try:
+                self._count("upstream")
+                result = fn(max(0.0, ticket.deadline - time.monotonic()))
+                used = _used_tokens(result)
+                return result
+            except Exception as e:
+                error = e
+            finally:
+                self._release(cost, used)
+            attempt += 1
+            time.sleep(self._backoff(ticket, error, attempt))
+
+    # fn(timeout) returns an iterator of chunks that add up (`a + b`) to
+    # the full message. Followers get that message as a single chunk.
+    # Failures are only retried before the first chunk arrives.
+    def stream(self, key: str, fn: Callable[[float], Iterator], cost: float,
+               priority: int = None, deadline: float = None) -> Iterator:
+        priority, deadline = self._deadline(priority, deadline)
+        while True:
+            flight, leader = self._join(key, priority, deadline)
+            if not leader:
+                result = self._follow(flight, priority, deadline)
+                if result is not None:
+                    yield result
+                    return
+                continue
+
+            total = None
+            try:
+                with closing(self._stream_run(flight.ticket, fn, cost)) as chunks:
+                    for chunk in chunks:
+                        total = chunk if total is None else total + chunk
+                        yield chunk
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, total)
+            return
+
+    def _stream_run(self, ticket: _Ticket, fn: Callable[[float], Iterator], cost: float) -> Iterator:
+        attempt = 0
+        while True:
+            self._acquire(ticket, cost)
+            used = None
+            started = False
+            total = None
+            try:
+                self._count("upstream")
+                for chunk in fn(max(0.0, ticket.deadline - time.monotonic())):
+                    started = True
+                    total = chunk if total is None else total + chunk
+                    yield chunk
+                used = _used_tokens(total)
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                self._release(cost, used)
+            attempt += 1
+            time.sleep(self._backoff(ticket, error, attempt))
+
+def _used_tokens(message) -> Optional[float]:
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+# ==============================
+# SCHEDULED CHAT MODEL
+# ==============================
+# Drop-in wrapper for the chain's `llm`: invoke, ainvoke and stream all
+# go through the scheduler. Priority comes from llm_priority(); each
+# call's remaining time is passed on as the client's request timeout.
+class ScheduledChatModel(BaseChatModel):
+    client: Any
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    @staticmethod
+    def _key(messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+        payload = json.dumps([[m.type, m.content] for m in messages] + [stop, sorted(kwargs.items())],
+                             default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _cost(messages: List[BaseMessage]) -> int:
+        return estimate_tokens("".join(str(m.content) for m in messages)) + LLM_MAX_OUTPUT_TOKENS
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        def call(timeout: float):
+            return self.client.invoke(messages, stop=stop, timeout=timeout, **kwargs)
+
+        message = self.scheduler.call(self._key(messages, stop, kwargs), call, self._cost(messages))
+        if isinstance(message, AIMessageChunk):
+            message = AIMessage(content=message.content, usage_metadata=message.usage_metadata)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        def call(timeout: float):
+            return self.client.stream(messages, stop=stop, timeout=timeout, **kwargs)
+
+        for chunk in self.scheduler.stream(self._key(messages, stop, kwargs), call,
+                                           self._cost(messages)):
+            if not isinstance(chunk, AIMessageChunk):
+                chunk = AIMessageChunk(content=chunk.content, usage_metadata=chunk.usage_metadata)
+            if run_manager:
+                run_manager.on_llm_new_token(str(chunk.content))
+            yield ChatGenerationChunk(message=chunk)
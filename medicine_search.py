@@ -0,0 +1,141 @@
+import re
+import bisect
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+# ==============================
+# NORMALIZATION
+# ==============================
+def normalize(text) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", str(text).lower()).split())
+
+def tokenize(text) -> List[str]:
+    return normalize(text).split()
+
+def trigrams(token: str) -> set:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    if abs(len(a) - len(b)) > limit:
+        return None
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        if min(current) > limit:
+            return None
+        previous = current
+
+    return previous[-1] if previous[-1] <= limit else None
+
+# ==============================
+# SEARCH INDEX
+# ==============================
+# Built once per Medicine.csv version. Each distinct token maps to the rows
+# containing it (weighted by field); a sorted vocabulary serves prefix
+# matches and a trigram index over the vocabulary narrows the candidates
+# for typo-tolerant matches before any edit distance is computed.
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.5
+MAX_PREFIX_TOKENS = 200
+
+class MedicineSearchIndex:
+    def __init__(self, df: pd.DataFrame,
+                 fields: Dict[str, float] = None, name_column: str = "Medicine_Name"):
+        self.df = df
+        self.fields = fields or {"Medicine_Name": 2.0, "Category": 1.0}
+        self.postings = {}
+        self.names = {}
+
+        for column, weight in self.fields.items():
+            if column not in df.columns:
+                continue
+            for pos, value in enumerate(df[column].tolist()):
+                for token in tokenize(value):
+                    rows = self.postings.setdefault(token, {})
+                    rows[pos] = max(rows.get(pos, 0.0), weight)
+
+        if name_column in df.columns:
+            for pos, value in enumerate(df[name_column].tolist()):
+                self.names[pos] = normalize(value)
+
+        self.vocab = sorted(self.postings)
+        self.grams = {}
+        for token in self.vocab:
+            for gram in trigrams(token):
+                self.grams.setdefault(gram, []).append(token)
+
+    def _max_edits(self, token: str) -> int:
+        if len(token) <= 3:
+            return 0
+        return 1 if len(token) <= 6 else 2
+
+    def match_tokens(self, token: str) -> Dict[str, float]:
+        matches = {}
+
+        lo = bisect.bisect_left(self.vocab, token)
+        for candidate in self.vocab[lo:lo + MAX_PREFIX_TOKENS]:
+            if not candidate.startswith(token):
+                break
+            matches[candidate] = EXACT_SCORE if candidate == token else PREFIX_SCORE
+
+        limit = self._max_edits(token)
+        if limit:
+            # Each edit can destroy at most three trigrams
+            grams = trigrams(token)
+            shared = {}
+            for gram in grams:
+                for candidate in self.grams.get(gram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+            needed = max(1, len(grams) - 3 * limit)
+            for candidate, count in shared.items():
+                if count < needed or candidate in matches:
+                    continue
+                distance = bounded_edit_distance(token, candidate, limit)
+                if distance is not None:
+                    matches[candidate] = FUZZY_SCORE - 0.5 * distance
+
+        return matches
+
+    def search(self, query: str, limit: int = 50) -> pd.DataFrame:
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return self.df.iloc[:0]
+
+        totals = None
+        for token in query_tokens:
+            best = {}
+            for candidate, score in self.match_tokens(token).items():
+                for pos, weight in self.postings[candidate].items():
+                    value = score * weight
+                    if value > best.get(pos, 0.0):
+                        best[pos] = value
+
+            # Every query token has to match somewhere in the row
+            if totals is None:
+                totals = best
+            else:
+                totals = {pos: totals[pos] + s for pos, s in best.items() if pos in totals}
+            if not totals:
+                return self.df.iloc[:0]
+
+        phrase = normalize(query)
+        for pos in totals:
+            name = self.names.get(pos, "")
+            if name == phrase:
+                totals[pos] += 10.0
+            elif name.startswith(phrase):
+                totals[pos] += 5.0
+
+        ranked = sorted(totals, key=lambda pos: (-totals[pos], pos))[:limit]
+        return self.df.iloc[ranked]
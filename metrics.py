@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import inspect
+import threading
+import functools
+from contextlib import nullcontext
+from typing import Dict, Optional, Tuple
+
+# ==============================
+# CONFIG
+# ==============================
+# RAG_METRICS selects the sink: off (default), prometheus or json.
+# prometheus rewrites a text-format file (node_exporter textfile style),
+# json appends one snapshot per line.
+METRICS_SINK = os.getenv("RAG_METRICS", "off")
+METRICS_DIR = os.getenv("RAG_CACHE_DIR", ".cache")
+METRICS_PATH = os.getenv("RAG_METRICS_PATH")
+METRICS_INTERVAL = float(os.getenv("RAG_METRICS_INTERVAL", "15"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+ENABLED = False
+
+# ==============================
+# REGISTRY
+# ==============================
+def _key(name: str, labels: Dict) -> Tuple:
+    return (name,) + tuple(sorted(labels.items()))
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+_lock = threading.Lock()
+_counters: Dict[Tuple, float] = {}
+_gauges: Dict[Tuple, float] = {}
+_histograms: Dict[Tuple, Histogram] = {}
+
+def incr(name: str, value: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+# Last value wins (timestamps, current lag, ...)
+def gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+def snapshot() -> Dict:
+    with _lock:
+        counters = [
+            {"name": key[0], "labels": dict(key[1:]), "value": value}
+            for key, value in _counters.items()
+        ]
+        gauges = [
+            {"name": key[0], "labels": dict(key[1:]), "value": value}
+            for key, value in _gauges.items()
+        ]
+        histograms = [
+            {
+                "name": key[0],
+                "labels": dict(key[1:]),
+                "count": hist.count,
+                "sum": hist.sum,
+                "p50": hist.quantile(0.5),
+                "p95": hist.quantile(0.95),
+                "p99": hist.quantile(0.99),
+                "buckets": list(zip(hist.buckets + (float("inf"),), hist.counts))
+            }
+            for key, hist in _histograms.items()
+        ]
+    return {"time": time.time(), "counters": counters, "gauges": gauges,
+            "histograms": histograms}
+
+# ==============================
+# SPANS
+# ==============================
+# Spans record their duration in the span_seconds histogram and count
+# exceptions that escape them. When metrics are off, span() hands back a
+# shared no-op context manager.
+_NOOP = nullcontext()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe("span_seconds", time.perf_counter() - self.start, span=self.name)
+        if exc_type is not None:
+            incr("errors_total", span=self.name, error=exc_type.__name__)
+        return False
+
+def span(name: str):
+    return _Span(name) if ENABLED else _NOOP
+
+def error(name: str, exc: BaseException):
+    print(f"{name} failed: {exc}")
+    incr("errors_total", span=name, error=type(exc).__name__)
+
+_RAISE = object()
+
+# Times a function as a span. With a fallback, exceptions are reported
+# via error() and the fallback is returned instead of raising.
+def traced(name: str, fallback=_RAISE):
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    with span(name):
+                        return await fn(*args, **kwargs)
+                except Exception as e:
+                    if fallback is _RAISE:
+                        raise
+                    error(name, e)
+                    return fallback
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                if not ENABLED:
+                    return fn(*args, **kwargs)
+                with _Span(name):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if fallback is _RAISE:
+                    raise
+                error(name, e)
+                return fallback
+        return wrapper
+    return decorate
+
+# ==============================
+# SINKS
+# ==============================
+class NullSink:
+    def write(self, snap: Dict):
+        pass
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Dict, extra: Dict = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items.items()) + "}"
+
+def _bound(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(value)
+
+class PrometheusFileSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def render(self, snap: Dict) -> str:
+        lines = []
+        typed = set()
+        for c in sorted(snap["counters"], key=lambda c: c["name"]):
+            name = f"rag_{c['name']}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(c['labels'])} {c['value']}")
+
+        for g in sorted(snap.get("gauges", ()), key=lambda g: g["name"]):
+            name = f"rag_{g['name']}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{_labels(g['labels'])} {g['value']}")
+
+        for h in sorted(snap["histograms"], key=lambda h: h["name"]):
+            name = f"rag_{h['name']}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            total = 0
+            for bound, n in h["buckets"]:
+                total += n
+                lines.append(f"{name}_bucket{_labels(h['labels'], {'le': _bound(bound)})} {total}")
+            lines.append(f"{name}_sum{_labels(h['labels'])} {h['sum']}")
+            lines.append(f"{name}_count{_labels(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, snap: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render(snap))
+        os.replace(tmp, self.path)
+
+class JsonLogSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, snap: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snap, default=str) + "\n")
+
+def make_sink(kind: str, path: Optional[str] = None):
+    if kind == "prometheus":
+        return PrometheusFileSink(path or os.path.join(METRICS_DIR, "metrics.prom"))
+    if kind == "json":
+        return JsonLogSink(path or os.path.join(METRICS_DIR, "metrics.jsonl"))
+    return NullSink()
+
+# ==============================
+# EXPORT
+# ==============================
+_sink = NullSink()
+_flusher = None
+_stop = threading.Event()
+
+def flush():
+    if not ENABLED:
+        return
+    try:
+        _sink.write(snapshot())
+    except Exception as e:
+        print(f"Metrics export failed: {e}")
+
+def _flush_loop(interval: float):
+    while not _stop.wait(interval):
+        flush()
+
+# Installs a sink (anything with write(snapshot)); None disables metrics
+def configure(sink=None, interval: float = METRICS_INTERVAL):
+    global ENABLED, _sink, _flusher
+
+    _sink = sink or NullSink()
+    ENABLED = sink is not None and not isinstance(sink, NullSink)
+    if ENABLED and _flusher is None and interval > 0:
+        _flusher = threading.Thread(target=_flush_loop, args=(interval,), daemon=True)
+        _flusher.start()
+
+atexit.register(flush)
+
+if METRICS_SINK != "off":
+    configure(make_sink(METRICS_SINK, METRICS_PATH))
@@ -0,0 +1,70 @@
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from onnx_models import feeds, length_batches, load_session, load_tokenizer
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+# RAG_EMBED_BACKEND=onnx swaps the PyTorch MiniLM for its ONNX export
+# (int8 by default) run through onnxruntime. RAG_EMBED_ONNX_MODEL may be
+# a Hub repo id or a local directory holding an export.
+EMBED_BACKEND = os.getenv("RAG_EMBED_BACKEND", "hf")
+EMBED_ONNX_MODEL = os.getenv("RAG_EMBED_ONNX_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_ONNX_FILE = os.getenv("RAG_EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_ONNX_BATCH_SIZE = int(os.getenv("RAG_EMBED_ONNX_BATCH_SIZE", "32"))
+EMBED_THREADS = int(os.getenv("RAG_EMBED_THREADS", "0"))
+EMBED_MAX_LENGTH = int(os.getenv("RAG_EMBED_MAX_LENGTH", "256"))
+
+# ==============================
+# ONNX SENTENCE EMBEDDINGS
+# ==============================
+# Same output as the sentence-transformers pipeline (mean pooling over
+# real tokens, then L2 normalization), so it can replace
+# HuggingFaceEmbeddings anywhere. Texts are tokenized once, sorted by
+# token length and batched, so each batch pads only to its own longest
+# text rather than the longest chunk in the whole ingest batch.
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model: str, file_name: str = EMBED_ONNX_FILE,
+                 batch_size: int = EMBED_ONNX_BATCH_SIZE, threads: int = EMBED_THREADS,
+                 max_length: int = EMBED_MAX_LENGTH):
+        self.tokenizer = load_tokenizer(model, max_length)
+        self.session = load_session(model, file_name, threads)
+        self.batch_size = batch_size
+        self.outputs = [o.name for o in self.session.get_outputs()]
+        self.padded_tokens = 0
+        self.real_tokens = 0
+
+    def _pool(self, inputs) -> np.ndarray:
+        # Some exports already include pooling + normalization
+        if "sentence_embedding" in self.outputs:
+            return self.session.run(["sentence_embedding"], inputs)[0]
+
+        hidden = self.session.run([self.outputs[0]], inputs)[0]
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = [len(e.ids) for e in encodings]
+        vectors = [None] * len(texts)
+
+        with metrics.span("embed.onnx"):
+            for batch in length_batches(lengths, self.batch_size):
+                inputs = feeds(self.session, [encodings[i] for i in batch])
+                self.padded_tokens += inputs["input_ids"].size
+                self.real_tokens += sum(lengths[i] for i in batch)
+                for i, vector in zip(batch, self._pool(inputs)):
+                    vectors[i] = vector.astype(np.float32).tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
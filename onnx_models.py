@@ -0,0 +1,64 @@
+import os
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+# ==============================
+# ONNX RUNTIME HELPERS
+# ==============================
+# Shared by the ONNX reranker and embedding backends. `model` is either a
+# local directory or a Hugging Face repo id; both must contain
+# tokenizer.json and the ONNX file (e.g. onnx/model_quint8_avx2.onnx for
+# the int8 exports published with the sentence-transformers models).
+# onnxruntime, tokenizers and huggingface_hub are imported on first use.
+def resolve(model: str, file_name: str) -> str:
+    if os.path.isdir(model):
+        return os.path.join(model, file_name)
+
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(model, file_name)
+
+def load_tokenizer(model: str, max_length: int):
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(resolve(model, "tokenizer.json"))
+    tokenizer.enable_truncation(max_length)
+    # Padding is done per batch in feeds()
+    tokenizer.no_padding()
+    return tokenizer
+
+def load_session(model: str, file_name: str, threads: int = 0):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(
+        resolve(model, file_name), options, providers=["CPUExecutionProvider"]
+    )
+
+# Pads a batch of encodings to its own longest sequence ([PAD] is id 0
+# in the BERT vocabularies these models use)
+def feeds(session, encodings: Sequence) -> Dict[str, np.ndarray]:
+    width = max(len(e.ids) for e in encodings)
+    arrays = {
+        "input_ids": np.zeros((len(encodings), width), dtype=np.int64),
+        "attention_mask": np.zeros((len(encodings), width), dtype=np.int64),
+        "token_type_ids": np.zeros((len(encodings), width), dtype=np.int64)
+    }
+    for row, e in enumerate(encodings):
+        n = len(e.ids)
+        arrays["input_ids"][row, :n] = e.ids
+        arrays["attention_mask"][row, :n] = 1
+        arrays["token_type_ids"][row, :n] = e.type_ids
+
+    names = {i.name for i in session.get_inputs()}
+    return {name: value for name, value in arrays.items() if name in names}
+
+# Groups positions of similar length so each batch pads to roughly the
+# same size instead of to the longest text overall
+def length_batches(lengths: Sequence[int], batch_size: int) -> Iterator[List[int]]:
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import datetime
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from medicine_search import bounded_edit_distance, tokenize, trigrams
+from scheduling import DAY_NAMES, DAYS, parse_days
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+ROUTER_ENABLED = os.getenv("RAG_ROUTER", "1") == "1"
+ROUTER_LOG = os.getenv(
+    "RAG_ROUTER_LOG", os.path.join(os.getenv("RAG_CACHE_DIR", ".cache"), "router_log.jsonl")
+)
+# The log is rotated to <log>.1 past this size; one old file is kept
+ROUTER_LOG_MAX_BYTES = int(os.getenv("RAG_ROUTER_LOG_MAX_BYTES", str(5 * 2 ** 20)))
+
+# Medicine questions are only answered from the catalog when phrased
+# explicitly ("price of", "in stock", "how many ... left"). Anything that
+# reads like a dosage or clinical question goes to RAG even if it also
+# matches: "how much paracetamol can I take" is not a price question.
+PRICE_RE = re.compile(
+    r"\b(?:prices?|mrp)\b|\bcosts?\s+(?:of|for)\b"
+    r"|\bhow much\b.*\b(?:costs?|charged?|rs|rupees)\b"
+)
+STOCK_RE = re.compile(
+    r"\b(?:in|out of)\s+stock\b|\bstock\s+(?:of|for|left)\b"
+    r"|\bhow many\b.*\b(?:left|in stock)\b|\bunits?\s+left\b"
+)
+CLINICAL_RE = re.compile(
+    r"\b(?:take|taking|took|dose|doses|dosage|dosing|safe|safely|side\s+effects?"
+    r"|pregnan\w*|breastfeed\w*|allerg\w*|interact\w*|overdose|mg)\b|\d\s*mg\b"
+)
+# Doctor questions get the same treatment: a specialty is only answered
+# from the directory when the question asks for availability or for the
+# doctors themselves ("which cardiologist is free on Monday"), and never
+# when it asks for advice ("when should I consult a dermatologist for
+# acne", "which cardiology tests detect a heart attack").
+DOCTOR_LIST_RE = re.compile(
+    r"\b(?:available|availability|timings?|schedule|working\s+hours|slots?)\b"
+    r"|\b(?:list|show)\b|\bwho\s+(?:is|are)\b|\bdo\s+you\s+have\b"
+    r"|\b(?:which|any)\s+(?:\w+\s+){0,2}?(?:doctors?|specialists?|\w+(?:ists?|ians?))"
+    r"\s+(?:is|are|do|does|can|works?)\b"
+)
+ADVICE_RE = re.compile(
+    r"\b(?:should|tests?|detect\w*|symptoms?|treat\w*|cure\w*|caus\w*|signs?|risks?)\b"
+)
+# Words never spell-corrected into a catalog name
+PRICE_WORDS = {"price", "prices", "cost", "costs", "mrp"}
+STOCK_WORDS = {"stock", "left", "units"}
+SCHEDULE_WORDS = {"available", "availability", "when", "timing", "timings", "days", "day",
+                  "schedule", "visit", "consult", "free", "open", "working"}
+CONTACT_WORDS = {"phone", "contact", "number", "call", "reach"}
+DOCTOR_WORDS = {"doctor", "doctors", "dr", "specialist", "specialists", "who", "which", "list"}
+INTENT_WORDS = PRICE_WORDS | STOCK_WORDS | SCHEDULE_WORDS | CONTACT_WORDS | DOCTOR_WORDS
+
+STEM_RE = re.compile(r"(ists?|ians?|ics?|ies|y|s)$")
+
+# ==============================
+# TEXT HELPERS
+# ==============================
+# cardiologists / cardiology / cardiologist -> cardiolog
+def stem(token: str) -> str:
+    while len(token) > 5:
+        shorter = STEM_RE.sub("", token)
+        if shorter == token:
+            break
+        token = shorter
+    return token
+
+def money(value) -> str:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return f"{value:.0f}" if value.is_integer() else f"{value:.2f}"
+
+def asked_day(tokens: Sequence[str]) -> Optional[int]:
+    for token in tokens:
+        if token in DAYS:
+            return DAYS[token]
+        if token == "today":
+            return datetime.date.today().weekday()
+        if token == "tomorrow":
+            return (datetime.date.today().weekday() + 1) % 7
+    return None
+
+# ==============================
+# PHRASE MATCHER
+# ==============================
+# Finds catalog names inside a question: exact token phrases first, with
+# single-typo correction (trigram candidates + edit distance) for longer
+# tokens that aren't already known words.
+class PhraseMatcher:
+    def __init__(self, names: Sequence, key: Callable[[str], List[str]] = tokenize):
+        self.key = key
+        self.phrases = {}
+        self.longest = 1
+        for name in names:
+            tokens = tuple(key(name))
+            if tokens:
+                self.phrases.setdefault(tokens, name)
+                self.longest = max(self.longest, len(tokens))
+
+        self.vocab = {t for phrase in self.phrases for t in phrase}
+        self.grams = {}
+        for token in self.vocab:
+            for gram in trigrams(token):
+                self.grams.setdefault(gram, set()).add(token)
+
+    def correct(self, token: str) -> str:
+        if token in self.vocab or token in INTENT_WORDS or len(token) < 5:
+            return token
+        counts = {}
+        for gram in trigrams(token):
+            for candidate in self.grams.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        best, best_distance = token, 2
+        for candidate, shared in counts.items():
+            if shared < 2:
+                continue
+            distance = bounded_edit_distance(token, candidate, 1)
+            if distance is not None and distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def find(self, tokens: Sequence[str]) -> List[str]:
+        tokens = [self.correct(t) for t in tokens]
+        found = []
+        i = 0
+        while i < len(tokens):
+            for size in range(min(self.longest, len(tokens) - i), 0, -1):
+                name = self.phrases.get(tuple(tokens[i:i + size]))
+                if name is not None:
+                    if name not in found:
+                        found.append(name)
+                    i += size
+                    break
+            else:
+                i += 1
+        return found
+
+def _doctor_key(name) -> List[str]:
+    return [t for t in tokenize(name) if t not in ("dr", "doctor")]
+
+def _stem_key(text) -> List[str]:
+    return [stem(t) for t in tokenize(text)]
+
+class MedicineDirectory:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        names = df["Medicine_Name"].tolist() if "Medicine_Name" in df.columns else []
+        self.position = {name: pos for pos, name in reversed(list(enumerate(names)))}
+        self.matcher = PhraseMatcher(names)
+
+class DoctorDirectory:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        names = df["Doctor_Name"].tolist() if "Doctor_Name" in df.columns else []
+        specs = df["Specialization"].tolist() if "Specialization" in df.columns else []
+        availability = df["Availability"].tolist() if "Availability" in df.columns else [None] * len(names)
+
+        self.position = {name: pos for pos, name in reversed(list(enumerate(names)))}
+        self.days = [parse_days(text) for text in availability]
+        self.by_spec = {}
+        for pos, spec in enumerate(specs):
+            self.by_spec.setdefault(spec, []).append(pos)
+        self.names = PhraseMatcher(names, _doctor_key)
+        self.specs = PhraseMatcher(list(self.by_spec), _stem_key)
+
+# ==============================
+# QUERY ROUTER
+# ==============================
+# Answers price, stock and doctor schedule questions straight from the
+# cached reference tables. Anything without both a recognised intent and
+# a catalog entity returns None and goes to RAG. Every decision (intent,
+# matched entities, timing; never the patient's question) is appended to
+# ROUTER_LOG for tuning the keyword lists.
+class QueryRouter:
+    def __init__(self, doctors, medicines, stock: Optional[Callable[[str], Optional[int]]] = None,
+                 log_path: Optional[str] = ROUTER_LOG):
+        self.doctors = doctors
+        self.medicines = medicines
+        self.stock = stock
+        self.log_path = log_path
+        self._log_lock = threading.Lock()
+
+    def route(self, question: str) -> Optional[Dict]:
+        start = time.perf_counter()
+        tokens = tokenize(question)
+        words = set(tokens)
+        route = None
+
+        medicines = self.medicines.snapshot()
+        if medicines is not None:
+            directory = medicines.derive("router", MedicineDirectory)
+            found = directory.matcher.find(tokens)
+            if found:
+                route = self._medicine_route(directory, found, question.lower())
+
+        if route is None:
+            doctors = self.doctors.snapshot()
+            if doctors is not None:
+                route = self._doctor_route(doctors.derive("router", DoctorDirectory), tokens, words,
+                                           question.lower())
+
+        micros = (time.perf_counter() - start) * 1e6
+        self._log(route, micros)
+        metrics.incr("router_decisions_total", intent=route["intent"] if route else "rag")
+        return route
+
+    # ---------- medicines ----------
+    def _medicine_route(self, directory: MedicineDirectory, names: List[str], text: str) -> Optional[Dict]:
+        if CLINICAL_RE.search(text):
+            return None
+        rows = [directory.df.iloc[directory.position[name]] for name in names]
+
+        if PRICE_RE.search(text):
+            lines = [
+                f"• {row['Medicine_Name']} ({row.get('Dosage', '')}) costs ₹{money(row['Price'])} per unit."
+                for row in rows
+            ]
+            return {"intent": "price", "entities": names, "answer": "\n".join(lines)}
+
+        if STOCK_RE.search(text):
+            lines = []
+            for row in rows:
+                units = self.stock(row["Medicine_Name"]) if self.stock else None
+                if units is None:
+                    units = int(row.get("Stock", 0))
+                if units > 0:
+                    lines.append(f"• {row['Medicine_Name']} is in stock ({units} units available).")
+                else:
+                    lines.append(f"• {row['Medicine_Name']} is currently out of stock.")
+            return {"intent": "stock", "entities": names, "answer": "\n".join(lines)}
+
+        return None
+
+    # ---------- doctors ----------
+    def _doctor_route(self, directory: DoctorDirectory, tokens: List[str], words: set,
+                      text: str) -> Optional[Dict]:
+        day = asked_day(tokens)
+        names = directory.names.find([t for t in tokens if t not in ("dr", "doctor")])
+
+        if names and words & CONTACT_WORDS:
+            lines = []
+            for name in names:
+                row = directory.df.iloc[directory.position[name]]
+                lines.append(f"• {name} ({row.get('Specialization', '')}) can be reached at {row.get('Phone', 'the front desk')}.")
+            return {"intent": "doctor_contact", "entities": names, "answer": "\n".join(lines)}
+
+        if CLINICAL_RE.search(text) or ADVICE_RE.search(text):
+            return None
+
+        if names and (words & SCHEDULE_WORDS or day is not None):
+            lines = []
+            for name in names:
+                pos = directory.position[name]
+                row = directory.df.iloc[pos]
+                lines.append(f"• {name} ({row.get('Specialization', '')}) is available {row.get('Availability', 'on request')}.")
+                if day is not None and directory.days[pos] is not None:
+                    verb = "is" if day in directory.days[pos] else "is not"
+                    lines.append(f"• {name} {verb} available on {DAY_NAMES[day].title()}.")
+            return {"intent": "doctor_schedule", "entities": names, "answer": "\n".join(lines)}
+
+        specs = directory.specs.find([stem(t) for t in tokens])
+        if specs and (DOCTOR_LIST_RE.search(text) or day is not None):
+            lines = []
+            for spec in specs:
+                for pos in directory.by_spec[spec]:
+                    days = directory.days[pos]
+                    if day is not None and days is not None and day not in days:
+                        continue
+                    row = directory.df.iloc[pos]
+                    lines.append(f"• {row['Doctor_Name']} ({spec}) is available {row.get('Availability', 'on request')}.")
+            if not lines:
+                when = f" on {DAY_NAMES[day].title()}" if day is not None else ""
+                lines.append(f"• No {' or '.join(specs)} is available{when}.")
+            return {"intent": "doctor_by_specialization", "entities": specs, "answer": "\n".join(lines)}
+
+        return None
+
+    def _log(self, route: Optional[Dict], micros: float):
+        if not self.log_path:
+            return
+        entry = {
+            "time": time.time(),
+            "intent": route["intent"] if route else "rag",
+            "entities": route["entities"] if route else [],
+            "micros": round(micros, 1)
+        }
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                try:
+                    if os.path.getsize(self.log_path) > ROUTER_LOG_MAX_BYTES:
+                        os.replace(self.log_path, self.log_path + ".1")
+                except FileNotFoundError:
+                    pass
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Router log write failed: {e}")
@@ -0,0 +1,522 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from dotenv import load_dotenv
+from typing import Iterator, List, Optional
+
+load_dotenv()
+
+# =========================
+# LANGCHAIN (LATEST)
+# =========================
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_groq import ChatGroq
+
+from ingest import find_data_files, iter_parsed
+from index_store import sync_index
+from embedding_cache import CachedEmbeddings
+from onnx_embeddings import EMBED_BACKEND, EMBED_ONNX_FILE, EMBED_ONNX_MODEL, OnnxEmbeddings
+from answer_cache import AnswerCache
+from stub_llm import StubChatModel
+from llm_scheduler import BATCH, LLMBusy, LLMFailed, LLMScheduler, ScheduledChatModel, llm_priority
+from retrievers import FETCH_K, HybridRetriever
+from reranker import RERANK_CANDIDATES, load_reranker
+from context_builder import CONTEXT_COMPRESSION, ContextCompressor
+from watcher import WATCH, DataWatcher, scan
+from shared_index import SHARED_INDEX, SharedIndex, manifest_tag
+import metrics
+
+# ==============================
+# RAG STATE
+# ==============================
+# Everything heavy is created by init_rag(), which backend.py calls on
+# first assistant use (or from its background warm-up thread).
+DATA_DIR = None
+EMBEDDINGS = None
+ANSWER_CACHE = None
+COMPRESSOR = None
+RERANKER = None
+VECTORSTORE = None
+SPARSE_INDEX = None
+llm = None
+retriever = None
+rag_chain = None
+WATCHER = None
+# Set when workers serve a shared, memory-mapped index (RAG_SHARED_INDEX)
+SHARED = SharedIndex() if SHARED_INDEX else None
+SERVED_VERSION = None
+
+# ==============================
+# LOAD DOCUMENTS
+# ==============================
+def list_data_files() -> List[str]:
+    if not os.path.exists(DATA_DIR):
+        return []
+
+    return find_data_files(DATA_DIR)
+
+def load_documents() -> List[Document]:
+    documents = []
+
+    for _, docs in iter_parsed(list_data_files()):
+        documents.extend(docs)
+
+    return documents
+
+# ==============================
+# TEXT SPLITTING
+# ==============================
+def split_documents(docs: List[Document]) -> List[Document]:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=100
+    )
+    return splitter.split_documents(docs)
+
+# ==============================
+# EMBEDDINGS
+# ==============================
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# The ONNX backend gets its own name so its vectors never share a cache
+# or an index with the fp32 model's
+if EMBED_BACKEND == "onnx":
+    EMBEDDING_NAME = f"{EMBED_ONNX_MODEL}@{EMBED_ONNX_FILE}"
+else:
+    EMBEDDING_NAME = EMBEDDING_MODEL
+
+# Wrapped in a content-addressed cache so unchanged chunks are never
+# embedded twice, across rebuilds and across worker processes.
+def get_embeddings():
+    if EMBED_BACKEND == "onnx":
+        base = OnnxEmbeddings(EMBED_ONNX_MODEL)
+    else:
+        base = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return CachedEmbeddings(base, EMBEDDING_NAME)
+
+# ==============================
+# VECTOR STORE
+# ==============================
+# The index and a per-file manifest live under INDEX_DIR; only files
+# whose size/mtime/hash changed since the last run are re-embedded.
+# Returns the FAISS store and the BM25 index kept in sync with it.
+def build_vectorstore():
+    return sync_index(
+        list_data_files(),
+        EMBEDDINGS,
+        split_documents,
+        EMBEDDING_NAME
+    )
+
+# ==============================
+# INDEX HOT-SWAP
+# ==============================
+# sync_index() loads its own copy of the saved index, so a rebuild never
+# touches the objects serving queries. The new chain is built first and
+# the globals are swapped afterwards; query functions read rag_chain /
+# retriever once, so a query already running finishes on the old index.
+_refresh_lock = threading.Lock()
+
+def chunk_ids(vectorstore) -> set:
+    return set(vectorstore.index_to_docstore_id.values()) if vectorstore else set()
+
+def swap_index(vectorstore, sparse):
+    global VECTORSTORE, SPARSE_INDEX, retriever, rag_chain
+
+    if vectorstore:
+        new_retriever, new_chain = build_chain(vectorstore, sparse)
+    else:
+        new_retriever, new_chain = None, None
+    # Chunk ids are derived from file content, so equal sets mean the
+    # same chunks (a touched file, a republished identical version)
+    added_or_removed = chunk_ids(vectorstore) != chunk_ids(VECTORSTORE)
+    VECTORSTORE, SPARSE_INDEX, retriever, rag_chain = vectorstore, sparse, new_retriever, new_chain
+    # Cached answers may cite chunks that no longer exist
+    if added_or_removed:
+        ANSWER_CACHE.clear()
+
+# With a shared index only the process holding the builder lock runs
+# sync_index() and publishes; every process then maps the current
+# version. If the builder exits, the next refresh elsewhere takes over.
+def refresh_index():
+    global SERVED_VERSION
+
+    with _refresh_lock:
+        if SHARED is None:
+            swap_index(*build_vectorstore())
+            return
+
+        if SHARED.try_build():
+            vectorstore, sparse = build_vectorstore()
+            SHARED.publish(vectorstore, sparse, manifest_tag(), EMBEDDING_NAME)
+        version = SHARED.wait_current()
+        if version is None:
+            raise RuntimeError(f"No shared index was published in {SHARED.root}")
+        if version != SERVED_VERSION:
+            swap_index(*SHARED.open(version, EMBEDDINGS, EMBEDDING_NAME))
+            SERVED_VERSION = version
+
+# Workers that don't build also need to notice a newly published version
+def watch_state(data_dir: str):
+    return scan(data_dir), SHARED.current() if SHARED else None
+
+def index_status():
+    return WATCHER.status() if WATCHER else None
+
+# ==============================
+# GROQ LLM
+# ==============================
+# Times every LLM call and counts the tokens the provider reports
+class LLMMetrics(BaseCallbackHandler):
+    def __init__(self):
+        self.started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self.started.pop(run_id, None)
+        if start is not None:
+            metrics.observe("span_seconds", time.perf_counter() - start, span="rag.llm")
+
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+
+        metrics.incr("llm_tokens_total", prompt_tokens, kind="prompt")
+        metrics.incr("llm_tokens_total", completion_tokens, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.started.pop(run_id, None)
+        metrics.incr("errors_total", span="rag.llm", error=type(error).__name__)
+
+# RAG_LLM=stub swaps in a deterministic local model for offline runs.
+# Either way calls go through an LLMScheduler (coalescing, rate limits,
+# priorities, deadlines); the in-process stub has no quota to respect.
+# GROQ_API_BASE points ChatGroq at another server, e.g. StubLLMServer.
+def get_llm():
+    if os.getenv("RAG_LLM") == "stub":
+        model = StubChatModel()
+        scheduler = LLMScheduler(requests=0, tokens=0)
+    else:
+        model = ChatGroq(
+            model="llama-3.1-8b-instant",
+            temperature=0.2,
+            api_key=os.getenv("GROQ_API_KEY"),
+            # Retries and 429 back-off are the scheduler's job
+            max_retries=0
+        )
+        scheduler = LLMScheduler()
+
+    if metrics.ENABLED:
+        model = model.with_config(callbacks=[LLMMetrics()])
+    return ScheduledChatModel(client=model, scheduler=scheduler)
+
+BUSY_MESSAGE = "⚠️ The assistant is busy right now. Please try again in a moment."
+
+def llm_stats():
+    scheduler = getattr(llm, "scheduler", None)
+    return scheduler.stats() if scheduler else None
+
+# ==============================
+# BULLET-STYLE PROMPT
+# ==============================
+prompt = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""
+You are a professional healthcare assistant.
+
+Answer the question ONLY using the context below.
+Format the answer as clear step-by-step bullet points.
+Each point must be short and user friendly.
+Do NOT include model info, metadata, or explanations.
+
+Context:
+{context}
+
+Question:
+{question}
+
+Answer (bullet points only):
+"""
+)
+
+# ==============================
+# RAG PIPELINE
+# ==============================
+def format_docs(docs: List[Document]) -> str:
+    with metrics.span("rag.format_docs"):
+        return "\n\n".join(doc.page_content for doc in docs)
+
+# Token-budgeted context when compression is on, plain chunks otherwise.
+# The caller's `context_stats` dict, if given, receives this query's
+# context sizes (estimated tokens before/after).
+def build_context(question: str, docs: List[Document], vector=None,
+                  context_stats: Optional[dict] = None) -> str:
+    if COMPRESSOR is None:
+        return format_docs(docs)
+
+    with metrics.span("rag.compress"):
+        text, stats = COMPRESSOR.compress(question, docs, vector)
+    if context_stats is not None:
+        context_stats.update(stats)
+    metrics.incr("context_tokens_total", stats["original_tokens"], kind="retrieved")
+    metrics.incr("context_tokens_total", stats["context_tokens"], kind="prompt")
+    return text
+
+# With reranking on, the retriever returns a wide candidate set and the
+# cross-encoder picks the chunks that reach the prompt
+def rerank_docs(question: str, docs: List[Document]) -> List[Document]:
+    if RERANKER is None:
+        return docs
+    return RERANKER.rerank(question, docs)
+
+# Per-call state arrives through the run config, never module globals
+def prompt_inputs(inputs, config) -> dict:
+    docs = rerank_docs(inputs["question"], inputs["docs"])
+    context_stats = config.get("configurable", {}).get("context_stats")
+    return {
+        "context": build_context(inputs["question"], docs, context_stats=context_stats),
+        "question": inputs["question"]
+    }
+
+def build_chain(vectorstore, sparse=None):
+    k = RERANK_CANDIDATES if RERANKER else 4
+    retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        sparse=sparse,
+        embeddings=EMBEDDINGS,
+        k=k,
+        fetch_k=max(k, FETCH_K)
+    )
+
+    rag_chain = (
+        {
+            "docs": retriever,
+            "question": RunnablePassthrough()
+        }
+        | RunnableLambda(prompt_inputs)
+        | prompt
+        | llm
+    )
+    return retriever, rag_chain
+
+def extract_text(response) -> str:
+    # Extract clean text only
+    if hasattr(response, "content"):
+        return response.content.strip()
+
+    return str(response).strip()
+
+@metrics.traced("rag.query")
+def rag_query_pipeline(question: str) -> str:
+    chain = rag_chain
+    if not chain:
+        return "⚠️ Knowledge base is empty."
+
+    answer, vector = ANSWER_CACHE.lookup(question)
+    if answer is not None:
+        return answer
+
+    try:
+        answer = extract_text(chain.invoke(question))
+    except LLMBusy:
+        return BUSY_MESSAGE
+    ANSWER_CACHE.put(question, answer, vector)
+    return answer
+
+@metrics.traced("rag.query")
+async def arag_query_pipeline(question: str) -> str:
+    chain = rag_chain
+    if not chain:
+        return "⚠️ Knowledge base is empty."
+
+    answer, vector = await asyncio.to_thread(ANSWER_CACHE.lookup, question)
+    if answer is not None:
+        return answer
+
+    try:
+        answer = extract_text(await chain.ainvoke(question))
+    except LLMBusy:
+        return BUSY_MESSAGE
+    ANSWER_CACHE.put(question, answer, vector)
+    return answer
+
+# ==============================
+# STREAMING RAG PIPELINE
+# ==============================
+# The caller's `timing` dict, if given, receives this query's first-token
+# and total latency in seconds, whether it was cached or interrupted, and
+# the context sizes under "context" (None when nothing was compressed).
+def rag_query_stream(question: str, timing: Optional[dict] = None) -> Iterator[str]:
+    chain = rag_chain
+    if not chain:
+        yield "⚠️ Knowledge base is empty."
+        return
+
+    start = time.perf_counter()
+    if timing is None:
+        timing = {}
+    context_stats = {}
+    timing.update(ttft=None, total=None, cached=False, interrupted=False, context=None)
+
+    answer, vector = ANSWER_CACHE.lookup(question)
+    if answer is not None:
+        timing["cached"] = True
+        timing["ttft"] = timing["total"] = time.perf_counter() - start
+        metrics.observe("query_seconds", timing["total"], mode="cached")
+        yield answer
+        return
+
+    parts = []
+    try:
+        for chunk in chain.stream(question, config={"configurable": {"context_stats": context_stats}}):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text:
+                continue
+            if timing["ttft"] is None:
+                timing["ttft"] = time.perf_counter() - start
+            parts.append(text)
+            yield text
+    except LLMBusy:
+        # Only raised before the first token
+        timing["interrupted"] = True
+        yield BUSY_MESSAGE
+    except Exception as e:
+        # Keep whatever already arrived; only fail if nothing did
+        if not parts:
+            raise
+        print(f"LLM stream interrupted: {e}")
+        timing["interrupted"] = True
+        yield "\n⚠️ Answer was interrupted and may be incomplete."
+    finally:
+        timing["total"] = time.perf_counter() - start
+        timing["context"] = context_stats or None
+        if timing["ttft"] is not None:
+            metrics.observe("query_ttft_seconds", timing["ttft"])
+        metrics.observe("query_seconds", timing["total"], mode="stream")
+
+    if not timing["interrupted"]:
+        ANSWER_CACHE.put(question, "".join(parts).strip(), vector)
+
+# ==============================
+# BATCH RAG PIPELINE
+# ==============================
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_SECONDS = 1.0
+
+def retrieve_many(questions: List[str], vectors, search=None) -> List[List[Document]]:
+    # One FAISS search for the whole batch instead of one per question
+    return (search or retriever).search_many(questions, vectors)
+
+async def ainvoke_with_retry(client, text: str, semaphore: asyncio.Semaphore,
+                             retries: int = LLM_MAX_RETRIES) -> str:
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                return extract_text(await client.ainvoke(text))
+        except (LLMBusy, LLMFailed):
+            # Out of time, quota or attempts; the scheduler has already
+            # retried, so only unscheduled clients are retried here
+            raise
+        except Exception:
+            if attempt == retries:
+                raise
+            # Exponential backoff with jitter so retries don't arrive in lockstep
+            delay = LLM_BACKOFF_SECONDS * (2 ** attempt)
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+@metrics.traced("rag.query_many")
+async def arag_query_many(questions: List[str], max_concurrency: int = 8,
+                          retries: int = LLM_MAX_RETRIES, llm_client=None) -> List[str]:
+    if not questions:
+        return []
+    search = retriever
+    if not search:
+        return ["⚠️ Knowledge base is empty."] * len(questions)
+
+    client = llm_client or llm
+    questions = list(questions)
+
+    # All questions are embedded in a single model call
+    vectors = await asyncio.to_thread(EMBEDDINGS.queries.embed_documents, questions)
+
+    answers = [None] * len(questions)
+    pending = []
+    for i, (question, vector) in enumerate(zip(questions, vectors)):
+        cached, _ = ANSWER_CACHE.lookup(question, vector)
+        if cached is None:
+            pending.append(i)
+        else:
+            answers[i] = cached
+
+    contexts = retrieve_many(
+        [questions[i] for i in pending], [vectors[i] for i in pending], search
+    )
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer_one(i: int, context: str) -> str:
+        text = prompt.format(context=context, question=questions[i])
+        try:
+            answer = await ainvoke_with_retry(client, text, semaphore, retries)
+        except Exception as e:
+            return f"⚠️ Could not get an answer: {e}"
+
+        ANSWER_CACHE.put(questions[i], answer, vectors[i])
+        return answer
+
+    contexts = [
+        build_context(questions[i], rerank_docs(questions[i], docs), vectors[i])
+        for i, docs in zip(pending, contexts)
+    ]
+    # Batch calls queue behind interactive ones
+    with llm_priority(BATCH):
+        results = await asyncio.gather(
+            *(answer_one(i, context) for i, context in zip(pending, contexts))
+        )
+    for i, answer in zip(pending, results):
+        answers[i] = answer
+    return answers
+
+def rag_query_many(questions: List[str], max_concurrency: int = 8,
+                   retries: int = LLM_MAX_RETRIES, llm_client=None) -> List[str]:
+    return asyncio.run(
+        arag_query_many(questions, max_concurrency, retries, llm_client)
+    )
+
+# ==============================
+# INITIALIZATION
+# ==============================
+def init_rag(data_dir: str, watch: bool = WATCH):
+    global DATA_DIR, EMBEDDINGS, ANSWER_CACHE, COMPRESSOR, RERANKER, WATCHER, llm
+
+    DATA_DIR = data_dir
+    EMBEDDINGS = get_embeddings()
+    ANSWER_CACHE = AnswerCache(EMBEDDINGS)
+    COMPRESSOR = ContextCompressor(EMBEDDINGS.queries) if CONTEXT_COMPRESSION else None
+    RERANKER = load_reranker()
+    llm = get_llm()
+    refresh_index()
+
+    # New, changed or deleted files in data/ are picked up without a restart
+    if watch and WATCHER is None:
+        WATCHER = DataWatcher(DATA_DIR, refresh_index, scan=watch_state).start()
@@ -0,0 +1,89 @@
+import os
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+import pandas as pd
+
+import metrics
+
+# ==============================
+# CACHED REFERENCE TABLES
+# ==============================
+# One parsed copy of a CSV per process, shared by every Streamlit session
+# and re-read only when the file's mtime or size changes. Alongside the
+# DataFrame we keep key -> row position and column value -> row positions
+# so lookups are dictionary hits instead of boolean-mask scans.
+class ReferenceSnapshot:
+    def __init__(self, df: pd.DataFrame, key_column: str, group_columns: Tuple[str, ...],
+                 version: Tuple[int, int]):
+        self.df = df
+        self.version = version
+        self.by_key = {}
+        self.groups = {}
+        self.derived = {}
+
+        if key_column in df.columns:
+            for pos, key in enumerate(df[key_column].tolist()):
+                self.by_key.setdefault(key, pos)
+
+        for column in group_columns:
+            if column in df.columns:
+                index = {}
+                for pos, value in enumerate(df[column].tolist()):
+                    index.setdefault(value, []).append(pos)
+                self.groups[column] = index
+
+    def row(self, key) -> Optional[pd.Series]:
+        pos = self.by_key.get(key)
+        return None if pos is None else self.df.iloc[pos]
+
+    def rows(self, column: str, value) -> pd.DataFrame:
+        positions = self.groups.get(column, {}).get(value, [])
+        return self.df.iloc[positions]
+
+    # Structures built from this exact version of the file (e.g. a search
+    # index) are kept here and dropped together with the snapshot.
+    def derive(self, name: str, build: Callable[[pd.DataFrame], Any]):
+        if name not in self.derived:
+            self.derived[name] = build(self.df)
+        return self.derived[name]
+
+class ReferenceTable:
+    def __init__(self, path: str, key_column: str, group_columns: Tuple[str, ...] = ()):
+        self.path = path
+        self.key_column = key_column
+        self.group_columns = tuple(group_columns)
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Optional[ReferenceSnapshot]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+
+        version = (st.st_mtime_ns, st.st_size)
+        current = self._snapshot
+        if current is not None and current.version == version:
+            return current
+
+        with self._lock:
+            current = self._snapshot
+            if current is None or current.version != version:
+                with metrics.span("reference.load"):
+                    df = pd.read_csv(self.path)
+                current = ReferenceSnapshot(df, self.key_column, self.group_columns, version)
+                self._snapshot = current
+            return current
+
+    def frame(self) -> Optional[pd.DataFrame]:
+        snapshot = self.snapshot()
+        return None if snapshot is None else snapshot.df
+
+    def row(self, key) -> Optional[pd.Series]:
+        snapshot = self.snapshot()
+        return None if snapshot is None else snapshot.row(key)
+
+    def rows(self, column: str, value) -> Optional[pd.DataFrame]:
+        snapshot = self.snapshot()
+        return None if snapshot is None else snapshot.rows(column, value)
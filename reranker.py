@@ -0,0 +1,137 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from onnx_models import feeds, length_batches, load_session, load_tokenizer
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+# RAG_RERANK=1 retrieves RAG_RERANK_CANDIDATES chunks and keeps the best
+# RAG_RERANK_TOP_K by cross-encoder score. RAG_RERANK_BACKEND=onnx runs
+# the int8 ONNX export through onnxruntime instead of PyTorch.
+RERANK = os.getenv("RAG_RERANK", "0") == "1"
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L6-v2")
+RERANK_BACKEND = os.getenv("RAG_RERANK_BACKEND", "onnx")
+RERANK_ONNX_FILE = os.getenv("RAG_RERANK_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "50"))
+RERANK_TOP_K = int(os.getenv("RAG_RERANK_TOP_K", "4"))
+RERANK_BATCH_SIZE = int(os.getenv("RAG_RERANK_BATCH_SIZE", "32"))
+RERANK_THREADS = int(os.getenv("RAG_RERANK_THREADS", "0"))
+RERANK_MAX_LENGTH = int(os.getenv("RAG_RERANK_MAX_LENGTH", "256"))
+RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "20000"))
+
+# ==============================
+# CROSS-ENCODER BACKENDS
+# ==============================
+class OnnxCrossEncoder:
+    def __init__(self, model: str, file_name: str = RERANK_ONNX_FILE,
+                 threads: int = RERANK_THREADS, max_length: int = RERANK_MAX_LENGTH):
+        self.tokenizer = load_tokenizer(model, max_length)
+        self.session = load_session(model, file_name, threads)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int) -> np.ndarray:
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(pairs))
+        lengths = [len(e.ids) for e in encodings]
+        for batch in length_batches(lengths, batch_size):
+            inputs = feeds(self.session, [encodings[i] for i in batch])
+            logits = self.session.run(None, inputs)[0]
+            scores[batch] = np.asarray(logits, dtype=np.float32).reshape(len(batch), -1)[:, 0]
+        return scores
+
+class TorchCrossEncoder:
+    def __init__(self, model: str, max_length: int = RERANK_MAX_LENGTH):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model, max_length=max_length, device="cpu")
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int) -> np.ndarray:
+        return np.asarray(self.model.predict(list(pairs), batch_size=batch_size), dtype=np.float32)
+
+def load_cross_encoder(model: str = RERANK_MODEL, backend: str = RERANK_BACKEND):
+    if backend == "onnx":
+        return OnnxCrossEncoder(model)
+    if backend == "torch":
+        return TorchCrossEncoder(model)
+    raise ValueError(f"Unknown reranker backend {backend!r}; expected onnx or torch")
+
+# ==============================
+# RERANKER
+# ==============================
+# (query, chunk) scores are kept in an LRU so repeated questions and
+# chunks that keep coming back as candidates are only scored once.
+class Reranker:
+    def __init__(self, encoder, top_k: int = RERANK_TOP_K,
+                 batch_size: int = RERANK_BATCH_SIZE, cache_size: int = RERANK_CACHE_SIZE):
+        self.encoder = encoder
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, doc: Document) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(" ".join(query.lower().split()).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+        return digest.digest()
+
+    def scores(self, query: str, docs: List[Document]) -> np.ndarray:
+        keys = [self.key(query, doc) for doc in docs]
+        scores = np.zeros(len(docs), dtype=np.float32)
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+
+        self.hits += len(docs) - len(missing)
+        self.misses += len(missing)
+        metrics.incr("cache_requests_total", len(docs) - len(missing), cache="rerank", result="hit")
+        metrics.incr("cache_requests_total", len(missing), cache="rerank", result="miss")
+
+        if missing:
+            pairs = [(query, docs[i].page_content) for i in missing]
+            with metrics.span("rerank.model"):
+                fresh = self.encoder.predict(pairs, self.batch_size)
+            scores[missing] = fresh
+
+            with self._lock:
+                for i, score in zip(missing, fresh):
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, docs: List[Document], top_k: Optional[int] = None) -> List[Document]:
+        if not docs:
+            return []
+        with metrics.span("rerank"):
+            scores = self.scores(query, docs)
+        order = np.argsort(-scores, kind="stable")[:top_k or self.top_k]
+        return [docs[i] for i in order]
+
+def load_reranker() -> Optional[Reranker]:
+    if not RERANK:
+        return None
+    try:
+        return Reranker(load_cross_encoder())
+    except Exception as e:
+        print(f"Reranker disabled ({RERANK_BACKEND} {RERANK_MODEL} unavailable: {e})")
+        return None
@@ -0,0 +1,72 @@
+import os
+from typing import Any, List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25 import reciprocal_rank_fusion
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+DENSE_WEIGHT = float(os.getenv("RAG_DENSE_WEIGHT", "1.0"))
+SPARSE_WEIGHT = float(os.getenv("RAG_SPARSE_WEIGHT", "1.0"))
+FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+RRF_K = 60
+
+# ==============================
+# HYBRID RETRIEVER
+# ==============================
+# Dense FAISS results and sparse BM25 results over the same chunk ids are
+# merged with weighted reciprocal rank fusion. Setting SPARSE_WEIGHT to 0
+# gives plain dense retrieval.
+class HybridRetriever(BaseRetriever):
+    vectorstore: Any
+    sparse: Any = None
+    embeddings: Any
+    k: int = 4
+    fetch_k: int = FETCH_K
+    dense_weight: float = DENSE_WEIGHT
+    sparse_weight: float = SPARSE_WEIGHT
+    rrf_k: int = RRF_K
+
+    def dense_ids(self, vectors) -> List[List[str]]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        _, indices = self.vectorstore.index.search(vectors, self.fetch_k)
+        mapping = self.vectorstore.index_to_docstore_id
+        return [[mapping[int(i)] for i in row if i != -1] for row in indices]
+
+    def sparse_ids(self, query: str) -> List[str]:
+        if self.sparse is None or self.sparse_weight <= 0:
+            return []
+        return [doc_id for doc_id, _ in self.sparse.search(query, self.fetch_k)]
+
+    def fuse(self, dense: List[str], sparse: List[str]) -> List[Document]:
+        fused = reciprocal_rank_fusion(
+            [dense, sparse], [self.dense_weight, self.sparse_weight], self.rrf_k
+        )
+        docstore = self.vectorstore.docstore
+        docs = (docstore.search(doc_id) for doc_id, _ in fused[:self.k])
+        return [doc for doc in docs if isinstance(doc, Document)]
+
+    # One FAISS matrix query for the whole batch, BM25 per question
+    def search_many(self, queries: Sequence[str], vectors) -> List[List[Document]]:
+        if not len(queries):
+            return []
+        with metrics.span("retrieve.dense"):
+            dense = self.dense_ids(vectors)
+
+        results = []
+        for q, d in zip(queries, dense):
+            with metrics.span("retrieve.sparse"):
+                sparse = self.sparse_ids(q)
+            docs = self.fuse(d, sparse)
+            metrics.observe("retrieved_chunks", len(docs), buckets=metrics.COUNT_BUCKETS)
+            results.append(docs)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        return self.search_many([query], [vector])[0]
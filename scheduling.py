@@ -0,0 +1,250 @@
+import re
+import time
+import datetime
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from storage import TransactionStore, quote
+from reference_data import ReferenceTable
+
+APPOINTMENT_TIMES = ["9:00 AM", "10:00 AM", "11:00 AM", "2:00 PM", "3:00 PM", "4:00 PM", "5:00 PM"]
+DIAGNOSIS_TIMES = ["9:00 AM", "10:00 AM", "11:00 AM", "2:00 PM", "3:00 PM", "4:00 PM"]
+
+# Bookings made by other processes are picked up at most this often
+SYNC_INTERVAL = 1.0
+
+DAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DAYS = {name: i for i, name in enumerate(DAY_NAMES)}
+DAYS.update({name[:3]: i for i, name in enumerate(DAY_NAMES)})
+DAYS.update({"tues": 1, "thur": 3, "thurs": 3})
+DAY_RE = r"(mon|tue|wed|thu|fri|sat|sun)(?:day|sday|nesday|rsday|urday|rs|r|s)?\b"
+RANGE_RE = re.compile(DAY_RE + r"\s*(?:-|–|to)\s*" + DAY_RE)
+SINGLE_RE = re.compile(r"\b" + DAY_RE)
+HOURS_RE = re.compile(
+    r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?\s*(?:-|–|to)\s*(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)"
+)
+
+class SlotTaken(Exception):
+    pass
+
+class SlotUnavailable(Exception):
+    pass
+
+def _minutes(hour: str, minute: Optional[str], half: Optional[str]) -> int:
+    hour = int(hour) % 12 + (12 if half == "pm" else 0)
+    return hour * 60 + int(minute or 0)
+
+# "9:00 AM" -> 540
+@lru_cache(maxsize=256)
+def slot_minutes(slot: str) -> Optional[int]:
+    match = re.match(r"\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)", slot.lower())
+    return _minutes(*match.groups()) if match else None
+
+# "Mon-Fri", "Mon/Wed", "Weekdays", "Daily" ... -> set of weekday numbers
+def parse_days(text) -> Optional[frozenset]:
+    if not isinstance(text, str):
+        return None
+    text = text.lower()
+    if any(word in text for word in ("daily", "all days", "every day", "everyday", "24/7", "24x7")):
+        return frozenset(range(7))
+
+    days = set()
+    if "weekday" in text:
+        days.update(range(5))
+    if "weekend" in text:
+        days.update((5, 6))
+    for start, end in RANGE_RE.findall(text):
+        a, b = DAYS[start], DAYS[end]
+        days.update(range(a, b + 1) if a <= b else list(range(a, 7)) + list(range(b + 1)))
+    for day in SINGLE_RE.findall(RANGE_RE.sub(" ", text)):
+        days.add(DAYS[day])
+    return frozenset(days) or None
+
+# "Mon-Fri 9AM-1PM" -> (540, 780); None when no hours are given
+def parse_hours(text) -> Optional[Tuple[int, int]]:
+    if not isinstance(text, str):
+        return None
+    match = HOURS_RE.search(text.lower())
+    if not match:
+        return None
+    h1, m1, half1, h2, m2, half2 = match.groups()
+    end = _minutes(h2, m2, half2)
+    start = _minutes(h1, m1, half1 or half2)
+    # "10-4pm": the start inherits am/pm only if it stays before the end
+    if half1 is None and start >= end:
+        start = _minutes(h1, m1, "am")
+    return start, end
+
+# date / datetime / "YYYY-MM-DD..." -> "YYYY-MM-DD"
+def _day(date) -> str:
+    day = str(date)[:10] if date is not None else ""
+    try:
+        datetime.date.fromisoformat(day)
+    except ValueError:
+        raise SlotUnavailable(f"Not a valid booking date: {date!r}") from None
+    return day
+
+class DoctorHours:
+    def __init__(self, df: pd.DataFrame):
+        names = df["Doctor_Name"].tolist() if "Doctor_Name" in df.columns else []
+        availability = df["Availability"].tolist() if "Availability" in df.columns else [None] * len(names)
+        self.hours = {}
+        for name, text in zip(names, availability):
+            self.hours.setdefault(name, (parse_days(text), parse_hours(text)))
+
+# ==============================
+# SCHEDULE
+# ==============================
+# Every booked (doctor, date, time) is a row in slot_bookings, whose
+# primary key makes a second booking of the same slot fail inside the
+# writer transaction, so reserve() is atomic across sessions and
+# processes. Appointments and diagnosis tests share a doctor's slots.
+# Free-slot queries never touch the database: they check the doctor's
+# parsed Availability and an in-memory (doctor, date) -> booked times
+# index covering today onwards, caught up from new slot_bookings rows.
+class Schedule:
+    def __init__(self, store: TransactionStore, doctors: ReferenceTable,
+                 tables: Sequence[str] = ("Appointments", "Diagnosis")):
+        self.store = store
+        self.doctors = doctors
+        self.tables = tables
+        self._taken: Dict[Tuple[str, str], set] = {}
+        self._lock = threading.Lock()
+        self._watermark = 0
+        self._synced = 0.0
+        self._today = _day(datetime.date.today())
+
+        self.store.execute(self._create_tables)
+        self._load(self._today)
+
+    def _create_tables(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slot_bookings "
+            "(doctor TEXT NOT NULL, date TEXT NOT NULL, time TEXT NOT NULL, source TEXT, "
+            "PRIMARY KEY (doctor, date, time))"
+        )
+        # Bookings written before the slot table existed claim their slots
+        # once; earlier double bookings keep only the first row's claim
+        for table in self.tables:
+            marker = f"slots:{table}"
+            if conn.execute("SELECT 1 FROM _migrations WHERE source = ?", (marker,)).fetchone():
+                continue
+            if {"Doctor", "Date", "Time"} <= set(self.store.table_columns(conn, table)):
+                conn.execute(
+                    "INSERT OR IGNORE INTO slot_bookings "
+                    f"SELECT Doctor, substr(Date, 1, 10), Time, ? FROM {quote(table)} "
+                    "WHERE Doctor IS NOT NULL AND Date IS NOT NULL AND Time IS NOT NULL "
+                    "ORDER BY rowid", (table,)
+                )
+            conn.execute("INSERT INTO _migrations VALUES (?)", (marker,))
+
+    def _load(self, since: str):
+        rows = self.store.query(
+            "SELECT rowid, doctor, date, time FROM slot_bookings WHERE date >= ?", (since,)
+        )
+        self._apply(rows)
+
+    def _apply(self, rows: List[tuple]):
+        with self._lock:
+            self._prune()
+            for rowid, doctor, date, slot in rows:
+                if date >= self._today:
+                    self._taken.setdefault((doctor, date), set()).add(slot)
+                self._watermark = max(self._watermark, rowid)
+            self._synced = time.monotonic()
+
+    # Past days can't be booked any more; drop them once the date rolls over
+    def _prune(self):
+        today = _day(datetime.date.today())
+        if today != self._today:
+            self._today = today
+            self._taken = {key: slots for key, slots in self._taken.items() if key[1] >= today}
+
+    def _mark(self, doctor: str, date: str, slot: str):
+        with self._lock:
+            self._taken.setdefault((doctor, date), set()).add(slot)
+
+    def _catch_up(self):
+        if time.monotonic() - self._synced < SYNC_INTERVAL:
+            return
+        self._apply(self.store.query(
+            "SELECT rowid, doctor, date, time FROM slot_bookings WHERE rowid > ?",
+            (self._watermark,)
+        ))
+
+    def _hours(self, doctor: str):
+        snapshot = self.doctors.snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.derive("schedule", DoctorHours).hours.get(doctor)
+
+    def _open(self, hours, date: str, slot: str) -> bool:
+        days, window = hours
+        if days is not None and datetime.date.fromisoformat(date).weekday() not in days:
+            return False
+        if window is not None:
+            minutes = slot_minutes(slot)
+            return minutes is not None and window[0] <= minutes < window[1]
+        return True
+
+    # Days before today, and today's times that have already started
+    def _passed(self, date: str, slot: str) -> bool:
+        now = datetime.datetime.now()
+        today = _day(now.date())
+        if date != today:
+            return date < today
+        minutes = slot_minutes(slot)
+        return minutes is not None and minutes <= now.hour * 60 + now.minute
+
+    # ---------- queries ----------
+    def free_slots(self, doctor: str, date, times: Sequence[str] = APPOINTMENT_TIMES) -> List[str]:
+        hours = self._hours(doctor)
+        if hours is None:
+            return []
+        date = _day(date)
+        if date < _day(datetime.date.today()):
+            return []
+        self._catch_up()
+        taken = self._taken.get((doctor, date), ())
+        return [t for t in times
+                if t not in taken and self._open(hours, date, t) and not self._passed(date, t)]
+
+    def is_free(self, doctor: str, date, slot: str) -> bool:
+        return slot in self.free_slots(doctor, date, (slot,))
+
+    # ---------- booking ----------
+    # Claims the slot and appends `row` to `table` in one transaction
+    def reserve(self, table: str, row: Dict) -> Dict:
+        row = dict(row)
+        doctor, date, slot = row.get("Doctor"), _day(row.get("Date")), row.get("Time")
+        if not doctor or not slot:
+            raise ValueError("A booking needs Doctor, Date and Time")
+        hours = self._hours(doctor)
+        if hours is None:
+            raise KeyError(f"Unknown doctor: {doctor}")
+        if self._passed(date, slot):
+            raise SlotUnavailable(f"{date} at {slot} is in the past")
+        if not self._open(hours, date, slot):
+            raise SlotUnavailable(f"{doctor} is not available on {date} at {slot}")
+
+        def write(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO slot_bookings VALUES (?, ?, ?, ?)",
+                (doctor, date, slot, table)
+            )
+            if cursor.rowcount != 1:
+                raise SlotTaken(f"{doctor} is already booked on {date} at {slot}")
+            self.store.insert(conn, table, row)
+            return cursor.lastrowid
+
+        # A lost race also tells us the slot is gone
+        try:
+            rowid = self.store.execute(write)
+        except SlotTaken:
+            self._mark(doctor, date, slot)
+            raise
+        self._mark(doctor, date, slot)
+        return {"doctor": doctor, "date": date, "time": slot, "slot_id": rowid}
@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from collections.abc import Mapping
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from ann_index import MMAP_FLAGS, tune
+from bm25 import BM25Index, bm25_top, tokenize
+from embedding_cache import try_lock
+from index_store import CACHE_DIR, INDEX_DIR, MANIFEST_FILE
+
+# ==============================
+# CONFIG
+# ==============================
+# RAG_SHARED_INDEX=1: whichever process takes builder.lock first indexes
+# data/ and publishes read-only versions under RAG_SHARED_DIR. Every
+# worker (the builder too) serves from memory-mapped files, so N workers
+# on a node share one copy of the vectors, chunk texts and BM25 postings
+# in the page cache instead of holding N private copies.
+SHARED_INDEX = os.getenv("RAG_SHARED_INDEX", "0") == "1"
+SHARED_DIR = os.getenv("RAG_SHARED_DIR", os.path.join(CACHE_DIR, "shared_index"))
+SHARED_KEEP = int(os.getenv("RAG_SHARED_KEEP", "3"))
+SHARED_WAIT = float(os.getenv("RAG_SHARED_WAIT", "600"))
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "builder.lock"
+INFO_FILE = "version.json"
+
+# ==============================
+# STRING TABLES
+# ==============================
+# <name>.bin holds UTF-8 strings back to back and <name>.idx.npy their
+# int64 offsets (n + 1), so string i is one slice of the mapping and
+# nothing is parsed or copied up front.
+def write_strings(path: str, values: Iterable[str]):
+    offsets = [0]
+    with open(path + ".bin", "wb") as f:
+        for value in values:
+            data = value.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(path + ".idx.npy", np.asarray(offsets, dtype=np.int64))
+
+class Strings:
+    def __init__(self, path: str):
+        self.offsets = np.load(path + ".idx.npy", mmap_mode="r")
+        if os.path.getsize(path + ".bin"):
+            self.data = np.memmap(path + ".bin", dtype=np.uint8, mode="r")
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    # Binary search; `order` lists positions in sorted order when the
+    # table itself isn't sorted. Returns the position or -1.
+    def find(self, value: str, order=None) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[int(order[mid]) if order is not None else mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self):
+            pos = int(order[lo]) if order is not None else lo
+            if self[pos] == value:
+                return pos
+        return -1
+
+# ==============================
+# MAPPED CHUNKS / BM25
+# ==============================
+# Chunk i is FAISS vector i: its id, text and JSON metadata live in
+# string tables, plus ids_order.npy (positions sorted by id) for lookups
+# by chunk id. The docstore and id map below stand in for LangChain's
+# in-memory dicts on top of them.
+class MappedChunks:
+    def __init__(self, path: str):
+        self.ids = Strings(os.path.join(path, "ids"))
+        self.texts = Strings(os.path.join(path, "texts"))
+        self.metadata = Strings(os.path.join(path, "metadata"))
+        self.order = np.load(os.path.join(path, "ids_order.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, pos: int) -> Document:
+        return Document(page_content=self.texts[pos], metadata=json.loads(self.metadata[pos]),
+                        id=self.ids[pos])
+
+class MappedDocstore(Docstore):
+    def __init__(self, chunks: MappedChunks):
+        self.chunks = chunks
+
+    def search(self, search: str):
+        pos = self.chunks.ids.find(search, self.chunks.order)
+        return self.chunks.document(pos) if pos >= 0 else f"ID {search} not found."
+
+class MappedIdMap(Mapping):
+    def __init__(self, chunks: MappedChunks):
+        self.chunks = chunks
+
+    def __getitem__(self, pos: int) -> str:
+        if not 0 <= pos < len(self.chunks):
+            raise KeyError(pos)
+        return self.chunks.ids[pos]
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.chunks)))
+
+# BM25Index.search over postings written in FAISS position order: sorted
+# terms, one offsets array into concatenated doc / tf arrays, per-chunk
+# lengths. Every chunk in a published version is live.
+class MappedBM25:
+    def __init__(self, path: str, chunks: MappedChunks):
+        self.chunks = chunks
+        self.terms = Strings(os.path.join(path, "terms"))
+        self.term_offsets = np.load(os.path.join(path, "postings.idx.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, "postings_docs.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "postings_tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+        with open(os.path.join(path, "bm25.json")) as f:
+            stats = json.load(f)
+        self.k1 = stats["k1"]
+        self.b = stats["b"]
+        self.live = stats["live"]
+        self.avg_length = stats["total_length"] / self.live if self.live else 1.0
+
+    def __len__(self) -> int:
+        return self.live
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        postings = []
+        for token in set(tokenize(query)):
+            t = self.terms.find(token)
+            if t < 0:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            postings.append((self.docs[start:end], self.tfs[start:end]))
+
+        docs, values = bm25_top(postings, self.lengths, self.live, self.avg_length or 1.0,
+                                self.k1, self.b, k)
+        return [(self.chunks.ids[int(d)], float(v)) for d, v in zip(docs, values)]
+
+def write_bm25(path: str, sparse: BM25Index, positions: dict, n: int):
+    if sparse.live < len(sparse.ids):
+        sparse.compact()
+    to_pos = np.array([positions.get(doc_id, -1) for doc_id in sparse.ids], dtype=np.int64)
+    known = to_pos >= 0
+
+    lengths = np.zeros(n, dtype=np.float32)
+    lengths[to_pos[known]] = np.asarray(sparse.lengths, dtype=np.float32)[known]
+
+    terms = sorted(sparse.postings)
+    offsets = [0]
+    all_docs, all_tfs = [], []
+    for term in terms:
+        docs, tfs = sparse.postings[term]
+        docs = to_pos[np.frombuffer(docs, dtype=np.int32)]
+        keep = docs >= 0
+        all_docs.append(docs[keep].astype(np.int32))
+        all_tfs.append(np.frombuffer(tfs, dtype=np.int32)[keep].astype(np.float32))
+        offsets.append(offsets[-1] + int(keep.sum()))
+
+    write_strings(os.path.join(path, "terms"), terms)
+    np.save(os.path.join(path, "postings.idx.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(path, "postings_docs.npy"),
+            np.concatenate(all_docs) if all_docs else np.zeros(0, dtype=np.int32))
+    np.save(os.path.join(path, "postings_tfs.npy"),
+            np.concatenate(all_tfs) if all_tfs else np.zeros(0, dtype=np.float32))
+    np.save(os.path.join(path, "lengths.npy"), lengths)
+    with open(os.path.join(path, "bm25.json"), "w") as f:
+        json.dump({"k1": sparse.k1, "b": sparse.b, "live": int(known.sum()),
+                   "total_length": float(lengths.sum())}, f)
+
+def write_version(path: str, vectorstore: FAISS, sparse: BM25Index):
+    mapping = vectorstore.index_to_docstore_id
+    ids = [mapping[i] for i in range(vectorstore.index.ntotal)]
+    docs = [vectorstore.docstore.search(doc_id) for doc_id in ids]
+
+    faiss.write_index(vectorstore.index, os.path.join(path, "index.faiss"))
+    write_strings(os.path.join(path, "ids"), ids)
+    write_strings(os.path.join(path, "texts"), (d.page_content for d in docs))
+    write_strings(os.path.join(path, "metadata"),
+                  (json.dumps(d.metadata, ensure_ascii=False, default=str) for d in docs))
+    np.save(os.path.join(path, "ids_order.npy"),
+            np.asarray(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int64))
+    write_bm25(path, sparse, {doc_id: pos for pos, doc_id in enumerate(ids)}, len(ids))
+
+def _fsync_tree(path: str):
+    for name in os.listdir(path):
+        with open(os.path.join(path, name), "rb") as f:
+            os.fsync(f.fileno())
+
+# Identifies what the builder's working index was built from (files,
+# embedding model, index mode), so an unchanged rebuild isn't republished
+def manifest_tag(index_dir: str = INDEX_DIR) -> str:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return "empty"
+
+# ==============================
+# SHARED INDEX
+# ==============================
+# Layout: <root>/v<ns>/ per published version, <root>/CURRENT naming the
+# live one. A version is written to a .tmp- directory, fsynced, renamed
+# into place and only then made current by os.replace() on CURRENT, so
+# readers always open a complete version. Old versions are pruned after
+# SHARED_KEEP newer ones exist; processes still mapping them keep
+# reading the unlinked files.
+class SharedIndex:
+    def __init__(self, root: str = SHARED_DIR, keep: int = SHARED_KEEP):
+        self.root = root
+        self.keep = keep
+        self._lock = None
+
+    def try_build(self) -> bool:
+        if self._lock is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._lock = try_lock(os.path.join(self.root, LOCK_FILE))
+        return self._lock is not None
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def wait_current(self, timeout: float = SHARED_WAIT) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        version = self.current()
+        while version is None and time.monotonic() < deadline:
+            time.sleep(0.5)
+            version = self.current()
+        return version
+
+    def info(self, version: str) -> dict:
+        with open(os.path.join(self.root, version, INFO_FILE)) as f:
+            return json.load(f)
+
+    def publish(self, vectorstore: Optional[FAISS], sparse: Optional[BM25Index],
+                tag: str, model: str) -> str:
+        current = self.current()
+        if current:
+            try:
+                if self.info(current).get("tag") == tag:
+                    return current
+            except (OSError, ValueError):
+                pass
+
+        version = f"v{time.time_ns()}"
+        tmp = os.path.join(self.root, f".tmp-{version}")
+        os.makedirs(tmp)
+        try:
+            chunks = vectorstore.index.ntotal if vectorstore else 0
+            if chunks:
+                write_version(tmp, vectorstore, sparse or BM25Index())
+            with open(os.path.join(tmp, INFO_FILE), "w") as f:
+                json.dump({"tag": tag, "model": model, "chunks": chunks,
+                           "created": time.time()}, f)
+            _fsync_tree(tmp)
+            os.rename(tmp, os.path.join(self.root, version))
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer + ".tmp", pointer)
+        self.prune(version)
+        return version
+
+    def prune(self, current: str):
+        names = sorted(os.listdir(self.root))
+        versions = [n for n in names if n.startswith("v") and n != current]
+        # Only the lock holder publishes, so other .tmp- dirs are leftovers
+        stale = [n for n in names if n.startswith(".tmp-")]
+        for name in versions[:max(0, len(versions) - (self.keep - 1))] + stale:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    # (vectorstore, sparse) mapped read-only, (None, None) for an empty
+    # corpus
+    def open(self, version: str, embeddings, model: str) -> Tuple[Optional[FAISS], Optional[MappedBM25]]:
+        info = self.info(version)
+        if info.get("model") != model:
+            raise ValueError(f"Shared index {version} was built with {info.get('model')}, not {model}")
+        if not info["chunks"]:
+            return None, None
+
+        path = os.path.join(self.root, version)
+        index = tune(faiss.read_index(os.path.join(path, "index.faiss"), MMAP_FLAGS))
+        chunks = MappedChunks(path)
+        vectorstore = FAISS(embeddings, index, MappedDocstore(chunks), MappedIdMap(chunks))
+        return vectorstore, MappedBM25(path, chunks)
@@ -0,0 +1,286 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+GROUP_COMMIT_MAX = 256
+BUSY_TIMEOUT_MS = 10000
+
+def quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _plain(value):
+    # numpy scalars, dates etc. are stored as plain SQLite values
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+# Legacy CSV imports stored numeric-looking fields (phone numbers, ...) as
+# integers while the app writes strings, so equality filters try both
+def _variants(value) -> List:
+    value = _plain(value)
+    if isinstance(value, str) and value.isdigit() and not value.startswith("0"):
+        return [value, int(value)]
+    if isinstance(value, int):
+        return [value, str(value)]
+    return [value]
+
+# ==============================
+# TRANSACTION STORE
+# ==============================
+# Append-only tables in a SQLite database in WAL mode. All writes from a
+# process go through one writer thread, which commits whatever operations
+# are queued as a single transaction (group commit: one fsync per batch).
+# Other processes are serialized by SQLite's own file locking.
+class TransactionStore:
+    def __init__(self, path: str, legacy_csv: Optional[Dict[str, str]] = None):
+        self.path = path
+        self._columns = {}
+        self._hooks = {}
+        self._indexes = {}
+        self._queue = queue.Queue()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS _migrations (source TEXT PRIMARY KEY)"
+        )
+        conn.commit()
+        for table, csv_path in (legacy_csv or {}).items():
+            self._migrate(conn, table, csv_path)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    # ---------- schema ----------
+    def table_columns(self, conn: sqlite3.Connection, table: str) -> List[str]:
+        rows = conn.execute(f"PRAGMA table_info({quote(table)})").fetchall()
+        return [row[1] for row in rows]
+
+    def _ensure_table(self, conn: sqlite3.Connection, table: str, columns: List[str]):
+        known = self._columns.get(table)
+        if known is not None and all(c in known for c in columns):
+            return
+
+        known = self.table_columns(conn, table)
+        if not known:
+            cols = ", ".join(quote(c) for c in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(table)} ({cols})")
+        else:
+            # Rows may gain fields over time; add them as nullable columns
+            for column in columns:
+                if column not in known:
+                    conn.execute(
+                        f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)}"
+                    )
+        self._columns[table] = self.table_columns(conn, table)
+        self._create_indexes(conn, table)
+
+    # Indexes are registered up front but only created once the table (and
+    # every indexed column) exists, since tables are created on first write
+    def index(self, table: str, *columns: str):
+        self._indexes.setdefault(table, []).append(columns)
+        self.execute(lambda conn: self._create_indexes(conn, table))
+
+    def _create_indexes(self, conn: sqlite3.Connection, table: str):
+        known = set(self._columns.get(table) or self.table_columns(conn, table))
+        for columns in self._indexes.get(table, ()):
+            if all(c in known for c in columns):
+                name = quote(f"idx_{table}_{'_'.join(columns)}")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {quote(table)} "
+                    f"({', '.join(quote(c) for c in columns)})"
+                )
+
+    # Hooks run on the writer connection right after a row is inserted, so
+    # derived tables (running totals, ...) commit or roll back with the row
+    def on_insert(self, table: str, hook: Callable[[sqlite3.Connection, Dict], Any]):
+        self._hooks.setdefault(table, []).append(hook)
+
+    def insert(self, conn: sqlite3.Connection, table: str, row: Dict):
+        columns = list(row)
+        self._ensure_table(conn, table, columns)
+        conn.execute(
+            f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            [_plain(row[c]) for c in columns]
+        )
+        for hook in self._hooks.get(table, ()):
+            hook(conn, row)
+
+    # ---------- one-time CSV import ----------
+    def _migrate(self, conn: sqlite3.Connection, table: str, csv_path: str):
+        if not os.path.exists(csv_path):
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute(
+                "SELECT 1 FROM _migrations WHERE source = ?", (csv_path,)
+            ).fetchone()
+            if not done:
+                df = pd.read_csv(csv_path)
+                df = df.astype(object).where(df.notna(), None)
+                for row in df.to_dict("records"):
+                    self.insert(conn, table, row)
+                conn.execute("INSERT INTO _migrations VALUES (?)", (csv_path,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Could not import {csv_path}: {e}")
+
+    # ---------- writer ----------
+    # Each queued operation runs inside its own SAVEPOINT, so a failing
+    # operation (bad row, out of stock, ...) is rolled back alone while the
+    # rest of the batch still commits together.
+    def _write_loop(self):
+        conn = self._connect()
+        conn.isolation_level = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < GROUP_COMMIT_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            metrics.observe("store_batch_size", len(batch), buckets=metrics.COUNT_BUCKETS)
+            start = time.perf_counter()
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for operation, done in batch:
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        value = operation(conn)
+                        conn.execute("RELEASE op")
+                        results.append((done, value, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO op")
+                        conn.execute("RELEASE op")
+                        self._columns.clear()
+                        results.append((done, None, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._columns.clear()
+                results = [(done, None, e) for _, done in batch]
+            metrics.observe("span_seconds", time.perf_counter() - start, span="store.commit")
+
+            for done, value, error in results:
+                if error is None:
+                    done.set_result(value)
+                else:
+                    done.set_exception(error)
+
+    def execute(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        with metrics.span("store.write"):
+            done = Future()
+            self._queue.put((operation, done))
+            return done.result()
+
+    def append(self, table: str, row: Dict) -> bool:
+        row = dict(row)
+
+        def write(conn):
+            self.insert(conn, table, row)
+            return True
+
+        try:
+            return self.execute(write)
+        except Exception as e:
+            print(f"Could not save to {table}: {e}")
+            return False
+
+    # ---------- readers ----------
+    @metrics.traced("store.read")
+    def read(self, table: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        conn = self._connect()
+        try:
+            if not self.table_columns(conn, table):
+                return None
+            cols = ", ".join(quote(c) for c in columns) if columns else "*"
+            return pd.read_sql_query(
+                f"SELECT {cols} FROM {quote(table)} ORDER BY rowid", conn
+            )
+        finally:
+            conn.close()
+
+    # One page of a table, newest rows first. `equals` and `ranges` (low
+    # inclusive, high exclusive, None = open) skip None values; only the
+    # requested columns are read. Returns (rows, number of matching rows).
+    @metrics.traced("store.page")
+    def page(self, table: str, columns: Optional[List[str]] = None,
+             equals: Optional[Dict[str, Any]] = None,
+             ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+             offset: int = 0, limit: int = 50, newest_first: bool = True
+             ) -> Tuple[Optional[pd.DataFrame], int]:
+        conn = self._connect()
+        try:
+            known = self.table_columns(conn, table)
+            if not known:
+                return None, 0
+            selected = [c for c in columns if c in known] if columns else known
+
+            clauses, params = [], []
+            for column, value in (equals or {}).items():
+                if value is None:
+                    continue
+                if column not in known:
+                    return pd.DataFrame(columns=selected), 0
+                values = _variants(value)
+                clauses.append(f"{quote(column)} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+            for column, (low, high) in (ranges or {}).items():
+                if low is None and high is None:
+                    continue
+                if column not in known:
+                    return pd.DataFrame(columns=selected), 0
+                if low is not None:
+                    clauses.append(f"{quote(column)} >= ?")
+                    params.append(_plain(low))
+                if high is not None:
+                    clauses.append(f"{quote(column)} < ?")
+                    params.append(_plain(high))
+
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM {quote(table)}{where}", params
+            ).fetchone()[0]
+            rows = pd.read_sql_query(
+                f"SELECT {', '.join(quote(c) for c in selected)} FROM {quote(table)}{where} "
+                f"ORDER BY rowid {'DESC' if newest_first else 'ASC'} LIMIT ? OFFSET ?",
+                conn, params=params + [int(limit), int(offset)]
+            )
+            return rows, total
+        finally:
+            conn.close()
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
@@ -0,0 +1,261 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# ==============================
+# DETERMINISTIC LOCAL LLM
+# ==============================
+def stub_answer(prompt: str, bullets: int = 3) -> str:
+    digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+    return "\n".join(
+        f"• Point {i + 1} ({digest[i * 6:(i + 1) * 6]})"
+        for i in range(bullets)
+    )
+
+# Drop-in replacement for ChatGroq (select with RAG_LLM=stub). The answer
+# is derived from a hash of the prompt, so the same prompt always yields
+# the same bullets. `latency` simulates the network round trip and
+# `fail_every` makes every n-th call raise to exercise retries.
+class StubChatModel(BaseChatModel):
+    latency: float = 0.0
+    fail_every: int = 0
+    bullets: int = 3
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise RuntimeError("stub LLM: simulated upstream failure")
+
+        return stub_answer("\n".join(str(m.content) for m in messages), self.bullets)
+
+    # Whitespace word counts stand in for tokens
+    @staticmethod
+    def _usage(messages: List[BaseMessage], answer: str) -> dict:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        answer_tokens = len(answer.split())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": answer_tokens,
+            "total_tokens": prompt_tokens + answer_tokens
+        }
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        answer = self._answer(messages)
+        return AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        message = self._message(messages)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        message = self._message(messages)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        answer = self._answer(messages)
+        tokens = answer.split(" ")
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency / len(tokens))
+            piece = token if i == 0 else " " + token
+            usage = self._usage(messages, answer) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+
+# ==============================
+# RATE-LIMITED STUB SERVER
+# ==============================
+# A local stand-in for Groq's OpenAI-compatible endpoint, so the real
+# ChatGroq client (and LLMScheduler around it) can be exercised offline:
+#
+#   server = StubLLMServer(latency=0.2, requests=30, tokens=6000).start()
+#   ChatGroq(model="llama-3.1-8b-instant", base_url=server.url, api_key="stub")
+#
+# Quotas are enforced over a sliding `window` like Groq's per-minute
+# limits: over either one the server answers 429 with retry-after and
+# x-ratelimit-* headers. Answers are stub_answer() of the prompt, also
+# streamed (SSE) when asked; tokens are whitespace words.
+class StubLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 requests: int = 0, tokens: int = 0, window: float = 60.0, bullets: int = 3):
+        self.latency = latency
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self.bullets = bullets
+        self.counts = {"requests": 0, "served": 0, "rate_limited": 0, "max_concurrent": 0}
+        self._log = deque()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="stub-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    # Seconds to wait if this call would go over a quota, else None (and
+    # the call is counted)
+    def _admit(self, tokens: int) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            self.counts["requests"] += 1
+            while self._log and self._log[0][0] <= now - self.window:
+                self._log.popleft()
+            used = sum(n for _, n in self._log)
+            over_requests = self.requests and len(self._log) >= self.requests
+            # A call bigger than the whole quota still gets through alone
+            over_tokens = self.tokens and self._log and used + tokens > self.tokens
+            if over_requests or over_tokens:
+                self.counts["rate_limited"] += 1
+                if over_requests:
+                    oldest = self._log[0][0]
+                else:
+                    # Wait until enough old calls have left the window
+                    freed, oldest = 0, self._log[-1][0]
+                    for t, n in self._log:
+                        freed += n
+                        if used - freed + tokens <= self.tokens:
+                            oldest = t
+                            break
+                return max(0.001, oldest + self.window - now)
+            self._log.append((now, tokens))
+            self.counts["served"] += 1
+            self._active += 1
+            self.counts["max_concurrent"] = max(self.counts["max_concurrent"], self._active)
+            return None
+
+    def _done(self):
+        with self._lock:
+            self._active -= 1
+
+    def _remaining(self) -> dict:
+        with self._lock:
+            used = sum(n for _, n in self._log)
+            return {
+                "x-ratelimit-limit-requests": str(self.requests),
+                "x-ratelimit-remaining-requests": str(max(0, self.requests - len(self._log))),
+                "x-ratelimit-limit-tokens": str(self.tokens),
+                "x-ratelimit-remaining-tokens": str(max(0, self.tokens - used))
+            }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+                answer = stub_answer(prompt, stub.bullets)
+                usage = {"prompt_tokens": len(prompt.split()),
+                         "completion_tokens": len(answer.split())}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+                wait = stub._admit(usage["total_tokens"])
+                if wait is not None:
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "tokens",
+                                               "code": "rate_limit_exceeded"}},
+                               {"retry-after": f"{wait:.3f}", **stub._remaining()})
+                    return
+
+                try:
+                    time.sleep(stub.latency)
+                    reply = {"id": "stub-" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12],
+                             "created": int(time.time()), "model": request.get("model", "stub")}
+                    if request.get("stream"):
+                        self._stream(reply, answer, usage)
+                    else:
+                        self._send(200, {**reply, "object": "chat.completion", "choices": [
+                            {"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}
+                        ], "usage": usage}, stub._remaining())
+                finally:
+                    stub._done()
+
+            def _stream(self, reply: dict, answer: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = answer.split(" ")
+                for i, word in enumerate(words):
+                    last = i == len(words) - 1
+                    chunk = {**reply, "object": "chat.completion.chunk", "choices": [
+                        {"index": 0, "finish_reason": "stop" if last else None,
+                         "delta": {"role": "assistant", "content": word if i == 0 else " " + word}}
+                    ]}
+                    if last:
+                        chunk["x_groq"] = {"usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
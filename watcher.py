@@ -0,0 +1,155 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ingest import find_data_files
+import metrics
+
+# ==============================
+# CONFIG
+# ==============================
+# RAG_WATCH=1 re-indexes data/ in the background when files are added,
+# changed or removed. RAG_WATCH_DEBOUNCE is how long the folder must be
+# quiet first (so a copy in progress triggers one rebuild, not many);
+# RAG_WATCH_INTERVAL is the polling period when watchdog isn't installed.
+WATCH = os.getenv("RAG_WATCH", "1") == "1"
+WATCH_INTERVAL = float(os.getenv("RAG_WATCH_INTERVAL", "2"))
+WATCH_DEBOUNCE = float(os.getenv("RAG_WATCH_DEBOUNCE", "3"))
+# Re-index thread priority (Linux nice value); queries keep the CPU first
+WATCH_NICE = int(os.getenv("RAG_WATCH_NICE", "10"))
+
+# path -> (mtime, size) of every data file the index would pick up
+def scan(data_dir: str) -> Dict[str, Tuple[int, int]]:
+    state = {}
+    if not os.path.isdir(data_dir):
+        return state
+    for path in find_data_files(data_dir):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        state[path] = (st.st_mtime_ns, st.st_size)
+    return state
+
+# ==============================
+# DATA FOLDER WATCHER
+# ==============================
+# One daemon thread compares scan() snapshots and calls refresh() once the
+# folder has been quiet for `debounce` seconds. With watchdog installed,
+# file events wake the thread immediately; polling every `interval`
+# seconds is the fallback (and catches anything the events miss).
+# Changes made while refresh() runs show up in the next scan and cause
+# one more refresh. A failed refresh is retried on the next change.
+class DataWatcher:
+    def __init__(self, data_dir: str, refresh: Callable[[], None],
+                 interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE,
+                 scan: Callable[[str], Any] = scan):
+        self.data_dir = data_dir
+        self.refresh = refresh
+        self.scan = scan
+        self.interval = interval
+        self.debounce = debounce
+        self.last_refresh = None
+        self.last_lag = None
+        self.refreshing = False
+        self._pending_since = None
+        self._state = scan(data_dir)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self) -> "DataWatcher":
+        self._observer = self._start_observer()
+        self._thread = threading.Thread(target=self._run, name="data-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+        if not os.path.isdir(self.data_dir):
+            return None
+
+        wake = self._wake
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), self.data_dir, recursive=True)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _run(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WATCH_NICE)
+        except (AttributeError, OSError):
+            pass
+
+        changed_at = None
+        while not self._stop.is_set():
+            timeout = self.interval
+            if changed_at is not None:
+                timeout = max(0.05, min(timeout, changed_at + self.debounce - time.monotonic()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            state = self.scan(self.data_dir)
+            now = time.monotonic()
+            if state != self._state:
+                self._state = state
+                changed_at = now
+                if self._pending_since is None:
+                    self._pending_since = now
+            elif changed_at is not None and now - changed_at >= self.debounce:
+                changed_at = None
+                self._refresh()
+
+            pending = self.status()["pending_seconds"]
+            metrics.gauge("index_lag_seconds", pending or 0.0)
+
+    def _refresh(self):
+        self.refreshing = True
+        try:
+            with metrics.span("index.refresh"):
+                self.refresh()
+        except Exception as e:
+            metrics.error("index.refresh", e)
+            metrics.incr("index_refreshes_total", result="failed")
+            return
+        finally:
+            self.refreshing = False
+
+        lag = time.monotonic() - self._pending_since
+        self._pending_since = None
+        self.last_refresh = time.time()
+        self.last_lag = lag
+        metrics.incr("index_refreshes_total", result="ok")
+        metrics.observe("index_refresh_lag_seconds", lag)
+        metrics.gauge("index_last_refresh_timestamp_seconds", self.last_refresh)
+
+    # last_refresh (epoch seconds), last_lag (first change seen -> new
+    # index live) and how long the current unindexed change has waited
+    def status(self) -> Dict[str, Optional[float]]:
+        pending = self._pending_since
+        return {
+            "last_refresh": self.last_refresh,
+            "last_lag": self.last_lag,
+            "pending_seconds": None if pending is None else time.monotonic() - pending,
+            "refreshing": self.refreshing
+        }